@@ -0,0 +1,93 @@
+"""Benchmark 404 throughput: error documents and their assets from
+memory (wattman.lib.errors) against rendering and reading them each
+time
+
+Builds the application with ``make_app`` from a config file (with a
+throwaway, empty SQLite database, and without the page cache), then
+sends a storm of requests for pages that don't exist, as a scanner
+would, with the documents cached and with the cache emptied before
+every request (so that, as before, each is rendered by running the
+request through ErrorController).  Then it does the same for the stylesheet the documents
+link to, from memory and forwarded to a ``PkgResourcesParser``, as
+ErrorController used to::
+
+    $ python bench/errors.py --requests 2000
+
+"""
+import optparse
+import os
+import tempfile
+import time
+
+from paste.deploy import appconfig
+from paste.urlparser import PkgResourcesParser
+from pylons import config, request
+from pylons.controllers.util import forward
+from webob import Request
+
+from wattman.config.middleware import make_app
+from wattman.controllers.error import ErrorController
+from wattman.model import metadata
+
+PATHS = ['/wp-login.php', '/admin.php', '/.env', '/phpmyadmin/index.php',
+         '/cgi-bin/test.cgi', '/post/no-such-post', '/xmlrpc.php']
+
+
+def forwarded(self, path):
+    """ErrorController's assets, the way it used to serve them"""
+    request.environ['PATH_INFO'] = '/media/' + path
+    return forward(PkgResourcesParser('pylons', 'pylons'))
+
+
+def rate(app, urls, requests, before=None):
+    """Requests a second"""
+    start = time.time()
+    for i in xrange(requests):
+        if before is not None:
+            before()
+        Request.blank(urls[i % len(urls)]).get_response(app)
+    return requests / (time.time() - start)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--config', default='development.ini')
+    parser.add_option('--requests', type='int', default=2000)
+    options, args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        conf = appconfig('config:%s' % os.path.abspath(options.config))
+        app_conf = dict(conf.local_conf)
+        app_conf.update({'sqlalchemy.url': 'sqlite:///%s' % path,
+                         'sqlalchemy.echo': 'false',
+                         'instrument.enabled': 'false',
+                         'pagecache.enabled': 'false'})
+        app = make_app(conf.global_conf, **app_conf)
+        metadata.create_all()
+        pages = config['pylons.app_globals'].error_pages
+        assert Request.blank(PATHS[0]).get_response(app).status_int == 404
+
+        results = [('404', rate(app, PATHS, options.requests),
+                    rate(app, PATHS, options.requests, pages.clear))]
+        stylesheet = ['/error/style/black.css']
+        cached = rate(app, stylesheet, options.requests)
+        serve_asset = ErrorController._serve_asset
+        ErrorController._serve_asset = forwarded
+        try:
+            results.append(('stylesheet', cached,
+                            rate(app, stylesheet, options.requests)))
+        finally:
+            ErrorController._serve_asset = serve_asset
+    finally:
+        os.remove(path)
+
+    print('%d requests (requests a second)' % options.requests)
+    print('%-12s %12s %12s' % ('', 'cached', 'uncached'))
+    for name, cached, uncached in results:
+        print('%-12s %12.0f %12.0f' % (name, cached, uncached))
+
+
+if __name__ == '__main__':
+    main()
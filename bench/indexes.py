@@ -0,0 +1,95 @@
+"""Benchmark path lookups and published listings with and without the
+indexes in wattman.model.indexes
+
+Seeds a throwaway SQLite database with N posts (100,000 by default),
+then times the two hottest queries with the indexes dropped and again
+with them created.  Run it with wattman installed (``python setup.py
+develop``)::
+
+    $ python bench/indexes.py --posts 100000
+
+"""
+import datetime
+import optparse
+import os
+import random
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+from wattman import model
+from wattman.model import Session, Post
+from wattman.model.indexes import INDEXES
+
+
+def seed(engine, posts):
+    table = Post.table
+    start = datetime.date(2000, 1, 1)
+    rows = []
+    for i in xrange(posts):
+        rows.append(dict(title=u'Post %d' % i, path=u'post-%d' % i,
+                         content=u'Lorem ipsum ' * 20, draft=i % 10 == 0,
+                         posted_on=start + datetime.timedelta(hours=i),
+                         comment_count=0, approved_count=0))
+        if len(rows) == 10000:
+            engine.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(table.insert(), rows)
+
+
+def timed(func, repeat):
+    start = time.time()
+    for i in xrange(repeat):
+        func()
+    return (time.time() - start) / repeat * 1000
+
+
+def run(posts, repeat):
+    paths = [u'post-%d' % random.randrange(posts) for i in xrange(repeat)]
+    paths = iter(paths * 2)
+    def lookup():
+        Session.query(Post).filter_by(path=paths.next()).first()
+        Session.expunge_all()
+    def latest():
+        Post.published().limit(10).all()
+        Session.expunge_all()
+    return timed(lookup, repeat), timed(latest, repeat)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--posts', type='int', default=100000)
+    parser.add_option('--repeat', type='int', default=200)
+    options, args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = sa.create_engine('sqlite:///%s' % path)
+        model.init_model(engine)
+        seed(engine, options.posts)
+        indexes = [index for index in Post.table.indexes
+                   if index.name in [name for name, e, c in INDEXES]]
+
+        for index in indexes:
+            index.drop(bind=engine)
+        engine.execute('ANALYZE')
+        before = run(options.posts, options.repeat)
+        for index in indexes:
+            index.create(bind=engine)
+        engine.execute('ANALYZE')
+        after = run(options.posts, options.repeat)
+    finally:
+        os.remove(path)
+
+    print('%d posts, mean of %d runs (ms)' % (options.posts, options.repeat))
+    print('%-24s %10s %10s' % ('', 'no index', 'indexed'))
+    print('%-24s %10.3f %10.3f' % ('post by path', before[0], after[0]))
+    print('%-24s %10.3f %10.3f' % ('latest published posts',
+                                    before[1], after[1]))
+
+
+if __name__ == '__main__':
+    main()
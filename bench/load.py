@@ -0,0 +1,210 @@
+"""Load test the main page types through the full WSGI stack
+
+Builds the application with ``make_app`` from a config file (the
+database is swapped for a throwaway SQLite file), seeds it with
+``--posts`` posts with ``--comments`` comments each, ``--tags`` tags
+and ``--pages`` pages, and then drives it in-process with WebTest, the
+same way the functional tests do.  For each page type it reports
+requests per second, p50/p95/p99 latency and SQL queries per request
+(from wattman.lib.instrument).  Results are written as JSON so that
+runs can be compared::
+
+    $ python bench/load.py --posts 5000 --output before.json
+    $ python bench/load.py --posts 5000 --output after.json \\
+          --compare before.json
+
+"""
+import datetime
+import optparse
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from paste.deploy import appconfig
+from pylons import config
+from webtest import TestApp
+
+from wattman.config.middleware import make_app
+from wattman.model import Session, Comment, Page, Post, Tag, metadata
+from wattman.model.pathindex import path_index
+from wattman.model.rendering import rerender
+from wattman.model.search import search_index
+from wattman.model.summary import content_summary
+
+WORDS = ('python pylons wattman blog post page comment tag search cache '
+         'index query session engine template render static feed').split()
+
+
+def text(words):
+    return u' '.join(random.choice(WORDS) for i in xrange(words))
+
+
+def seed(engine, posts, comments, tags, pages, batch=5000):
+    """Bulk insert the site's content with executemany"""
+    def insert(table, rows):
+        for i in xrange(0, len(rows), batch):
+            engine.execute(table.insert(), rows[i:i + batch])
+    start = datetime.date(2000, 1, 1)
+    insert(Tag.table, [dict(name=u'tag%d' % i, path=u'tag%d' % i)
+                       for i in xrange(tags)])
+    insert(Post.table, [dict(id=i + 1, title=text(4), path=u'post-%d' % i,
+                             content=text(200), draft=i % 20 == 0,
+                             comments_allowed=True,
+                             posted_on=start + datetime.timedelta(hours=i),
+                             comment_count=0, approved_count=0)
+                        for i in xrange(posts)])
+    page_tag = Post.tags.property.secondary
+    rows = []
+    for i in xrange(posts):
+        for name in random.sample(xrange(tags), min(3, tags)):
+            rows.append(dict(post_id=i + 1, tag_name=u'tag%d' % name))
+    insert(page_tag, rows)
+    insert(Comment.table, [dict(post_id=i // comments + 1, name=text(2),
+                                content=text(30), approved=i % 4 != 0)
+                           for i in xrange(posts * comments)])
+    insert(Page.table, [dict(title=text(3), path=u'page-%d' % i,
+                             content=text(300)) for i in xrange(pages)])
+    Post.rebuild_comment_counts()
+    for entity in Post, Page:
+        rerender(Session, entity)
+    search_index.rebuild(Session)
+    content_summary.rebuild(Session)
+    Session.commit()
+    Session.remove()
+    path_index.load()
+
+
+def percentile(values, fraction):
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def measure(app, urls, requests):
+    """Request ``requests`` random ``urls``; returns the statistics"""
+    instrumentation = config['pylons.app_globals'].instrumentation
+    for url in urls[:10]:
+        # warm up (template compilation and so on)
+        app.get(url, status='*')
+    latencies, queries, statuses = [], 0, {}
+    start = time.time()
+    for i in xrange(requests):
+        url = random.choice(urls)
+        began = time.time()
+        response = app.get(url, status='*')
+        latencies.append((time.time() - began) * 1000)
+        queries += instrumentation.history[-1].queries
+        statuses[response.status_int] = \
+            statuses.get(response.status_int, 0) + 1
+    elapsed = time.time() - start
+    latencies.sort()
+    return dict(requests=requests, rps=requests / elapsed,
+                p50=percentile(latencies, 0.5),
+                p95=percentile(latencies, 0.95),
+                p99=percentile(latencies, 0.99),
+                queries=queries / float(requests),
+                statuses=dict((str(k), v) for k, v in statuses.items()))
+
+
+def revision():
+    try:
+        return subprocess.Popen(['git', 'rev-parse', '--short', 'HEAD'],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE).communicate()[0] \
+            .strip() or None
+    except OSError:
+        return None
+
+
+def report(results, previous=None):
+    print('%-8s %9s %9s %9s %9s %9s' % ('', 'req/s', 'p50 ms', 'p95 ms',
+                                        'p99 ms', 'queries'))
+    for name in sorted(results):
+        result = results[name]
+        print('%-8s %9.1f %9.2f %9.2f %9.2f %9.1f' % (
+            name, result['rps'], result['p50'], result['p95'],
+            result['p99'], result['queries']))
+        if previous and name in previous:
+            old = previous[name]
+            print('%-8s %+8.0f%% %+8.0f%% %+8.0f%% %+8.0f%% %+9.1f' % (
+                '', change(old['rps'], result['rps']),
+                change(old['p50'], result['p50']),
+                change(old['p95'], result['p95']),
+                change(old['p99'], result['p99']),
+                result['queries'] - old['queries']))
+
+
+def change(old, new):
+    return old and (new - old) / old * 100 or 0
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--config', default='development.ini')
+    parser.add_option('--posts', type='int', default=2000)
+    parser.add_option('--comments', type='int', default=10,
+                      help='comments per post')
+    parser.add_option('--tags', type='int', default=50)
+    parser.add_option('--pages', type='int', default=20)
+    parser.add_option('--requests', type='int', default=500,
+                      help='requests per page type')
+    parser.add_option('--page-cache', action='store_true',
+                      help='enable the page cache')
+    parser.add_option('--output', default='load-results.json')
+    parser.add_option('--compare', help='an earlier run to compare with')
+    options, args = parser.parse_args()
+    random.seed(0)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        conf = appconfig('config:%s' % os.path.abspath(options.config))
+        app_conf = dict(conf.local_conf)
+        app_conf.update({'sqlalchemy.url': 'sqlite:///%s' % path,
+                         'sqlalchemy.echo': 'false',
+                         'instrument.enabled': 'true',
+                         'instrument.slow': '60',
+                         'instrument.profile': 'false',
+                         'pagecache.enabled': str(bool(options.page_cache))})
+        app = TestApp(make_app(conf.global_conf, **app_conf))
+        seed(metadata.bind, options.posts, options.comments, options.tags,
+             options.pages)
+
+        posts = ['/post/post-%d' % i for i in xrange(options.posts)
+                 if i % 20]
+        page_types = dict(
+            post=posts,
+            tag=['/tag/tag%d' % i for i in xrange(options.tags)],
+            page=['/page/page-%d' % i for i in xrange(options.pages)],
+            search=['/search?q=%s' % word for word in WORDS],
+            notfound=['/post/missing-%d' % i for i in xrange(100)])
+        results = {}
+        for name, urls in sorted(page_types.items()):
+            results[name] = measure(app, urls, options.requests)
+    finally:
+        os.remove(path)
+
+    previous = None
+    if options.compare:
+        previous = json.load(open(options.compare))['results']
+    report(results, previous)
+    run = dict(date=datetime.datetime.now().isoformat(),
+               revision=revision(), python=sys.version.split()[0],
+               platform=platform.platform(), options=options.__dict__,
+               results=results)
+    f = open(options.output, 'w')
+    try:
+        json.dump(run, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+    print('Results written to %s' % options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark the middleware stack's overhead per request: the full stack
+against the fast lane (wattman.lib.fastlane)
+
+Builds the application with ``make_app`` from a config file (with a
+throwaway SQLite database, and without the page cache, so every
+request reaches the controller), seeds it like bench/load.py, then
+sends each anonymous GET down both stacks in turn and reports the mean
+time per request of each and the difference, which is what the
+skipped middleware costs::
+
+    $ python bench/middleware.py --requests 2000
+
+"""
+import optparse
+import os
+import random
+import tempfile
+import time
+
+from paste.deploy import appconfig
+from webob import Request
+
+from wattman.config.middleware import make_app
+from wattman.lib.fastlane import FastLaneMiddleware
+from wattman.model import metadata
+
+from load import seed
+
+
+def compare(lane, urls, requests):
+    """Mean milliseconds a request down the full stack and the fast
+    lane, sending each URL down both in turn"""
+    stacks = [lane.app, lane.fast_app]
+    for url in urls[:10]:
+        # warm up (template compilation and so on)
+        for app in stacks:
+            Request.blank(url).get_response(app)
+    totals = [0.0, 0.0]
+    for i in xrange(requests):
+        url = urls[i % len(urls)]
+        for j in (i % 2, 1 - i % 2):
+            start = time.time()
+            response = Request.blank(url).get_response(stacks[j])
+            totals[j] += time.time() - start
+            assert response.status_int in (200, 404), response.status
+    return [total / requests * 1000 for total in totals]
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--config', default='development.ini')
+    parser.add_option('--posts', type='int', default=200)
+    parser.add_option('--requests', type='int', default=1000,
+                      help='requests per page type and stack')
+    options, args = parser.parse_args()
+    random.seed(0)
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        conf = appconfig('config:%s' % os.path.abspath(options.config))
+        app_conf = dict(conf.local_conf)
+        app_conf.update({'sqlalchemy.url': 'sqlite:///%s' % path,
+                         'sqlalchemy.echo': 'false',
+                         'instrument.enabled': 'false',
+                         'pagecache.enabled': 'false',
+                         'fastlane.enabled': 'true',
+                         'static_files': 'false'})
+        lane = make_app(conf.global_conf, **app_conf)
+        assert isinstance(lane, FastLaneMiddleware)
+        seed(metadata.bind, options.posts, 5, 10, 5)
+
+        page_types = dict(
+            post=['/post/post-%d' % i for i in xrange(options.posts)
+                  if i % 20],
+            tag=['/tag/tag%d' % i for i in xrange(10)],
+            feed=['/feed.atom', '/feed.rss'],
+            notfound=['/post/missing-%d' % i for i in xrange(100)])
+        results = []
+        for name, urls in sorted(page_types.items()):
+            assert [url for url in urls if not lane.eligible(
+                Request.blank(url).environ)] == []
+            results.append([name] + compare(lane, urls, options.requests))
+    finally:
+        os.remove(path)
+
+    print('Mean of %d requests (ms)' % options.requests)
+    print('%-10s %10s %10s %10s' % ('', 'full', 'fast lane', 'saved'))
+    for name, full, fast in results:
+        print('%-10s %10.3f %10.3f %10.3f' % (name, full, fast, full - fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark deep pages of the published posts: OFFSET against keyset
+pagination (wattman.lib.pagination)
+
+Seeds a throwaway SQLite database with enough posts for ``--page``
+pages of ``--per-page`` (100,020 for page 5000 of 20), then times
+fetching page 1 and page ``--page`` both ways.  OFFSET paging gets
+slower the deeper the page; keyset paging shouldn't::
+
+    $ python bench/pagination.py --page 5000
+
+"""
+import optparse
+import os
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+from wattman import model
+from wattman.lib.pagination import post_keyset, post_page
+from wattman.model import Session, Post
+
+from indexes import seed
+
+
+def timed(func, repeat):
+    start = time.time()
+    for i in xrange(repeat):
+        func()
+        Session.expunge_all()
+    return (time.time() - start) / repeat * 1000
+
+
+def run(page, per_page, repeat):
+    def offset(number):
+        return lambda: Post.published().offset((number - 1) * per_page) \
+            .limit(per_page).all()
+    # the cursor the previous page would have linked to
+    last = Post.published().offset((page - 1) * per_page - 1).first()
+    cursor = post_keyset.encode(False, last)
+    assert [p.id for p in post_page(cursor, per_page)] == \
+        [p.id for p in offset(page)()]
+    Session.expunge_all()
+    return [(timed(offset(1), repeat), timed(offset(page), repeat)),
+            (timed(lambda: post_page(None, per_page), repeat),
+             timed(lambda: post_page(cursor, per_page), repeat))]
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--page', type='int', default=5000)
+    parser.add_option('--per-page', type='int', default=20)
+    parser.add_option('--repeat', type='int', default=50)
+    options, args = parser.parse_args()
+    # one in ten seeded posts is a draft
+    posts = options.page * options.per_page * 10 // 9 + options.per_page
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = sa.create_engine('sqlite:///%s' % path)
+        model.init_model(engine)
+        seed(engine, posts)
+        engine.execute('ANALYZE')
+        results = run(options.page, options.per_page, options.repeat)
+    finally:
+        os.remove(path)
+
+    print('%d posts, %d per page, mean of %d runs (ms)' % (
+        posts, options.per_page, options.repeat))
+    print('%-10s %10s %10s' % ('', 'page 1', 'page %d' % options.page))
+    for name, (first, deep) in zip(['offset', 'keyset'], results):
+        print('%-10s %10.3f %10.3f' % (name, first, deep))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark URL matching and generation: the routes Mapper against
+wattman.lib.dispatch.DispatchMapper
+
+Connects the application's routes (wattman.config.routing) to a plain
+Mapper, to one that rescans the controllers on every match (as in
+debug mode), and to a DispatchMapper, then times matching a mix of
+content and other URLs, and generating content URLs, with each::
+
+    $ python bench/routing.py --urls 1000 --repeat 20
+
+With more distinct URLs than ``--cache-size`` the match cache can't
+help, which shows what the dispatch table alone is worth.
+"""
+import optparse
+import os
+import time
+
+from routes import Mapper
+
+import wattman
+from wattman.config.routing import connect_routes
+from wattman.lib.dispatch import DispatchMapper
+
+CONTROLLERS = os.path.join(os.path.dirname(wattman.__file__), 'controllers')
+
+
+def urls(count):
+    kinds = ['/post/post-%d', '/tag/tag-%d', '/page/page-%d',
+             '/tag/tag-%d/feed.atom', '/post/post-%d/comments.rss',
+             '/admin/edit/%d']
+    return [kinds[i % len(kinds)] % i for i in xrange(count)] + \
+        ['/feed.atom', '/search']
+
+
+def args(count):
+    return [dict(controller=kind, action='view', path=u'%s-%d' % (kind, i))
+            for i in xrange(count) for kind in ('post', 'tag', 'page')]
+
+
+def timed(func, items, repeat):
+    """Operations a second"""
+    start = time.time()
+    for i in xrange(repeat):
+        for item in items:
+            func(item)
+    return len(items) * repeat / (time.time() - start)
+
+
+def run(mapper, paths, arguments, repeat):
+    # warm up: create the regexps and generation tables
+    mapper.routematch(paths[0])
+    mapper.generate(**arguments[0])
+    assert mapper.generate(**arguments[0]) == '/post/post-0'
+    match = timed(mapper.routematch, paths, repeat)
+    generate = timed(lambda kwargs: mapper.generate(**kwargs), arguments,
+                     repeat)
+    return match, generate
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--urls', type='int', default=1000)
+    parser.add_option('--repeat', type='int', default=20)
+    parser.add_option('--cache-size', type='int', default=10000)
+    options, args_ = parser.parse_args()
+    paths = urls(options.urls)
+    arguments = args(options.urls // 3)
+
+    mappers = [
+        ('Mapper', Mapper(directory=CONTROLLERS)),
+        ('Mapper (scan)', Mapper(directory=CONTROLLERS, always_scan=True)),
+        ('DispatchMapper', DispatchMapper(directory=CONTROLLERS,
+                                          cache_size=options.cache_size))]
+    print('%d URLs, %d generated, %d runs (operations a second)' % (
+        len(paths), len(arguments), options.repeat))
+    print('%-16s %12s %12s' % ('', 'match', 'generate'))
+    for name, mapper in mappers:
+        connect_routes(mapper)
+        # scanning is slow enough that fewer runs will do
+        repeat = mapper.always_scan and 1 or options.repeat
+        match, generate = run(mapper, paths, arguments, repeat)
+        print('%-16s %12.0f %12.0f' % (name, match, generate))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark full-text search on a large site
+
+Seeds a throwaway SQLite database with N posts (100,000 by default) of
+random text, builds the search index and times ranked searches for
+rare, common and multi-word queries.  Run it with wattman installed
+(``python setup.py develop``)::
+
+    $ python bench/search.py --posts 100000
+
+"""
+import datetime
+import optparse
+import os
+import random
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+from wattman import model
+from wattman.model import Session, Post
+from wattman.model.search import search_index
+
+WORDS = [u'w%04d' % i for i in range(5000)]
+
+
+def text(words):
+    # Zipf-ish: low numbered words are far more common
+    return u' '.join(WORDS[int(random.paretovariate(1.0)) % len(WORDS)]
+                     for i in xrange(words))
+
+
+def seed(engine, posts):
+    rows = []
+    for i in xrange(posts):
+        rows.append(dict(title=text(6), path=u'post-%d' % i,
+                         content=text(200), draft=False,
+                         posted_on=datetime.date(2000, 1, 1),
+                         comment_count=0, approved_count=0))
+        if len(rows) == 5000:
+            engine.execute(Post.table.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(Post.table.insert(), rows)
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--posts', type='int', default=100000)
+    parser.add_option('--repeat', type='int', default=100)
+    options, args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        engine = sa.create_engine('sqlite:///%s' % path)
+        model.init_model(engine)
+        seed(engine, options.posts)
+        start = time.time()
+        search_index.rebuild(Session)
+        Session.commit()
+        print('Indexed %d posts in %.1fs' % (options.posts,
+                                             time.time() - start))
+        print('%-28s %8s %10s' % ('query', 'hits', 'ms/search'))
+        for terms in [WORDS[4000], WORDS[400], WORDS[40],
+                      u'%s %s' % (WORDS[30], WORDS[300])]:
+            start = time.time()
+            for i in xrange(options.repeat):
+                results = search_index.search(Session, terms)
+            print('%-28s %8d %10.3f' % (terms, results.total,
+                  (time.time() - start) / options.repeat * 1000))
+    finally:
+        Session.remove()
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark session storage under concurrent requests: Beaker's file
+backend against the SQLite and memory stores (wattman.lib.sessions)
+
+Wraps a small WSGI application that reads its session on most requests
+and changes it on the rest (``--write-ratio``) in Beaker's
+``SessionMiddleware``, configured for each store in turn as make_app
+configures it, opens ``--sessions`` sessions and then sends requests
+carrying their cookies from ``--threads`` threads at once.  Reports
+requests a second, then how long the SQLite store takes to sweep the
+sessions when they've all expired::
+
+    $ python bench/sessions.py --threads 8 --requests 4000
+
+"""
+import optparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from beaker.middleware import SessionMiddleware
+from webob import Request
+
+from wattman.lib.sessions import SessionStore
+
+STORES = ['file', 'sqlite', 'memory']
+
+
+def app(environ, start_response):
+    """Reads the session on /show; adds to it on /count"""
+    session = environ['beaker.session']
+    if environ['PATH_INFO'] == '/count':
+        session['visits'] = session.get('visits', 0) + 1
+        session.save()
+    body = str(session.get('visits'))
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [body]
+
+
+def build(type, directory):
+    """The application with sessions stored in ``type``, and its
+    SessionStore"""
+    conf = {'pylons.cache_dir': directory,
+            'beaker.session.key': 'wattman',
+            'beaker.session.secret': 'somesecret',
+            'beaker.session.data_dir': directory + '/sessions',
+            'sessions.type': type}
+    sessions = SessionStore.from_config(conf)
+    return (SessionMiddleware(app, conf, **sessions.middleware_options()),
+            sessions)
+
+
+def open_sessions(wrapped, count):
+    """Cookies for ``count`` new sessions"""
+    cookies = []
+    for i in range(count):
+        response = Request.blank('/count').get_response(wrapped)
+        cookies.append(response.headers['Set-Cookie'].split(';')[0])
+    return cookies
+
+
+def rate(wrapped, cookies, threads, requests, write_ratio):
+    """Requests a second from ``threads`` threads at once"""
+    per_thread = requests // threads
+    errors = []
+
+    def run(seed):
+        rand = random.Random(seed)
+        try:
+            for i in range(per_thread):
+                path = rand.random() < write_ratio and '/count' or '/show'
+                request = Request.blank(path, headers={
+                    'Cookie': rand.choice(cookies)})
+                response = request.get_response(wrapped)
+                assert response.status_int == 200, response.status
+        except Exception:
+            errors.append(seed)
+            raise
+
+    workers = [threading.Thread(target=run, args=(i,))
+               for i in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    assert not errors, 'a worker failed'
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__)
+    parser.add_option('--threads', type='int', default=8)
+    parser.add_option('--requests', type='int', default=4000)
+    parser.add_option('--sessions', type='int', default=500)
+    parser.add_option('--write-ratio', type='float', default=0.1)
+    options, args = parser.parse_args()
+
+    results = []
+    for type in STORES:
+        directory = tempfile.mkdtemp()
+        try:
+            wrapped, sessions = build(type, directory)
+            cookies = open_sessions(wrapped, options.sessions)
+            results.append((type, rate(wrapped, cookies, options.threads,
+                                       options.requests,
+                                       options.write_ratio)))
+            if type == 'sqlite':
+                sessions.expire = -1
+                start = time.time()
+                swept = sessions.sweep()
+                sweep = (swept, time.time() - start)
+        finally:
+            shutil.rmtree(directory)
+
+    print('%d requests from %d threads, %d sessions, %.0f%% writes' % (
+        options.requests, options.threads, options.sessions,
+        options.write_ratio * 100))
+    print('%-8s %12s' % ('', 'requests/s'))
+    for type, requests in results:
+        print('%-8s %12.0f' % (type, requests))
+    print('Swept %d expired SQLite sessions in %.1f ms' % (
+        sweep[0], sweep[1] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -35,5 +35,14 @@ setup(
 
     [paste.app_install]
     main = pylons.util:PylonsInstaller
+
+    [paste.paster_command]
+    repair-counters = wattman.lib.commands:RepairCountersCommand
+    rebuild-search = wattman.lib.commands:RebuildSearchCommand
+    render-content = wattman.lib.commands:RenderContentCommand
+    export-site = wattman.lib.commands:ExportSiteCommand
+    import-content = wattman.lib.commands:ImportContentCommand
+    warm-templates = wattman.lib.commands:WarmTemplatesCommand
+    build-assets = wattman.lib.commands:BuildAssetsCommand
     """,
 )
@@ -2,15 +2,21 @@
 import os
 
 from mako.lookup import TemplateLookup
+from paste.deploy.converters import asbool
 from pylons import config
 from pylons.error import handle_mako_error
 
 import wattman.lib.app_globals as app_globals
 import wattman.lib.helpers
 from wattman.config.routing import make_map
+from wattman.lib.export import ExportInvalidator, export_dir
+from wattman.lib.instrument import SQLTimer
+from wattman.lib.moderation import ModerationQueue
+from wattman.lib.pagecache import PageCacheInvalidator
+from wattman.lib.templates import log_results, warm_up
 
-from sqlalchemy import engine_from_config
 from wattman.model import init_model
+from wattman.model.engine import engine_from_config, read_engines_from_config
 import wattman.model as model
 import elixir as elixir
 
@@ -40,11 +46,26 @@ def load_environment(global_conf, app_conf):
         input_encoding='utf-8', default_filters=['escape'],
         imports=['from webhelpers.html import escape'])
 
+    # Compile the templates now rather than on the first requests
+    if asbool(config.get('templates.warmup', False)):
+        log_results(warm_up(config['pylons.app_globals'].mako_lookup))
+
     # CONFIGURATION OPTIONS HERE (note: all config options will override
     # any Pylons config options)
     # Setup Elixir
 
-    engine = engine_from_config(config, 'sqlalchemy.')
+    # Invalidate cached pages as content changes
+    model.register_extension(
+        PageCacheInvalidator(config['pylons.app_globals'].page_cache))
+
+    # Remove exported pages as the content they show changes
+    model.register_extension(ExportInvalidator(export_dir(config)))
+
+    engine_options = {}
+    instrumentation = config['pylons.app_globals'].instrumentation
+    if instrumentation.enabled:
+        engine_options['proxy'] = SQLTimer(instrumentation)
+    engine = engine_from_config(config, 'sqlalchemy.', **engine_options)
     if model.elixir.options_defaults.get('autoload'):
         # Reflected tables
         model.elixir.bind = engine
@@ -52,6 +73,11 @@ def load_environment(global_conf, app_conf):
         model.elixir.setup_all()
     else:
         # Non-reflected tables
-        model.init_model(engine)
-
+        model.init_model(engine, *read_engines_from_config(
+            config, **engine_options))
 
+    # Check public comments for spam in the background (started by
+    # make_app, in the serving process only)
+    if wattman.lib.helpers.wattman_use_akismet():
+        config['pylons.app_globals'].moderation = \
+            ModerationQueue.from_config(config)
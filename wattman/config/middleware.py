@@ -1,15 +1,18 @@
 """Pylons middleware initialization"""
 from beaker.middleware import CacheMiddleware, SessionMiddleware
-from paste.cascade import Cascade
 from paste.registry import RegistryManager
-from paste.urlparser import StaticURLParser
 from paste.deploy.converters import asbool
 from pylons import config
-from pylons.middleware import ErrorHandler, StatusCodeRedirect
+from pylons.middleware import ErrorHandler
 from pylons.wsgiapp import PylonsApp
 from routes.middleware import RoutesMiddleware
 
 from wattman.config.environment import load_environment
+from wattman.lib.assets import AssetMiddleware
+from wattman.lib.errors import ErrorDocumentRedirect
+from wattman.lib.fastlane import FastLaneMiddleware
+from wattman.lib.instrument import InstrumentMiddleware
+from wattman.lib.pagecache import PageCacheMiddleware
 
 from authkit import authenticate
 from tw import api as twa
@@ -45,9 +48,14 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
 
     # Routing/Session/Cache Middleware
     app = RoutesMiddleware(app, config['routes.map'])
-    app = SessionMiddleware(app, config)
+    app = SessionMiddleware(
+        app, config,
+        **config['pylons.app_globals'].sessions.middleware_options())
     app = CacheMiddleware(app, config)
 
+    # Anonymous reads of read-only routes skip ToscaWidgets and AuthKit
+    fast_app = app
+
     # CUSTOM MIDDLEWARE HERE (filtered by error handling middlewares)
     app = twa.make_middleware(app, {
         'toscawidgets.framework': 'pylons',
@@ -60,21 +68,44 @@ def make_app(global_conf, full_stack=True, static_files=True, **app_conf):
     if asbool(full_stack):
         # Handle Python exceptions
         app = ErrorHandler(app, global_conf, **config['pylons.errorware'])
+        fast_app = ErrorHandler(fast_app, global_conf,
+                                **config['pylons.errorware'])
 
         app = authenticate.middleware(app, app_conf)
         # Display error documents for 401, 403, 404 status codes (and
         # 500 when debug is disabled)
+        # (from memory once they've been rendered; see
+        # wattman/lib/errors.py)
+        pages = config['pylons.app_globals'].error_pages
         if asbool(config['debug']):
-            app = StatusCodeRedirect(app)
+            app = ErrorDocumentRedirect(app, pages)
+            fast_app = ErrorDocumentRedirect(fast_app, pages)
         else:
-            app = StatusCodeRedirect(app, [401, 403, 404, 500])
+            errors = [401, 403, 404, 500]
+            app = ErrorDocumentRedirect(app, pages, errors)
+            fast_app = ErrorDocumentRedirect(fast_app, pages, errors)
 
     # Establish the Registry for this application
     app = RegistryManager(app)
+    fast_app = RegistryManager(fast_app)
+
+    app = FastLaneMiddleware.from_config(app, fast_app, config)
+
+    # Serve anonymous visitors' content pages from the page cache
+    app = PageCacheMiddleware.from_config(app, config)
+
+    # Per-request SQL and timing statistics
+    if config['pylons.app_globals'].instrumentation.enabled:
+        app = InstrumentMiddleware(app,
+                                   config['pylons.app_globals'].instrumentation)
 
     if asbool(static_files):
-        # Serve static files
-        static_app = StaticURLParser(config['pylons.paths']['static_files'])
-        app = Cascade([static_app, app])
+        # Serve static files, including exported pages
+        app = AssetMiddleware.from_config(app, config)
+
+    # Start the background work (spam checks and so on); turned off for
+    # copies of the application that only render pages
+    if asbool(app_conf.get('background_tasks', True)):
+        config['pylons.app_globals'].start()
 
     return app
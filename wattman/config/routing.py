@@ -4,13 +4,21 @@ The more specific and detailed routes should be defined first so they
 may take precedent over the more generic routes. For more information
 refer to the routes manual at http://routes.groovie.org/docs/
 """
+from paste.deploy.converters import asint
 from pylons import config
-from routes import Mapper
+
+from wattman.lib.dispatch import DispatchMapper
 
 def make_map():
     """Create, configure and return the routes Mapper"""
-    map = Mapper(directory=config['pylons.paths']['controllers'],
-                 always_scan=config['debug'])
+    map = DispatchMapper(
+        cache_size=asint(config.get('routes.cache_size', 10000)),
+        directory=config['pylons.paths']['controllers'],
+        always_scan=config['debug'])
+    return connect_routes(map)
+
+def connect_routes(map):
+    """Connect the application's routes to the Mapper ``map``"""
     map.minimization = False
 
     # The ErrorController route (handles 404/500 error pages); it should
@@ -19,6 +27,17 @@ def make_map():
     map.connect('/error/{action}/{id}', controller='error')
 
     # CUSTOM ROUTES HERE
+    map.connect('/search', controller='search', action='index')
+    map.connect('/post/{path}', controller='post', action='view')
+    map.connect('/page/{path}', controller='page', action='view')
+    map.connect('/tag/{path}', controller='tag', action='view')
+    feeds = dict(format='atom|rss')
+    map.connect('/feed.{format}', controller='feed', action='site',
+                requirements=feeds)
+    map.connect('/tag/{path}/feed.{format}', controller='feed',
+                action='tag', requirements=feeds)
+    map.connect('/post/{path}/comments.{format}', controller='feed',
+                action='comments', requirements=feeds)
 
     map.connect('/{controller}/{action}')
     map.connect('/{controller}/{action}/{id}')
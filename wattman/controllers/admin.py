@@ -0,0 +1,20 @@
+import logging
+
+from authkit.authorize.pylons_adaptors import authorize
+from authkit.permissions import ValidAuthKitUser
+from pylons import app_globals
+from pylons.decorators import jsonify
+
+from wattman.lib.base import BaseController
+
+log = logging.getLogger(__name__)
+
+class AdminController(BaseController):
+
+    """Site administration"""
+
+    @authorize(ValidAuthKitUser())
+    @jsonify
+    def instrumentation(self):
+        """Per-route request statistics (see lib/instrument.py)"""
+        return app_globals.instrumentation.summary()
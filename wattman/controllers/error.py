@@ -1,12 +1,9 @@
-import cgi
-
-from paste.urlparser import PkgResourcesParser
-from pylons import request
-from pylons.controllers.util import forward
-from pylons.middleware import error_document_template
-from webhelpers.html.builder import literal
+from pylons import app_globals, request, response
+from pylons.controllers.util import abort
+from webob.exc import HTTPNotModified
 
 from wattman.lib.base import BaseController
+from wattman.lib.errors import document_args
 
 class ErrorController(BaseController):
 
@@ -21,26 +18,31 @@ class ErrorController(BaseController):
     """
 
     def document(self):
-        """Render the error document"""
-        resp = request.environ.get('pylons.original_response')
-        content = literal(resp.body) or cgi.escape(request.GET.get('message', ''))
-        page = error_document_template % \
-            dict(prefix=request.environ.get('SCRIPT_NAME', ''),
-                 code=cgi.escape(request.GET.get('code', str(resp.status_int))),
-                 message=content)
-        return page
+        """Render the error document (once per distinct document; see
+        wattman/lib/errors.py)"""
+        body, etag = app_globals.error_pages.document(*document_args(
+            request, request.environ.get('pylons.original_response')))
+        response.headers['ETag'] = etag
+        return body
 
     def img(self, id):
         """Serve Pylons' stock images"""
-        return self._serve_file('/'.join(['media/img', id]))
+        return self._serve_asset('img/' + id)
 
     def style(self, id):
         """Serve Pylons' stock stylesheets"""
-        return self._serve_file('/'.join(['media/style', id]))
-
-    def _serve_file(self, path):
-        """Call Paste's FileApp (a WSGI application) to serve the file
-        at the specified path
-        """
-        request.environ['PATH_INFO'] = '/%s' % path
-        return forward(PkgResourcesParser('pylons', 'pylons'))
+        return self._serve_asset('style/' + id)
+
+    def _serve_asset(self, path):
+        """Serve the image or stylesheet at ``path`` from memory"""
+        asset = app_globals.error_pages.assets.get(path)
+        if asset is None:
+            abort(404)
+        response.headers['Content-Type'] = asset.content_type
+        response.headers['ETag'] = asset.etag
+        response.headers['Cache-Control'] = 'public, max-age=86400'
+        response.headers.pop('Pragma', None)
+        if asset.etag.strip('"') in request.if_none_match:
+            response.headers.pop('Content-Type')
+            raise HTTPNotModified()
+        return asset.body
@@ -0,0 +1,97 @@
+import logging
+
+from pylons import app_globals, request, response
+from pylons.controllers.util import abort
+from webhelpers.html import escape
+
+from wattman.lib import helpers as h
+from wattman.lib import markup
+from wattman.lib.base import BaseController
+from wattman.lib.feeds import CONTENT_TYPES, Entry, Feed, write_feed
+from wattman.model import Comment, Post, Tag
+
+log = logging.getLogger(__name__)
+
+# Entries per feed
+SIZE = 20
+
+class FeedController(BaseController):
+
+    """Atom and RSS feeds of the latest posts, of a tag's posts and of
+    a post's comments
+
+    Each feed is written once per change and served from
+    ``app_globals.feed_cache`` until the next one (see
+    wattman/lib/feeds.py).
+    """
+
+    def site(self, format):
+        """The latest published posts"""
+        stamp = Post.listing_stamp()
+        return self._serve('site', stamp, format,
+                           lambda: self._posts(u'Latest posts', '/',
+                                               Post.recent(SIZE), stamp[0]))
+
+    def tag(self, path, format):
+        """The latest published posts tagged with ``path``"""
+        tag = Tag.query.filter_by(path=path).first()
+        if tag is None:
+            abort(404)
+        stamp = Post.listing_stamp(tag)
+        return self._serve('tag:' + tag.name, stamp, format,
+                           lambda: self._posts(
+                               u'Posts tagged %s' % tag.name,
+                               h.content_url('tag', tag.path),
+                               Post.by_tag(path, SIZE), stamp[0]))
+
+    def comments(self, path, format):
+        """The latest approved comments on the post at ``path``"""
+        post = Post.query.filter_by(path=path).first()
+        if post is None or post.draft:
+            abort(404)
+        modified = post.updated_on or post.posted_on
+        return self._serve('comments:%s' % post.id, (modified,), format,
+                           lambda: self._comments(post), modified)
+
+    def _serve(self, key, stamp, format, build, modified=None):
+        """Answer with the feed ``build()`` makes, cached until
+        ``stamp`` changes
+
+        ``modified`` is sent as Last-Modified; listings of posts leave it
+        out, since it can stay the same when a post is deleted (see
+        ``Post.listing_stamp()``).
+        """
+        self.conditional(modified, 'feed', key, format, repr(stamp))
+        body = app_globals.feed_cache.get(
+            '%s %s %s' % (request.host_url, key, format),
+            (stamp, markup.VERSION),
+            lambda: write_feed(format, build()))
+        response.headers['Content-Type'] = CONTENT_TYPES[format]
+        return [body]
+
+    def _url(self, path):
+        return request.host_url + path
+
+    def _posts(self, title, link, posts, updated):
+        entries = [Entry(post.title, self._url(h.content_url('post',
+                                                              post.path)),
+                         post.updated_on or post.posted_on,
+                         h.content_html(post), published=post.posted_on,
+                         categories=[tag.name for tag in post.tags])
+                   for post in posts]
+        return Feed(title, self._url(link), self._url(request.path_info),
+                    updated, entries)
+
+    def _comments(self, post):
+        comments = Comment.query.filter_by(post=post, approved=True) \
+            .order_by(Comment.created_on.desc(), Comment.id.desc()) \
+            .limit(SIZE).all()
+        link = self._url(h.content_url('post', post.path))
+        entries = [Entry(u'Comment by %s' % comment.name,
+                         '%s#comment-%d' % (link, comment.id),
+                         comment.created_on, escape(comment.content),
+                         author=comment.name)
+                   for comment in comments]
+        return Feed(u'Comments on %s' % post.title, link,
+                    self._url(request.path_info),
+                    post.updated_on or post.posted_on, entries)
@@ -0,0 +1,23 @@
+import logging
+
+from pylons import request, tmpl_context as c
+from pylons.controllers.util import abort
+
+from wattman.lib.base import BaseController, render
+from wattman.lib.pagecache import depends_on
+from wattman.model import Page
+
+log = logging.getLogger(__name__)
+
+class PageController(BaseController):
+
+    """Stand-alone pages"""
+
+    def view(self, path):
+        """Show the page at ``path``"""
+        c.page = Page.query.filter_by(path=path).first()
+        if c.page is None:
+            abort(404)
+        self.conditional(c.page.updated_on or c.page.created_on, c.page)
+        depends_on(request.environ, c.page)
+        return render('/page.mako')
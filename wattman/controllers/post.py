@@ -0,0 +1,25 @@
+import logging
+
+from pylons import request, tmpl_context as c
+from pylons.controllers.util import abort
+
+from wattman.lib.base import BaseController, render
+from wattman.lib.pagecache import depends_on
+from wattman.model import Post
+
+log = logging.getLogger(__name__)
+
+class PostController(BaseController):
+
+    """Published posts"""
+
+    def view(self, path):
+        """Show the post at ``path`` with its approved comments"""
+        c.post = Post.by_path(path)
+        if c.post is None or c.post.draft:
+            abort(404)
+        self.conditional(c.post.updated_on or c.post.posted_on, c.post)
+        c.comments = [comment for comment in c.post.comments
+                      if comment.approved]
+        depends_on(request.environ, c.post)
+        return render('/post.mako')
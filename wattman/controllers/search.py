@@ -0,0 +1,23 @@
+import logging
+
+from pylons import request, tmpl_context as c
+
+from wattman.lib.base import BaseController, render
+from wattman.model import Session
+from wattman.model.search import search_index
+
+log = logging.getLogger(__name__)
+
+class SearchController(BaseController):
+
+    """Full-text search over published posts and pages"""
+
+    def index(self):
+        """Show the ranked results for ``q``, ten to a page"""
+        c.q = request.params.get('q', '').strip()
+        try:
+            page = int(request.params.get('page', 1))
+        except ValueError:
+            page = 1
+        c.results = search_index.search(Session, c.q, page)
+        return render('/search.mako')
@@ -0,0 +1,33 @@
+import logging
+
+from pylons import request, tmpl_context as c
+from pylons.controllers.util import abort
+
+from wattman.lib.base import BaseController, render
+from wattman.lib.pagecache import depends_on
+from wattman.lib.pagination import InvalidCursor, tag_page
+from wattman.model import Post, Tag
+
+log = logging.getLogger(__name__)
+
+class TagController(BaseController):
+
+    """Listings of the posts with a tag"""
+
+    def view(self, path):
+        """List the published posts tagged with ``path``, newest first,
+        a page at a time (the ``page`` parameter is a pagination cursor)"""
+        c.tag = Tag.query.filter_by(path=path).first()
+        if c.tag is None:
+            abort(404)
+        cursor = request.params.get('page')
+        # (no Last-Modified: deleting a post can leave the time of the
+        # latest change as it was, so only the ETag says it changed)
+        self.conditional(None, c.tag, cursor or '',
+                         repr(Post.listing_stamp(c.tag)))
+        try:
+            c.posts = tag_page(c.tag, cursor)
+        except InvalidCursor:
+            abort(404)
+        depends_on(request.environ, c.tag, 'post:*')
+        return render('/tag.mako')
@@ -0,0 +1,60 @@
+"""A small client for the Akismet comment spam service
+
+Only the ``comment-check`` call is implemented; that's all the
+moderation queue needs.  See http://akismet.com/development/api/
+"""
+import urllib
+import urllib2
+
+__all__ = ['Akismet', 'AkismetError']
+
+USER_AGENT = 'wattman/0.1 | akismet.py'
+
+
+class AkismetError(Exception):
+    """Raised when Akismet gives an answer we don't understand"""
+
+
+class Akismet(object):
+
+    """Checks comments against Akismet
+
+    ``api_url`` defaults to the keyed Akismet REST endpoint; point it
+    somewhere else (e.g. a local stub server) for testing.
+    """
+
+    def __init__(self, key, wattman_url, api_url=None, timeout=10):
+        self.key = key
+        self.wattman_url = wattman_url
+        if api_url is None:
+            api_url = 'http://%s.rest.akismet.com/1.1/' % key
+        if not api_url.endswith('/'):
+            api_url += '/'
+        self.api_url = api_url
+        self.timeout = timeout
+
+    def comment_check(self, comment, data):
+        """Return True if Akismet thinks ``comment`` is spam
+
+        ``data`` holds the other Akismet fields (``user_ip``,
+        ``user_agent``, ``comment_author`` and so on).
+        """
+        fields = {'blog': self.wattman_url, 'comment_content': comment}
+        fields.update(data)
+        answer = self._post('comment-check', fields)
+        if answer == 'true':
+            return True
+        elif answer == 'false':
+            return False
+        raise AkismetError('Unexpected comment-check response: %r' % answer)
+
+    def _post(self, call, fields):
+        body = urllib.urlencode(dict((k, unicode(v or '').encode('utf-8'))
+                                     for k, v in fields.items()))
+        req = urllib2.Request(self.api_url + call, body,
+                              {'User-Agent': USER_AGENT})
+        resp = urllib2.urlopen(req, timeout=self.timeout)
+        try:
+            return resp.read().strip()
+        finally:
+            resp.close()
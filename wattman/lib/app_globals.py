@@ -1,4 +1,14 @@
 """The application's Globals object"""
+from pylons import config
+
+from wattman.lib.assets import AssetManifest
+from wattman.lib.errors import ErrorPages
+from wattman.lib.export import template_stamp
+from wattman.lib.feeds import FeedCache
+from wattman.lib.instrument import Instrumentation
+from wattman.lib.linkcheck import LinkChecker
+from wattman.lib.pagecache import PageCache
+from wattman.lib.sessions import SessionStore
 
 class Globals(object):
 
@@ -13,3 +23,50 @@ class Globals(object):
         'app_globals' variable
 
         """
+        # Checks public comments for spam in the background, when
+        # Akismet is configured (see load_environment)
+        self.moderation = None
+
+        # Verifies commenters' links in the background
+        self.link_checker = LinkChecker.from_config(config)
+
+        # Fingerprinted static files (see h.asset_url)
+        self.assets = AssetManifest.from_config(config)
+
+        # Error documents and their images and stylesheets
+        self.error_pages = ErrorPages()
+
+        # Where sessions are kept (see wattman/lib/sessions.py)
+        self.sessions = SessionStore.from_config(config)
+
+        # Changes with the templates, so it's part of every ETag
+        self.template_stamp = template_stamp(
+            config['pylons.paths']['templates'])
+
+        # Rendered pages for anonymous visitors
+        self.page_cache = PageCache.from_config(
+            config, self.template_stamp + self.assets.stamp)
+
+        # Written Atom and RSS feeds
+        self.feed_cache = FeedCache.from_config(config)
+
+        # Per-request SQL and timing statistics
+        self.instrumentation = Instrumentation.from_config(config)
+
+        # Cache-Control for anonymous visitors, by controller.action
+        # (see BaseController.__after__)
+        self.cache_control = dict(
+            (key[len('cache_control.'):], value)
+            for key, value in config.items()
+            if key.startswith('cache_control.'))
+
+    def start(self):
+        """Start the background work of the serving application
+
+        Called by ``make_app``, so that paster commands, which only load
+        the environment, don't start threads of their own.
+        """
+        # Delete expired sessions
+        self.sessions.start()
+        if self.moderation is not None:
+            self.moderation.start()
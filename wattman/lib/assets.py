@@ -0,0 +1,463 @@
+"""Fingerprinted, precompressed static assets
+
+``build_assets()`` copies every static file under ``public/`` into the
+asset directory under a name with its content hash in it
+(``bg.png`` becomes ``bg.1a2b3c4d5e6f.png``), writes gzip (and, if the
+``brotli`` module is installed, brotli) variants of the files worth
+compressing, and records it all in a JSON manifest.  Builds are
+incremental: only files whose size or modification time changed are
+hashed and compressed again.  Stylesheets and HTML files are built
+after the rest, with their references to other assets (``url(bg.png)``,
+``src="logo.gif"``) rewritten to the fingerprinted URLs, so a page
+served from its original URL still gets its images from URLs that can
+be cached forever.  Run it at deploy time with::
+
+    $ paster build-assets development.ini
+
+(the application also brings the build up to date when it starts).
+Files a build supersedes are kept for ``assets.keep`` seconds (a day by
+default), so pages rendered, cached or exported before it, and server
+processes still running on the old manifest, don't point at files that
+are gone; ``paster build-assets --prune`` removes them at once.
+
+``AssetMiddleware`` loads the manifest into a dict, so a static hit is
+one lookup.  Fingerprinted URLs (``h.asset_url('/bg.png')`` in
+templates) never
+change content, so they're sent with far-future caching; the original
+URLs still work, with ``assets.cache_control``.  Files are streamed
+with the server's ``wsgi.file_wrapper`` (sendfile, where it has it) in
+the best encoding the client accepts.  Requests for anything else go
+straight to the application, except under the paths exported pages are
+written to (see wattman/lib/export.py), which are looked up in the
+export directory first.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import time
+import urlparse
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from paste.cascade import Cascade
+from paste.deploy.converters import asint
+
+from wattman.lib.export import EXPORTED_PATHS, ExportedPageParser, \
+    export_dir
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+__all__ = ['AssetManifest', 'AssetMiddleware', 'build_assets']
+
+log = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+
+# What fingerprinted URLs start with
+PREFIX = '/assets/'
+
+FOREVER = 'public, max-age=31536000, immutable'
+
+# Types worth compressing, besides text/*
+COMPRESSIBLE = ('application/javascript', 'application/x-javascript',
+                'application/json', 'application/xml', 'image/svg+xml',
+                'image/x-icon', 'image/vnd.microsoft.icon')
+
+BLOCK_SIZE = 64 * 1024
+
+# References to other files, by the types of the files that are
+# rewritten: CSS url()s, and src and href attributes
+CSS_URL_RE = re.compile(r'''(url\(\s*['"]?)([^'")\s]+)()''')
+ATTRIBUTE_RE = re.compile(r'''((?:src|href)\s*=\s*['"])([^'"]+)(['"])''',
+                          re.I)
+REFERENCE_RES = {'text/css': [CSS_URL_RE],
+                 'text/html': [ATTRIBUTE_RE, CSS_URL_RE]}
+
+
+def _compressible(content_type):
+    return content_type.startswith('text/') or content_type in COMPRESSIBLE
+
+
+def _content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def _fingerprinted(name, digest):
+    base, ext = os.path.splitext(name)
+    return '%s.%s%s' % (base, digest, ext)
+
+
+def _write(filename, data):
+    """Write ``data`` to ``filename`` atomically"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+    f = os.fdopen(fd, 'wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    os.chmod(tmp, 0o644)
+    os.rename(tmp, filename)
+
+
+def _gzip(data):
+    fd, tmp = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        f = gzip.GzipFile(tmp, 'wb', 9)
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        f = open(tmp, 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+    finally:
+        os.remove(tmp)
+
+
+# (content coding, file suffix, encoder)
+ENCODERS = [('br', '.br', brotli and brotli.compress),
+            ('gzip', '.gz', _gzip)]
+
+
+def rewrite_references(path, content_type, data, files):
+    """``data`` (the content of the asset at ``path``) with its
+    references to the assets in ``files`` pointing at their
+    fingerprinted URLs"""
+    def replace(match):
+        ref = match.group(2)
+        if ':' in ref or ref.startswith(('//', '#')):
+            return match.group(0)
+        target = urlparse.urljoin(path, ref.split('#')[0].split('?')[0])
+        if target not in files:
+            return match.group(0)
+        return match.group(1) + PREFIX + files[target]['file'] + \
+            match.group(3)
+    for reference_re in REFERENCE_RES[content_type]:
+        data = reference_re.sub(replace, data)
+    return data
+
+
+def find_assets(source_dir, skip=()):
+    """The URL paths of the static files under ``source_dir``
+
+    Dotfiles and extension-less files (exported pages) aren't assets.
+    """
+    skip = [os.path.abspath(path) for path in skip]
+    paths = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs[:] = [name for name in dirs if not name.startswith('.') and
+                   os.path.abspath(os.path.join(root, name)) not in skip]
+        for name in files:
+            if name.startswith('.') or not os.path.splitext(name)[1]:
+                continue
+            path = os.path.relpath(os.path.join(root, name), source_dir)
+            paths.append('/' + path.replace(os.sep, '/'))
+    return sorted(paths)
+
+
+def _names(entry):
+    return [entry['file']] + list(entry['encodings'].values())
+
+
+def build_assets(source_dir, output_dir, force=False, keep=86400):
+    """Bring the fingerprinted copies of the files under ``source_dir``
+    in ``output_dir`` and its manifest up to date
+
+    Files that are no longer current are removed ``keep`` seconds after
+    the build that superseded them.  Returns the manifest and the paths
+    of the files that were built.
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    old = AssetManifest.read(output_dir)
+    files, built = {}, []
+    paths = find_assets(source_dir, skip=[output_dir])
+    # (the files that refer to others last, once those have their names)
+    rewritten = lambda path: _content_type(path) in REFERENCE_RES
+    for path in [p for p in paths if not rewritten(p)] + \
+            [p for p in paths if rewritten(p)]:
+        source = os.path.join(source_dir, *path.lstrip('/').split('/'))
+        stat = os.stat(source)
+        entry = old.get(path)
+        content_type = _content_type(path)
+        unchanged = not force and entry and \
+            entry['size'] == stat.st_size and \
+            entry['mtime'] == stat.st_mtime and \
+            os.path.exists(os.path.join(output_dir, entry['file']))
+        if unchanged and content_type not in REFERENCE_RES:
+            files[path] = entry
+            continue
+        f = open(source, 'rb')
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        if content_type in REFERENCE_RES:
+            data = rewrite_references(path, content_type, data, files)
+        digest = sha1(data).hexdigest()[:12]
+        if unchanged and entry['digest'] == digest:
+            # (nor have the files it refers to)
+            files[path] = entry
+            continue
+        name = _fingerprinted(path.lstrip('/'), digest)
+        filename = os.path.join(output_dir, *name.split('/'))
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        _write(filename, data)
+        encodings = {}
+        if _compressible(content_type):
+            for encoding, suffix, encode in ENCODERS:
+                if encode is None:
+                    continue
+                compressed = encode(data)
+                if len(compressed) < len(data):
+                    _write(filename + suffix, compressed)
+                    encodings[encoding] = name + suffix
+        files[path] = dict(file=name, digest=digest, type=content_type,
+                           size=stat.st_size, mtime=stat.st_mtime,
+                           encodings=encodings)
+        built.append(path)
+    current = set([MANIFEST])
+    for entry in files.values():
+        current.update(_names(entry))
+    for entry in old.values():
+        for name in _names(entry):
+            if name not in current:
+                # (its modification time says when it was superseded)
+                try:
+                    os.utime(os.path.join(output_dir, *name.split('/')),
+                             None)
+                except OSError:
+                    pass
+    if built or set(files) != set(old):
+        _write(os.path.join(output_dir, MANIFEST), json.dumps(files))
+    prune(output_dir, current, keep)
+    return files, sorted(built)
+
+
+def prune(output_dir, current, keep):
+    """Remove the files in ``output_dir`` that aren't ``current``
+    (names relative to it) and haven't changed for ``keep`` seconds"""
+    before = time.time() - keep
+    for root, dirs, names in os.walk(output_dir):
+        for name in names:
+            filename = os.path.join(root, name)
+            relative = os.path.relpath(filename, output_dir)
+            if relative.replace(os.sep, '/') in current:
+                continue
+            try:
+                if os.path.getmtime(filename) <= before:
+                    os.remove(filename)
+            except OSError:
+                pass
+
+
+class Asset(object):
+
+    """A file as the middleware serves it: ``filename``, ``type``,
+    ``etag`` and ``encodings`` (encoding to filename)"""
+
+    def __init__(self, filename, type, etag, encodings):
+        self.filename = filename
+        self.type = type
+        self.etag = etag
+        self.encodings = encodings
+
+
+class AssetManifest(object):
+
+    """The manifest of an asset directory, for lookups by URL path"""
+
+    def __init__(self, output_dir, files):
+        self.output_dir = output_dir
+        self.files = files
+        # Changes with every build, so it's part of the stamps of
+        # everything that links to the fingerprinted URLs
+        self.stamp = sha1(repr(sorted(
+            (str(path), str(entry['digest']))
+            for path, entry in files.items()))).hexdigest()
+        self.urls = {}
+        self.fingerprinted = {}
+        for path, entry in files.items():
+            filename = os.path.join(output_dir, *entry['file'].split('/'))
+            encodings = dict(
+                (encoding, os.path.join(output_dir, *name.split('/')))
+                for encoding, name in entry['encodings'].items())
+            # (header values must be byte strings)
+            asset = Asset(filename, str(entry['type']),
+                          '"%s"' % str(entry['digest']), encodings)
+            self.urls[path] = asset
+            if path.endswith('/index.html'):
+                self.urls[path[:-len('index.html')]] = asset
+            self.fingerprinted[PREFIX + entry['file']] = asset
+
+    @classmethod
+    def from_config(cls, config):
+        """Build (or bring up to date) the assets of the public
+        directory in ``assets.dir`` and load their manifest"""
+        output_dir = config.get('assets.dir') or \
+            os.path.join(config['pylons.cache_dir'], 'assets')
+        files, built = build_assets(config['pylons.paths']['static_files'],
+                                    output_dir,
+                                    keep=asint(config.get('assets.keep',
+                                                          86400)))
+        if built:
+            log.info('Built %d of %d assets into %s', len(built),
+                     len(files), output_dir)
+        return cls(output_dir, files)
+
+    @staticmethod
+    def read(output_dir):
+        """The files recorded in the manifest in ``output_dir``"""
+        try:
+            f = open(os.path.join(output_dir, MANIFEST))
+        except IOError:
+            return {}
+        try:
+            try:
+                return json.load(f)
+            except ValueError:
+                return {}
+        finally:
+            f.close()
+
+    def url(self, path):
+        """The fingerprinted URL of ``path``, or ``path`` itself if it
+        isn't an asset"""
+        entry = self.files.get(path)
+        if entry is None:
+            return path
+        # (the manifest is read back from JSON as unicode)
+        return str(PREFIX + entry['file'])
+
+
+class AssetMiddleware(object):
+
+    """Serves the assets in ``manifest``, exported pages from
+    ``export_dir`` and everything else from ``app``
+
+    ``cache_control`` is sent with assets requested by their original
+    URL.
+    """
+
+    def __init__(self, app, manifest, export_dir,
+                 cache_control='public, max-age=3600'):
+        self.app = app
+        self.manifest = manifest
+        self.cache_control = cache_control
+        self.exported = Cascade([ExportedPageParser(export_dir), app])
+
+    @classmethod
+    def from_config(cls, app, config):
+        """Serve ``app_globals.assets``"""
+        return cls(app, config['pylons.app_globals'].assets,
+                   export_dir(config),
+                   config.get('assets.cache_control',
+                              'public, max-age=3600'))
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(PREFIX):
+            asset = self.manifest.fingerprinted.get(path)
+            if asset is None:
+                start_response('404 Not Found',
+                               [('Content-Type', 'text/plain')])
+                return ['Not Found']
+            return self.serve(environ, start_response, asset, FOREVER)
+        asset = self.manifest.urls.get(path)
+        if asset is not None:
+            return self.serve(environ, start_response, asset,
+                              self.cache_control)
+        if path.startswith(EXPORTED_PATHS):
+            return self.exported(environ, start_response)
+        return self.app(environ, start_response)
+
+    def serve(self, environ, start_response, asset, cache_control):
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed',
+                           [('Allow', 'GET, HEAD'),
+                            ('Content-Type', 'text/plain')])
+            return ['Method Not Allowed']
+        headers = [('Cache-Control', cache_control), ('ETag', asset.etag)]
+        if asset.encodings:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if asset.etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+        filename, encoding = asset.filename, None
+        if asset.encodings:
+            accepted = accepted_encodings(environ)
+            for name in 'br', 'gzip':
+                if name in asset.encodings and name in accepted:
+                    filename, encoding = asset.encodings[name], name
+                    break
+        try:
+            f = open(filename, 'rb')
+        except IOError:
+            # (the build was removed under us)
+            start_response('404 Not Found',
+                           [('Content-Type', 'text/plain')])
+            return ['Not Found']
+        size = os.fstat(f.fileno()).st_size
+        content_type = asset.type
+        if content_type.startswith('text/'):
+            content_type += '; charset=utf-8'
+        headers.extend([('Content-Type', content_type),
+                        ('Content-Length', str(size))])
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            f.close()
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(f, BLOCK_SIZE)
+
+
+def accepted_encodings(environ):
+    """The content codings the client accepts"""
+    accepted = set()
+    for part in environ.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        params = [p.strip() for p in part.split(';')]
+        if [p for p in params[1:] if p.replace(' ', '') in
+                ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')]:
+            continue
+        accepted.add(params[0].lower())
+    return accepted
+
+
+class FileWrapper(object):
+
+    """``wsgi.file_wrapper`` for servers without one"""
+
+    def __init__(self, f, block_size=BLOCK_SIZE):
+        self.f = f
+        self.block_size = block_size
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        data = self.f.read(self.block_size)
+        if not data:
+            raise StopIteration
+        return data
+    __next__ = next
+
+    def close(self):
+        self.f.close()
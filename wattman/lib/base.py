@@ -2,8 +2,31 @@
 
 Provides the BaseController class for subclassing.
 """
+import calendar
+import time
+from email.utils import formatdate
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from pylons import app_globals, config, request, response
 from pylons.controllers import WSGIController
-from pylons.templating import render_mako as render
+from pylons.templating import render_mako
+from webob import Request
+from webob.exc import HTTPNotModified
+
+from wattman.lib import markup
+from wattman.lib.pagecache import tags_for
+from wattman.model import meta
+
+def render(*args, **kwargs):
+    """Render a Mako template, timing it for the request statistics"""
+    start = time.time()
+    try:
+        return render_mako(*args, **kwargs)
+    finally:
+        app_globals.instrumentation.record_render(time.time() - start)
 
 class BaseController(WSGIController):
 
@@ -12,4 +35,67 @@ class BaseController(WSGIController):
         # WSGIController.__call__ dispatches to the Controller method
         # the request is routed to. This routing information is
         # available in environ['pylons.routes_dict']
-        return WSGIController.__call__(self, environ, start_response)
+        # Reads follow the client's own writes to the primary database
+        meta.router.begin_request(self._client(environ))
+        try:
+            return WSGIController.__call__(self, environ, start_response)
+        finally:
+            # Hand the request's connection back to the pool
+            meta.Session.remove()
+            meta.router.end_request()
+
+    def __after__(self):
+        """Send anonymous visitors the route's Cache-Control policy
+        (``cache_control.<controller>.<action>`` in the config)"""
+        route = request.environ.get('pylons.routes_dict') or {}
+        policy = app_globals.cache_control.get('%s.%s' % (
+            route.get('controller'), route.get('action')))
+        if policy and response.status_int in (200, 304) and \
+                not request.environ.get('REMOTE_USER') and \
+                'Set-Cookie' not in response.headers:
+            response.headers['Cache-Control'] = policy
+            response.headers.pop('Pragma', None)
+
+    def conditional(self, modified, *parts):
+        """Answer conditional GETs for a view of content that last
+        changed at ``modified`` (a UTC datetime or date, or None)
+
+        Sets the ETag, made from ``parts`` (the entities, or strings,
+        that identify what the view shows), ``modified``, the templates,
+        the asset build and the visitor, and Last-Modified.  Call it before rendering:
+        if the client's copy is current it stops the action with 304
+        Not Modified.
+        """
+        tags = []
+        for part in parts:
+            if not isinstance(part, basestring):
+                part = tags_for(part)
+            tags.append(part)
+        etag = sha1(repr((tags, modified and modified.isoformat(),
+                          markup.VERSION, app_globals.template_stamp,
+                          app_globals.assets.stamp,
+                          request.environ.get('REMOTE_USER')))).hexdigest()
+        response.headers['ETag'] = '"%s"' % etag
+        timestamp = None
+        if modified is not None:
+            timestamp = calendar.timegm(modified.timetuple())
+            response.headers['Last-Modified'] = formatdate(timestamp,
+                                                           usegmt=True)
+        if 'If-None-Match' in request.headers:
+            fresh = etag in request.if_none_match
+        elif timestamp is not None and request.if_modified_since:
+            fresh = calendar.timegm(
+                request.if_modified_since.utctimetuple()) >= timestamp
+        else:
+            fresh = False
+        if fresh:
+            response.headers.pop('Content-Type', None)
+            response.headers.pop('Pragma', None)
+            raise HTTPNotModified()
+
+    def _client(self, environ):
+        """Identifies the visitor: their session cookie, or failing
+        that their address"""
+        cookies = Request(environ).cookies
+        key = config.get('beaker.session.key', 'beaker.session.id')
+        return cookies.get(key) or environ.get('REMOTE_ADDR')
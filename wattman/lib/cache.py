@@ -0,0 +1,146 @@
+"""Small key/value caches with per-entry expiry"""
+import os
+import tempfile
+import threading
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+__all__ = ['FileCache', 'TTLCache']
+
+
+class TTLCache(object):
+
+    """A thread safe dict whose entries expire ``ttl`` seconds after
+    they're set
+
+    Expired entries are dropped lazily when they're looked up, and all
+    at once when the cache grows past ``max_size``.
+    """
+
+    def __init__(self, ttl, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires < time.time():
+            self.discard(key)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        self._lock.acquire()
+        try:
+            if len(self._data) >= self.max_size:
+                self._purge()
+            self._data[key] = (time.time() + ttl, value)
+        finally:
+            self._lock.release()
+
+    def discard(self, key):
+        self._lock.acquire()
+        try:
+            self._data.pop(key, None)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._data.clear()
+        finally:
+            self._lock.release()
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def __len__(self):
+        return len(self._data)
+
+    def _purge(self):
+        # called with the lock held
+        now = time.time()
+        for key, (expires, value) in self._data.items():
+            if expires < now:
+                del self._data[key]
+        if len(self._data) >= self.max_size:
+            self._data.clear()
+
+
+class FileCache(object):
+
+    """TTLCache's interface over one pickle file per key
+
+    Lets several server processes share cached values.  Writes go to a
+    temporary file that's renamed into place, so readers never see a
+    partial value.
+    """
+
+    def __init__(self, data_dir, ttl):
+        self.data_dir = data_dir
+        self.ttl = ttl
+        if not os.path.isdir(data_dir):
+            os.makedirs(data_dir)
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return default
+        try:
+            try:
+                expires, value = pickle.load(f)
+            except (EOFError, pickle.PickleError, ValueError):
+                return default
+        finally:
+            f.close()
+        if expires < time.time():
+            self.discard(key)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        fd, tmp = tempfile.mkstemp(dir=self.data_dir)
+        f = os.fdopen(fd, 'wb')
+        try:
+            pickle.dump((time.time() + ttl, value), f,
+                        pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp, self._path(key))
+
+    def discard(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.data_dir):
+            if name.endswith('.cache'):
+                os.remove(os.path.join(self.data_dir, name))
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def _path(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.data_dir, sha1(key).hexdigest() + '.cache')
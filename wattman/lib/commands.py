@@ -0,0 +1,348 @@
+"""Paster commands for maintaining a wattman site
+
+Each command takes the site's config file, loads the Pylons environment
+from it and works on the configured database, e.g.::
+
+    $ paster repair-counters development.ini
+
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+from paste.deploy import appconfig
+from paste.deploy.converters import asint
+from paste.script.command import Command, BadCommand
+from pylons import config
+
+from wattman.config.environment import load_environment
+from wattman.lib.assets import build_assets
+from wattman.lib.export import SiteExporter, export_dir, render_pages
+from wattman.lib.importer import Importer, read_jsonl, read_wxr
+from wattman.lib.templates import warm_up
+from wattman.model import Session, Page, Post, metadata
+from wattman.model.pathindex import path_index
+from wattman.model.rendering import rerender
+from wattman.model.search import search_index
+from wattman.model.summary import content_summary
+
+__all__ = ['WattmanCommand', 'RepairCountersCommand', 'RebuildSearchCommand',
+           'RenderContentCommand', 'ExportSiteCommand',
+           'ImportContentCommand', 'WarmTemplatesCommand',
+           'BuildAssetsCommand']
+
+
+class WattmanCommand(Command):
+
+    """Base class for commands that need the application environment"""
+
+    min_args = 0
+    max_args = 1
+    usage = '[CONFIG_FILE]'
+    group_name = 'wattman'
+
+    parser = Command.standard_parser()
+
+    def load_environment(self, config_file=None, **settings):
+        """Load the config file (default: the first argument, or
+        development.ini), overriding its ``settings``, and set up the
+        model"""
+        if config_file is None and self.args:
+            config_file = self.args[0]
+        elif config_file is None:
+            config_file = 'development.ini'
+        if not os.path.isfile(config_file):
+            raise BadCommand('%sError: CONFIG_FILE not found at: %s\n'
+                             'Please specify a CONFIG_FILE' %
+                             (self.parser.get_usage(), config_file))
+        self.logging_file_config(config_file)
+        self.config_file = os.path.abspath(config_file)
+        conf = appconfig('config:%s' % self.config_file)
+        conf.local_conf.update(settings)
+        load_environment(conf.global_conf, conf.local_conf)
+        return conf
+
+
+class RepairCountersCommand(WattmanCommand):
+
+    """Rebuild the comment counters on every post
+
+    Recomputes Post.comment_count and Post.approved_count from the
+    comment table, and the tag and month summaries from the posts, for
+    when they've drifted (e.g. after content was edited outside the
+    application).
+    """
+
+    summary = __doc__.splitlines()[0]
+
+    def command(self):
+        self.load_environment()
+        posts = Post.rebuild_comment_counts()
+        content_summary.rebuild(Session)
+        Session.commit()
+        print('Rebuilt comment counters (%d posts with comments) and '
+              'summaries' % posts)
+
+
+class RebuildSearchCommand(WattmanCommand):
+
+    """Rebuild the full-text search index
+
+    Reindexes every published post and every page from scratch.  The
+    index is normally kept up to date as content is saved.
+    """
+
+    summary = __doc__.splitlines()[0]
+
+    def command(self):
+        self.load_environment()
+        indexed = search_index.rebuild(Session)
+        Session.commit()
+        print('Indexed %d posts and pages' % indexed)
+
+
+class RenderContentCommand(WattmanCommand):
+
+    """Re-render the stored HTML of posts and pages
+
+    Only content whose HTML is out of date (e.g. after the renderer in
+    wattman/lib/markup.py changed) is rendered, unless --all is given.
+    """
+
+    summary = __doc__.splitlines()[0]
+
+    parser = WattmanCommand.standard_parser()
+    parser.add_option('--all', action='store_true', dest='all',
+                      help='Re-render everything, not just stale content')
+    parser.add_option('--batch-size', type='int', dest='batch_size',
+                      default=500, help='Rows rendered per UPDATE')
+
+    def command(self):
+        self.load_environment()
+        for entity in Post, Page:
+            rendered = rerender(Session, entity, force=self.options.all,
+                                batch_size=self.options.batch_size)
+            Session.commit()
+            print('Rendered %d %ss' % (rendered, entity.__name__.lower()))
+
+
+def make_export_app(config_file):
+    """The application, without its static files, for exporting"""
+    # (imported here: middleware imports the export module)
+    from wattman.config.middleware import make_app
+    conf = appconfig('config:%s' % config_file)
+    app_conf = dict(conf.local_conf)
+    app_conf['static_files'] = 'false'
+    app_conf['background_tasks'] = 'false'
+    return make_app(conf.global_conf, **app_conf)
+
+
+_export_app = None
+
+def _init_export_worker(config_file):
+    global _export_app
+    _export_app = make_export_app(config_file)
+
+def _export_batch(args):
+    output_dir, urls = args
+    return render_pages(_export_app, output_dir, urls)
+
+
+class ExportSiteCommand(WattmanCommand):
+
+    """Export published posts, pages and tag listings as static files
+
+    Renders them into the export directory (export.dir, by default
+    export/ in cache_dir; or --output), where the static file server
+    picks them up ahead of the application.  Only pages whose content
+    changed since the last export are rendered; pages for unpublished
+    or deleted content are removed (the application removes those as
+    the changes are made, too).  Re-export after publishing, or use
+    --clean to remove the export.
+    """
+
+    summary = __doc__.splitlines()[0]
+
+    parser = WattmanCommand.standard_parser()
+    parser.add_option('--output', dest='output',
+                      help='Directory to export to (default: export.dir)')
+    parser.add_option('--processes', type='int', dest='processes',
+                      default=1, help='Worker processes to render with')
+    parser.add_option('--all', action='store_true', dest='all',
+                      help='Render every page, not just changed ones')
+    parser.add_option('--clean', action='store_true', dest='clean',
+                      help='Remove the exported files and stop')
+
+    batch_size = 50
+
+    def command(self):
+        self.load_environment()
+        output = self.options.output or export_dir(config)
+        exporter = SiteExporter(Session, output,
+                                config['pylons.paths']['templates'],
+                                config['pylons.app_globals'].assets.stamp)
+        if self.options.clean:
+            exporter.clean()
+            print('Removed the export from %s' % output)
+            return
+        urls, removed, manifest = exporter.plan(force=self.options.all)
+        exporter.remove(removed)
+        Session.remove()
+        if not urls:
+            statuses = {}
+        elif self.options.processes > 1:
+            # The workers open their own connections
+            metadata.bind.dispose()
+            pool = multiprocessing.Pool(self.options.processes,
+                                        _init_export_worker,
+                                        (self.config_file,))
+            batches = [(output, urls[i:i + self.batch_size])
+                       for i in range(0, len(urls), self.batch_size)]
+            statuses = {}
+            for result in pool.imap_unordered(_export_batch, batches):
+                statuses.update(result)
+            pool.close()
+            pool.join()
+        else:
+            statuses = render_pages(make_export_app(self.config_file),
+                                    output, urls)
+        failed = exporter.finish(manifest, statuses)
+        print('Exported %d pages to %s, removed %d (%d failed)' %
+              (len(urls) - len(failed), output, len(removed), len(failed)))
+
+
+class ImportContentCommand(WattmanCommand):
+
+    """Import posts, pages, comments and tags from a file
+
+    Reads JSON Lines or WordPress WXR (see wattman/lib/importer.py) a
+    record at a time and inserts them in batches, so even very large
+    files import in constant memory.  Content whose path already exists
+    is skipped, so an interrupted import can be run again.  The comment
+    counters, search and path indexes and the tag and month summaries
+    are rebuilt afterwards.
+    """
+
+    summary = __doc__.splitlines()[0]
+    min_args = 1
+    max_args = 2
+    usage = '[CONFIG_FILE] FILE'
+
+    parser = WattmanCommand.standard_parser()
+    parser.add_option('--format', dest='format',
+                      help='jsonl or wxr (default: from the extension)')
+    parser.add_option('--batch-size', type='int', dest='batch_size',
+                      default=1000, help='Rows inserted per batch')
+
+    readers = dict(jsonl=read_jsonl, wxr=read_wxr)
+
+    def command(self):
+        filename = self.args[-1]
+        config_file = len(self.args) > 1 and self.args[0] or None
+        format = self.options.format
+        if format is None:
+            format = os.path.splitext(filename)[1] in ('.xml', '.wxr') \
+                and 'wxr' or 'jsonl'
+        if format not in self.readers:
+            raise BadCommand('Unknown format %r (use jsonl or wxr)' % format)
+        self.load_environment(config_file)
+
+        f = open(filename, 'rb')
+        size = max(os.path.getsize(filename), 1)
+        start = time.time()
+        def progress(counts):
+            sys.stdout.write(
+                '\r%3d%%  %d posts, %d pages, %d comments, %d tags '
+                '(%d skipped) in %ds' % (
+                    min(f.tell() * 100 // size, 100), counts['post'],
+                    counts['page'], counts['comment'], counts['tag'],
+                    counts['skipped'], time.time() - start))
+            sys.stdout.flush()
+        try:
+            importer = Importer(metadata.bind, self.options.batch_size,
+                                progress)
+            importer.run(self.readers[format](f))
+        finally:
+            f.close()
+        print('')
+
+        print('Rebuilding comment counters, indexes and summaries')
+        Post.rebuild_comment_counts()
+        search_index.rebuild(Session)
+        content_summary.rebuild(Session)
+        Session.commit()
+        path_index.load()
+
+
+class WarmTemplatesCommand(WattmanCommand):
+
+    """Compile the Mako templates into the template cache
+
+    Every template under templates/ is compiled into a module in the
+    cache directory, if it isn't there and up to date already, so that
+    server processes started afterwards load it instead of compiling it
+    on their first requests.  Reports how long each took and fails if
+    any template doesn't compile (e.g. before a deploy).
+    """
+
+    summary = __doc__.splitlines()[0]
+
+    parser = WattmanCommand.standard_parser()
+    parser.add_option('--force', action='store_true', dest='force',
+                      help='Recompile every template, even up-to-date ones')
+
+    def command(self):
+        self.load_environment(**{'templates.warmup': 'false'})
+        results = warm_up(config['pylons.app_globals'].mako_lookup,
+                          force=self.options.force)
+        for result in results:
+            print('%-30s %8.1fms  %s' % (
+                result.uri, result.seconds * 1000,
+                result.error and 'FAILED' or
+                result.compiled and 'compiled' or 'up to date'))
+        failed = [result for result in results if result.error]
+        print('%d templates (%d compiled) in %.3fs' % (
+            len(results), len([r for r in results if r.compiled]),
+            sum(r.seconds for r in results)))
+        if failed:
+            raise BadCommand('\n'.join('%s:\n%s' % (result.uri, result.error)
+                                       for result in failed))
+
+
+class BuildAssetsCommand(WattmanCommand):
+
+    """Fingerprint and precompress the static files
+
+    Copies the files under public/ into the asset directory (assets.dir)
+    with their content hash in their names, with gzip and brotli
+    variants, and writes the manifest the application serves them from
+    (see wattman/lib/assets.py).  Only changed files are built, unless
+    --force is given.  Superseded files are removed once they're
+    assets.keep seconds old, or at once with --prune.
+    """
+
+    summary = __doc__.splitlines()[0]
+
+    parser = WattmanCommand.standard_parser()
+    parser.add_option('--force', action='store_true', dest='force',
+                      help='Rebuild every file, not just changed ones')
+    parser.add_option('--prune', action='store_true', dest='prune',
+                      help='Remove superseded files now rather than once '
+                      'assets.keep has passed')
+
+    def command(self):
+        self.load_environment()
+        output = config['pylons.app_globals'].assets.output_dir
+        keep = 0
+        if not self.options.prune:
+            keep = asint(config.get('assets.keep', 86400))
+        files, built = build_assets(config['pylons.paths']['static_files'],
+                                    output, force=self.options.force,
+                                    keep=keep)
+        for path in built:
+            entry = files[path]
+            print('%-30s -> %s %s' % (path, entry['file'],
+                                      ' '.join(sorted(entry['encodings']))))
+        print('Built %d of %d assets into %s' % (len(built), len(files),
+                                                 output))
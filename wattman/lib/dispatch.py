@@ -0,0 +1,161 @@
+"""A routes Mapper with a precompiled dispatch table
+
+``Mapper`` matches a URL by trying every route's regexp in turn and, in
+debug mode (``always_scan``), rescans the controllers directory first.
+``DispatchMapper`` matches exactly as it does, but only tries the routes
+that can match: when the regexps are created it files the routes by the
+literal first segment of their path (``/post/{path}`` under ``post``),
+keeping the routes that start with a variable (``/{controller}/...``)
+in every list they could match, in their original order.  Matches are then cached by
+method and URL.  Only URLs whose first segment no route starts with
+still need the controllers rescanned in debug mode, and those aren't
+cached.
+
+``generate()`` likewise looks up the route for a controller, action and
+set of arguments in a table, caching the URLs it generates the same
+way, and leaves any other arguments to ``Mapper``.
+"""
+from routes import Mapper
+
+__all__ = ['DispatchMapper']
+
+
+def _literal(segment):
+    return not [c for c in '{}:*' if c in segment]
+
+
+def _prefix(segment):
+    """The literal start of a path segment (``feed.`` of
+    ``feed.{format}``)"""
+    for c in '{:*':
+        segment = segment.split(c, 1)[0]
+    return segment
+
+
+class DispatchMapper(Mapper):
+
+    """``Mapper`` with a dispatch table and match cache (of up to
+    ``cache_size`` URLs)"""
+
+    def __init__(self, cache_size=10000, **kwargs):
+        Mapper.__init__(self, **kwargs)
+        self.cache_size = cache_size
+        self._table = {}
+        self._variable = []
+        self._generators = {}
+        self._match_cache = {}
+        self._generate_cache = {}
+
+    def _create_regs(self, clist=None):
+        Mapper._create_regs(self, clist)
+        self._compile()
+
+    def _compile(self):
+        """File the routes by their literal first segment, and by the
+        controller and action they generate"""
+        routes = [route for route in self.matchlist if not route.static]
+        firsts = [route.routepath.lstrip('/').split('/', 1)[0]
+                  for route in routes]
+        variable = [route for route, first in zip(routes, firsts)
+                    if not _literal(first)]
+        table = {}
+        for first in set(firsts):
+            if _literal(first):
+                table[first] = [
+                    route for route, other in zip(routes, firsts)
+                    if other == first or not _literal(other) and
+                    first.startswith(_prefix(other))]
+
+        generators = {}
+        blocked = set()
+        for route in self.matchlist:
+            keys = frozenset(route.maxkeys)
+            controller = 'controller' in route.hardcoded and \
+                route.defaults['controller'] or None
+            action = 'action' in route.hardcoded and \
+                route.defaults['action'] or None
+            if controller is None or action is None:
+                # e.g. /{controller}/{action}/{id}: Mapper would choose
+                # it over any later route with the same arguments
+                blocked.add((controller, action, keys))
+                continue
+            if (None, None, keys) in blocked or \
+                    (controller, None, keys) in blocked or \
+                    (None, action, keys) in blocked:
+                continue
+            generators.setdefault((controller, action, keys), route)
+        self._table = table
+        self._variable = variable
+        self._generators = generators
+        self._match_cache = {}
+        self._generate_cache = {}
+
+    def _match(self, url, environ):
+        if self.prefix or self.sub_domains or self.debug:
+            return Mapper._match(self, url, environ)
+        if not self._created_regs:
+            self.create_regs()
+        environ = environ or self.environ
+        method = environ and environ.get('REQUEST_METHOD')
+        key = (method, url)
+        cached = self._match_cache.get(key)
+        if cached is not None:
+            return self._copy(*cached)
+
+        first = url[1:].split('/', 1)[0]
+        routes = self._table.get(first)
+        scan = routes is None and self.always_scan
+        if scan:
+            self.create_regs()
+        if routes is None:
+            routes = self._variable
+        match = route = None
+        for candidate in routes:
+            result = candidate.match(url, environ)
+            if isinstance(result, dict) or result:
+                match, route = result, candidate
+                break
+        if not scan:
+            if len(self._match_cache) >= self.cache_size:
+                self._match_cache.clear()
+            self._match_cache[key] = (match, route)
+        return self._copy(match, route)
+
+    def _copy(self, match, route):
+        # callers may change the match dict
+        if match is not None:
+            match = dict(match)
+        return (match, route, [])
+
+    def generate(self, *args, **kwargs):
+        if args or self.prefix or self.append_slash or \
+                not self._created_gens:
+            return Mapper.generate(self, *args, **kwargs)
+        keys = frozenset(kwargs)
+        route = self._generators.get((kwargs.get('controller'),
+                                      kwargs.get('action'),
+                                      keys - frozenset(['_environ'])))
+        if route is None:
+            return Mapper.generate(self, *args, **kwargs)
+        environ = kwargs.pop('_environ', self.environ)
+        script_name = environ and environ.get('SCRIPT_NAME', '') or ''
+        try:
+            key = (script_name, frozenset(kwargs.items()))
+            path = self._generate_cache.get(key)
+        except TypeError:
+            # unhashable arguments
+            key = path = None
+        if path is not None:
+            return path
+        path = route.generate(**kwargs)
+        if not path:
+            kwargs['_environ'] = environ
+            return Mapper.generate(self, *args, **kwargs)
+        if script_name and not route.absolute:
+            path = script_name + path
+        path = str(path)
+        if key is not None:
+            if len(self._generate_cache) >= self.cache_size:
+                self._generate_cache.clear()
+            self._generate_cache[key] = path
+        return path
@@ -0,0 +1,179 @@
+"""Error documents and their images and stylesheets, from memory
+
+``StatusCodeRedirect`` sends every 400, 401, 403 and 404 (and 500
+outside debug mode) to ``ErrorController``, so a burst of requests for
+pages that don't exist (a scanner, say) is a burst of error documents.
+``ErrorPages`` renders each distinct document once and keeps it, with
+an ETag, and the documents for the stock responses of the redirected
+status codes are rendered when the application starts.  The images and
+stylesheets the documents use are read from the Pylons package once,
+instead of being looked up through a ``PkgResourcesParser`` on every
+request.
+
+``ErrorDocumentRedirect`` takes ``StatusCodeRedirect``'s place: when
+the document for an error response has already been rendered, it
+answers with it straight away rather than running the request through
+the application a second time.
+"""
+import cgi
+import mimetypes
+import threading
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+import pkg_resources
+from pylons.middleware import StatusCodeRedirect, error_document_template
+from pylons.util import call_wsgi_application
+from webhelpers.html import literal
+from webob import Request, Response
+from webob.exc import status_map
+
+__all__ = ['ErrorAsset', 'ErrorDocumentRedirect', 'ErrorPages',
+           'document_args']
+
+# The status codes StatusCodeRedirect sends to ErrorController
+CODES = (400, 401, 403, 404, 500)
+
+
+def _etag(data):
+    return '"%s"' % sha1(data).hexdigest()
+
+
+class ErrorAsset(object):
+
+    """An image or stylesheet of the error documents"""
+
+    def __init__(self, body, content_type):
+        self.body = body
+        self.content_type = content_type
+        self.etag = _etag(body)
+
+
+def load_assets(package='pylons', directories=('media/img', 'media/style')):
+    """The files in the ``package``'s ``directories``, by path under
+    ``media/`` (``img/favicon.ico``)"""
+    assets = {}
+    for directory in directories:
+        for name in pkg_resources.resource_listdir(package, directory):
+            path = '%s/%s' % (directory, name)
+            if pkg_resources.resource_isdir(package, path):
+                continue
+            content_type = mimetypes.guess_type(name)[0] or \
+                'application/octet-stream'
+            assets[path.split('/', 1)[1]] = ErrorAsset(
+                pkg_resources.resource_string(package, path), content_type)
+    return assets
+
+
+def stock_messages(code):
+    """The bodies of the stock ``code`` response (HTML and plain text),
+    as ErrorController shows them"""
+    messages = []
+    for accept in 'text/html', 'text/plain':
+        request = Request.blank('/', headers={'Accept': accept})
+        messages.append(literal(
+            request.get_response(status_map[code]()).body))
+    return messages
+
+
+def document_args(request, original):
+    """The code, message and prefix of the error document that replaces
+    the ``original`` response (None if the document was requested
+    directly)"""
+    content = literal(original is not None and original.body or '') or \
+        cgi.escape(request.GET.get('message', ''))
+    code = request.GET.get('code', original is not None and
+                           str(original.status_int) or '')
+    return cgi.escape(code), content, request.environ.get('SCRIPT_NAME', '')
+
+
+class ErrorPages(object):
+
+    """Rendered error documents, with their ETags, and the ``assets``
+
+    Up to ``max_size`` documents are kept (a document's message can come
+    from the query string).
+    """
+
+    def __init__(self, codes=CODES, max_size=1000):
+        self.max_size = max_size
+        self.assets = load_assets()
+        self._documents = {}
+        self._lock = threading.Lock()
+        for code in codes:
+            for message in stock_messages(code):
+                self.document(str(code), message)
+
+    def document(self, code, message, prefix=''):
+        """The error document for the status ``code`` (a string) showing
+        ``message``, as UTF-8 bytes, and its ETag
+
+        Like ``error_document_template``, escapes ``message`` unless
+        it's a ``literal``.
+        """
+        key = (code, message, isinstance(message, literal), prefix)
+        document = self._documents.get(key)
+        if document is None:
+            body = error_document_template % dict(prefix=prefix, code=code,
+                                                  message=message)
+            body = body.encode('utf-8')
+            document = (body, _etag(body))
+            self._lock.acquire()
+            try:
+                if len(self._documents) >= self.max_size:
+                    self._documents.clear()
+                self._documents[key] = document
+            finally:
+                self._lock.release()
+        return document
+
+    def lookup(self, code, message, prefix=''):
+        """The document and ETag ``document()`` has rendered for these
+        arguments, or None"""
+        return self._documents.get((code, message,
+                                    isinstance(message, literal), prefix))
+
+    def clear(self):
+        self._documents.clear()
+
+
+class ErrorDocumentRedirect(StatusCodeRedirect):
+
+    """``StatusCodeRedirect`` that answers with the error document from
+    ``pages`` when it's been rendered already"""
+
+    # as ErrorController sends them
+    headers = [('Content-Type', 'text/html; charset=utf-8'),
+               ('Pragma', 'no-cache'), ('Cache-Control', 'no-cache')]
+
+    def __init__(self, app, pages, errors=(400, 401, 403, 404),
+                 path='/error/document'):
+        StatusCodeRedirect.__init__(self, app, errors, path)
+        self.pages = pages
+
+    def __call__(self, environ, start_response):
+        status, headers, app_iter, exc_info = call_wsgi_application(
+            self.app, environ, catch_exc_info=True)
+        if status[:3] in self.errors and \
+                'pylons.status_code_redirect' not in environ and \
+                self.error_path:
+            original = Response(status=status, headerlist=headers,
+                                app_iter=app_iter)
+            request = Request(environ)
+            document = self.pages.lookup(*document_args(request, original))
+            if document is not None:
+                body, etag = document
+                start_response(status, self.headers + [
+                    ('ETag', etag), ('Content-Length', str(len(body)))],
+                    exc_info)
+                return [body]
+            environ['pylons.original_response'] = original
+            environ['pylons.original_request'] = request
+            new_environ = environ.copy()
+            new_environ['PATH_INFO'] = self.error_path
+            newstatus, headers, app_iter, exc_info = call_wsgi_application(
+                self.app, new_environ, catch_exc_info=True)
+        start_response(status, headers, exc_info)
+        return app_iter
@@ -0,0 +1,317 @@
+"""Exports published content as static files
+
+``SiteExporter`` renders every published post, page and tag listing
+through the application and writes the HTML under the export directory
+(``export.dir``, by default ``export`` in ``cache_dir``) at the page's
+own URL (``post/<path>`` and so on).  Requests under ``EXPORTED_PATHS``
+are looked up there ahead of the application (see wattman/lib/assets.py),
+so from then on those URLs are served straight from disk.
+
+Exported pages are never served out of date: ``ExportInvalidator``
+removes the files of the pages a change shows up on (the post or page,
+its tag listings, the post a comment is on) as soon as it commits, so
+unpublished and deleted content disappears at once and edited content
+is served by the application until the next export
+(``paster export-site``, e.g. from cron) writes it again.  Remove the
+whole export with ``--clean``.
+
+Exports are incremental.  A manifest in the output directory records a
+fingerprint of what each file was rendered from (the row, its rendered
+content, its tags and comment counts, the templates and the asset
+build); only files whose fingerprint changed are rendered again, and
+files for content that's gone or was unpublished are removed (as are
+files that went missing, which are rendered again).  Large sites can be
+rendered by a pool of worker processes, each running its own copy of
+the application.
+"""
+import logging
+import os
+import tempfile
+import urllib
+import weakref
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from paste.fileapp import FileApp
+from paste.urlparser import StaticURLParser
+from sqlalchemy import select
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.orm.interfaces import SessionExtension
+from webob import Request
+
+from wattman.model import Comment, Page, Post, Tag
+
+__all__ = ['EXPORTED_PATHS', 'ExportInvalidator', 'ExportedPageParser',
+           'SiteExporter', 'export_dir', 'render_pages', 'template_stamp']
+
+log = logging.getLogger(__name__)
+
+MANIFEST = '.export-manifest'
+
+# Where exported pages are written, by URL
+EXPORTED_PATHS = ('/post/', '/page/', '/tag/')
+
+
+class ExportedPageParser(StaticURLParser):
+
+    """StaticURLParser that serves extension-less (exported) files as
+    HTML"""
+
+    def make_app(self, filename):
+        if not os.path.splitext(filename)[1]:
+            return FileApp(filename, content_type='text/html; charset=utf-8')
+        return StaticURLParser.make_app(self, filename)
+
+
+def export_dir(config):
+    """The directory pages are exported to: ``export.dir``, or
+    ``export`` in ``cache_dir``"""
+    return config.get('export.dir') or \
+        os.path.join(config['pylons.cache_dir'], 'export')
+
+
+def _quote(path):
+    return urllib.quote(path.encode('utf-8'))
+
+
+def _fingerprint(*values):
+    return sha1(repr(values)).hexdigest()
+
+
+def template_stamp(directories):
+    """Fingerprint of the modification times of the templates under
+    ``directories``"""
+    stamps = []
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            for name in files:
+                filename = os.path.join(root, name)
+                stamps.append((filename, os.path.getmtime(filename)))
+    return _fingerprint(sorted(stamps))
+
+
+def url_to_file(output_dir, url):
+    """The file an exported ``url`` is written to, or None if the URL
+    can't be stored safely"""
+    parts = [urllib.unquote(part) for part in url.strip('/').split('/')]
+    for part in parts:
+        if not part or part.startswith('.') or os.sep in part:
+            return None
+    return os.path.join(output_dir, *parts)
+
+
+def render_pages(app, output_dir, urls):
+    """Render each of ``urls`` with the WSGI ``app`` and write the
+    successful ones under ``output_dir``; returns the status code of
+    each URL"""
+    statuses = {}
+    for url in urls:
+        filename = url_to_file(output_dir, url)
+        if filename is None:
+            statuses[url] = None
+            continue
+        response = Request.blank(url).get_response(app)
+        statuses[url] = response.status_int
+        if response.status_int != 200:
+            continue
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # (another worker beat us to it)
+                pass
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(response.body)
+        finally:
+            f.close()
+        os.chmod(tmp, 0o644)
+        os.rename(tmp, filename)
+    return statuses
+
+
+class SiteExporter(object):
+
+    """Works out what needs exporting and keeps the manifest
+
+    ``templates`` is the list of template directories and ``assets``
+    the stamp of the asset build (``AssetManifest.stamp``); when either
+    changes, everything is rendered again.
+    """
+
+    def __init__(self, session, output_dir, templates=(), assets=''):
+        self.session = session
+        self.output_dir = output_dir
+        self.templates = templates
+        self.assets = assets
+        self.manifest_file = os.path.join(output_dir, MANIFEST)
+
+    def targets(self):
+        """Map each URL that should be exported to its fingerprint"""
+        quote = _quote
+        post, page, tag = Post.table, Page.table, Tag.table
+        page_tag = Post.tags.property.secondary
+        tags = {}
+        for post_id, name in self.session.execute(
+                select([page_tag.c.post_id, page_tag.c.tag_name])):
+            tags.setdefault(post_id, []).append(name)
+
+        targets, tagged = {}, {}
+        for row in self.session.execute(
+                select([post.c.id, post.c.path, post.c.title,
+                        post.c.content_hash, post.c.posted_on,
+                        post.c.comments_allowed, post.c.comment_count,
+                        post.c.approved_count])
+                .where(post.c.draft == False)):
+            post_tags = sorted(tags.get(row.id, []))
+            fingerprint = _fingerprint(tuple(row), post_tags)
+            targets['/post/' + quote(row.path)] = fingerprint
+            for name in post_tags:
+                tagged.setdefault(name, []).append(fingerprint)
+        for row in self.session.execute(
+                select([page.c.id, page.c.path, page.c.title,
+                        page.c.content_hash])):
+            targets['/page/' + quote(row.path)] = _fingerprint(tuple(row))
+        for name, path in self.session.execute(
+                select([tag.c.name, tag.c.path])):
+            if path:
+                targets['/tag/' + quote(path)] = _fingerprint(
+                    name, path, sorted(tagged.get(name, [])))
+        return targets
+
+    def template_stamp(self):
+        """Fingerprint of the templates' modification times"""
+        return template_stamp(self.templates)
+
+    def load_manifest(self):
+        try:
+            f = open(self.manifest_file)
+        except IOError:
+            return dict(templates=None, files={})
+        try:
+            return json.load(f)
+        finally:
+            f.close()
+
+    def save_manifest(self, manifest):
+        fd, tmp = tempfile.mkstemp(dir=self.output_dir)
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(manifest, f)
+        finally:
+            f.close()
+        os.rename(tmp, self.manifest_file)
+
+    def plan(self, force=False):
+        """Return the URLs to render, the URLs to remove and the new
+        manifest (to save once the URLs are rendered)"""
+        manifest = self.load_manifest()
+        # (kept under 'templates', as it was before the assets were in it)
+        stamp = _fingerprint(self.template_stamp(), self.assets)
+        if manifest['templates'] != stamp:
+            force = True
+        exported = manifest['files']
+        targets = self.targets()
+        render = sorted(url for url, fingerprint in targets.items()
+                        if force or exported.get(url) != fingerprint or
+                        not self.exists(url))
+        remove = sorted(url for url in exported if url not in targets)
+        return render, remove, dict(templates=stamp, files=targets)
+
+    def exists(self, url):
+        filename = url_to_file(self.output_dir, url)
+        return filename is not None and os.path.isfile(filename)
+
+    def remove(self, urls):
+        for url in urls:
+            filename = url_to_file(self.output_dir, url)
+            if filename is not None and os.path.isfile(filename):
+                os.remove(filename)
+
+    def clean(self):
+        """Remove every exported file and the manifest"""
+        self.remove(self.load_manifest()['files'])
+        if os.path.isfile(self.manifest_file):
+            os.remove(self.manifest_file)
+
+    def finish(self, manifest, statuses):
+        """Save the manifest, leaving out URLs that failed to render so
+        the next export retries them"""
+        failed = [url for url, status in statuses.items() if status != 200]
+        for url in failed:
+            log.warning('Could not export %s (status %s)', url,
+                        statuses[url])
+            manifest['files'].pop(url, None)
+        # (their old files are out of date)
+        self.remove(failed)
+        self.save_manifest(manifest)
+        return failed
+
+
+class ExportInvalidator(SessionExtension):
+
+    """Removes the exported pages that changes to content show up on
+
+    URLs are collected as changes are flushed and their files removed
+    once the transaction commits.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._urls = weakref.WeakKeyDictionary()
+
+    def after_flush(self, session, flush_context):
+        urls = self._urls.setdefault(session, set())
+        post_ids = set()
+        for obj in list(session.new) + list(session.dirty) + \
+                list(session.deleted):
+            if isinstance(obj, Comment):
+                post_ids.update(_history(obj, 'post_id'))
+            elif isinstance(obj, Post):
+                urls.update('/post/' + _quote(path)
+                            for path in _history(obj, 'path'))
+                for tag in _history(obj, 'tags'):
+                    if tag.path:
+                        urls.add('/tag/' + _quote(tag.path))
+            elif isinstance(obj, Page):
+                urls.update('/page/' + _quote(path)
+                            for path in _history(obj, 'path'))
+            elif isinstance(obj, Tag):
+                urls.update('/tag/' + _quote(path)
+                            for path in _history(obj, 'path'))
+        if post_ids:
+            # (a post's page shows its comments; the posts are looked up
+            # without the ORM, which is mid-flush)
+            post = Post.table
+            for path, in session.connection().execute(
+                    select([post.c.path]).where(post.c.id.in_(post_ids))):
+                urls.add('/post/' + _quote(path))
+
+    def after_commit(self, session):
+        urls = self._urls.pop(session, None)
+        for url in urls or ():
+            filename = url_to_file(self.output_dir, url)
+            if filename is not None and os.path.isfile(filename):
+                try:
+                    os.remove(filename)
+                except OSError:
+                    # (another process removed it first)
+                    pass
+
+    def after_rollback(self, session):
+        self._urls.pop(session, None)
+
+
+def _history(obj, attr):
+    """The values ``obj``'s ``attr`` had and has in this flush"""
+    added, unchanged, deleted = get_history(obj, attr)
+    return [value for values in (added, unchanged, deleted)
+            for value in values or () if value is not None]
@@ -0,0 +1,70 @@
+"""A slimmer middleware stack for anonymous reads
+
+Most traffic is anonymous GETs of posts, pages, tags and feeds, which
+never sign anybody in, show a form or touch the session.  Yet the full
+stack runs AuthKit over every one of them, and ToscaWidgets buffers and
+rewrites every HTML body to inject widget resources.
+``FastLaneMiddleware`` sends such requests down a second stack built
+around the same Pylons app, without those two.  A request takes the
+fast lane when:
+
+* it's a GET or HEAD,
+* its route's ``controller.action`` is one of ``fastlane.routes``, and
+* it carries neither the AuthKit nor the session cookie.
+
+Everything else (including every request of someone signed in) goes
+down the full stack.  The session middleware stays in both: without a
+session cookie there's nothing to load, and Beaker only creates the
+session if the application actually uses it.
+"""
+from paste.deploy.converters import asbool, aslist
+
+__all__ = ['FastLaneMiddleware']
+
+# controller.action of the routes that only read
+ROUTES = ('post.view page.view tag.view feed.site feed.tag feed.comments '
+          'search.index')
+
+METHODS = ('GET', 'HEAD')
+
+
+class FastLaneMiddleware(object):
+
+    """Sends anonymous reads of the read-only ``routes`` to
+    ``fast_app`` and everything else to ``app``"""
+
+    def __init__(self, app, fast_app, mapper, routes, cookies):
+        self.app = app
+        self.fast_app = fast_app
+        self.mapper = mapper
+        self.routes = frozenset(routes)
+        self.cookies = tuple(name + '=' for name in cookies)
+
+    @classmethod
+    def from_config(cls, app, fast_app, config):
+        """Route between the stacks if ``fastlane.enabled`` is set"""
+        if not asbool(config.get('fastlane.enabled', False)):
+            return app
+        return cls(app, fast_app, config['routes.map'],
+                   aslist(config.get('fastlane.routes', ROUTES)),
+                   [config.get('authkit.cookie.name', 'authkit'),
+                    config.get('beaker.session.key', 'beaker.session.id')])
+
+    def __call__(self, environ, start_response):
+        if self.eligible(environ):
+            return self.fast_app(environ, start_response)
+        return self.app(environ, start_response)
+
+    def eligible(self, environ):
+        """Whether the request can take the fast lane"""
+        if environ['REQUEST_METHOD'] not in METHODS:
+            return False
+        cookie = environ.get('HTTP_COOKIE')
+        if cookie and [name for name in self.cookies if name in cookie]:
+            return False
+        result = self.mapper.routematch(environ=environ)
+        if not result:
+            return False
+        match = result[0]
+        return '%s.%s' % (match.get('controller'),
+                          match.get('action')) in self.routes
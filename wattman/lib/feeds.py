@@ -0,0 +1,203 @@
+"""Atom and RSS feeds
+
+A feed is written element by element with ``XMLGenerator``, straight
+into a byte buffer, without building a DOM.  Feed readers poll far more
+often than content changes, so the bytes are kept in a ``FeedCache``
+along with the stamp of the latest change they were written from
+(e.g. ``Post.listing_stamp()``); until that changes, every poll is
+answered from the cache.  See wattman/controllers/feed.py.
+"""
+import calendar
+import datetime
+import os
+import threading
+from cStringIO import StringIO
+from email.utils import formatdate
+from xml.sax.saxutils import XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
+
+from paste.deploy.converters import asint
+
+from wattman.lib.cache import FileCache, TTLCache
+
+__all__ = ['CONTENT_TYPES', 'Entry', 'Feed', 'FeedCache', 'FeedWriter',
+           'write_feed']
+
+CONTENT_TYPES = dict(atom='application/atom+xml; charset=utf-8',
+                     rss='application/rss+xml; charset=utf-8')
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+
+class Entry(object):
+
+    """One item of a feed; ``content`` is HTML"""
+
+    def __init__(self, title, link, updated, content, published=None,
+                 author=None, categories=()):
+        self.title = title
+        self.link = link
+        self.updated = updated
+        self.content = content
+        self.published = published
+        self.author = author
+        self.categories = categories
+
+
+class Feed(object):
+
+    """A feed's ``title``, ``link`` (the page it syndicates), ``url``
+    (its own), ``updated`` time and ``entries``, newest first"""
+
+    def __init__(self, title, link, url, updated, entries):
+        self.title = title
+        self.link = link
+        self.url = url
+        self.updated = updated
+        self.entries = entries
+
+
+def _datetime(value):
+    if value is None:
+        return datetime.datetime(1970, 1, 1)
+    if not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def rfc3339(value):
+    return _datetime(value).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def rfc822(value):
+    return formatdate(calendar.timegm(_datetime(value).timetuple()),
+                      usegmt=True)
+
+
+class FeedWriter(object):
+
+    """Streams XML elements into ``out`` as UTF-8"""
+
+    def __init__(self, out):
+        self.xml = XMLGenerator(out, 'utf-8')
+        self.xml.startDocument()
+
+    def start(self, name, **attrs):
+        self.xml.startElement(name, AttributesImpl(attrs))
+
+    def end(self, name):
+        self.xml.endElement(name)
+
+    def element(self, name, text=None, **attrs):
+        self.start(name, **attrs)
+        if text:
+            self.xml.characters(text)
+        self.end(name)
+
+    def close(self):
+        self.xml.endDocument()
+
+
+def write_atom(writer, feed):
+    writer.start('feed', xmlns=ATOM_NS)
+    writer.element('title', feed.title)
+    writer.element('link', href=feed.link)
+    writer.element('link', rel='self', href=feed.url)
+    writer.element('id', feed.url)
+    writer.element('updated', rfc3339(feed.updated))
+    for entry in feed.entries:
+        writer.start('entry')
+        writer.element('title', entry.title)
+        writer.element('link', href=entry.link)
+        writer.element('id', entry.link)
+        writer.element('updated', rfc3339(entry.updated))
+        if entry.published is not None:
+            writer.element('published', rfc3339(entry.published))
+        if entry.author:
+            writer.start('author')
+            writer.element('name', entry.author)
+            writer.end('author')
+        for category in entry.categories:
+            writer.element('category', term=category)
+        writer.element('content', entry.content, type='html')
+        writer.end('entry')
+    writer.end('feed')
+
+
+def write_rss(writer, feed):
+    writer.start('rss', version='2.0')
+    writer.start('channel')
+    writer.element('title', feed.title)
+    writer.element('link', feed.link)
+    writer.element('description', feed.title)
+    writer.element('lastBuildDate', rfc822(feed.updated))
+    for entry in feed.entries:
+        writer.start('item')
+        writer.element('title', entry.title)
+        writer.element('link', entry.link)
+        writer.element('guid', entry.link, isPermaLink='true')
+        writer.element('pubDate', rfc822(entry.published or entry.updated))
+        for category in entry.categories:
+            writer.element('category', category)
+        writer.element('description', entry.content)
+        writer.end('item')
+    writer.end('channel')
+    writer.end('rss')
+
+
+WRITERS = dict(atom=write_atom, rss=write_rss)
+
+
+def write_feed(format, feed):
+    """The ``feed`` as 'atom' or 'rss' (``format``), in UTF-8 bytes"""
+    out = StringIO()
+    writer = FeedWriter(out)
+    WRITERS[format](writer, feed)
+    writer.close()
+    return out.getvalue()
+
+
+class FeedCache(object):
+
+    """Written feeds, each kept with the stamp it was written from
+
+    ``store`` is a ``TTLCache`` (memory) or ``FileCache`` (file).
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a cache from the ``feeds.*`` settings"""
+        expire = asint(config.get('feeds.expire', 3600))
+        if config.get('feeds.type', 'memory') == 'file':
+            data_dir = config.get('feeds.data_dir') or \
+                os.path.join(config['pylons.cache_dir'], 'feeds')
+            return cls(FileCache(data_dir, expire))
+        return cls(TTLCache(expire, asint(config.get('feeds.max_size',
+                                                     1000))))
+
+    def get(self, key, stamp, write):
+        """The bytes cached for ``key`` if they were written from
+        ``stamp``, else what ``write()`` returns, which is cached"""
+        entry = self.store.get(key)
+        if entry is not None and entry[0] == stamp:
+            self._count('hits')
+            return entry[1]
+        self._count('misses')
+        body = write()
+        self.store.set(key, (stamp, body))
+        return body
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses)
+
+    def _count(self, counter):
+        self._lock.acquire()
+        try:
+            setattr(self, counter, getattr(self, counter) + 1)
+        finally:
+            self._lock.release()
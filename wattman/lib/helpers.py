@@ -3,7 +3,10 @@
 Consists of functions to typically be used within templates, but also
 available to Controllers. This module is available to templates as 'h'.
 """
+import math
+import urllib
 
+from pylons import app_globals, config
 from routes import url_for
 from webhelpers.html import literal
 from webhelpers.html.secure_form import secure_form
@@ -11,8 +14,69 @@ from webhelpers.html.tags import *
 from webhelpers.html.tools import auto_link, mail_to
 from webhelpers.text import truncate, chop_at, plural
 
+from wattman.lib import markup
+from wattman.model import Session
+from wattman.model.summary import content_summary
+
 from webhelpers.html.tags import stylesheet_link
 from webhelpers.html.tags import javascript_link
 
 from authkit.authorize.pylons_adaptors import authorized
 from authkit.permissions import RemoteUser, ValidAuthKitUser, UserIn
+
+
+def wattman_use_akismet():
+    """Whether public comments are checked with Akismet"""
+    return bool(config.get('akismet.key'))
+
+def wattman_get_akismet_key():
+    return config.get('akismet.key')
+
+def comment_author(comment):
+    """The comment author's name, linked to their site once the link
+    checker has found that it answers"""
+    if comment.url and app_globals.link_checker.verdict(comment.url):
+        return link_to(comment.name, comment.url, rel='nofollow')
+    return comment.name
+
+def content_url(kind, path):
+    """URL of the post, page or tag (``kind``) at ``path``"""
+    return url_for('/%s/%s' % (kind, urllib.quote(path.encode('utf-8'))))
+
+def asset_url(path):
+    """Fingerprinted URL of the static file at ``path`` (e.g.
+    ``/bg.png``), which may be cached forever"""
+    return url_for(app_globals.assets.url(path))
+
+def content_html(obj):
+    """The rendered HTML of a post's or page's content
+
+    Normally that's the HTML stored when the content was saved; content
+    that hasn't been rendered by the current renderer yet is rendered
+    on the fly.
+    """
+    if obj.content_hash == markup.content_hash(obj.content):
+        return literal(obj.content_html or u'')
+    return markup.render(obj.content)
+
+def tag_cloud(sizes=5):
+    """The tags with published posts as (name, path, post count, size)
+    tuples, by name; the size runs from 1 to ``sizes`` with the log of
+    the count
+
+    Read from the tag summary table, see wattman/model/summary.py.
+    """
+    tags = content_summary.tags(Session)
+    if not tags:
+        return []
+    low = math.log(min(count for name, path, count in tags))
+    spread = math.log(max(count for name, path, count in tags)) - low
+    return [(name, path, count,
+             1 + int(round((math.log(count) - low) / (spread or 1) *
+                           (sizes - 1))))
+            for name, path, count in tags]
+
+def month_archive():
+    """(first day of the month, published post count) for each month
+    with posts, newest first"""
+    return content_summary.months(Session)
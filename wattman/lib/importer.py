@@ -0,0 +1,334 @@
+"""Streaming import of posts, pages, comments and tags
+
+Two input formats are read incrementally, so memory use doesn't grow
+with the size of the file:
+
+JSON Lines
+    One object per line, with a ``type`` of ``tag``, ``post``, ``page``
+    or ``comment``.  Posts may list their ``tags`` by name and carry
+    their ``comments``; stand-alone comments name their post by
+    ``post`` (its path)::
+
+        {"type": "post", "title": "Hello", "path": "hello",
+         "content": "...", "posted_on": "2009-05-01", "draft": false,
+         "tags": ["python"], "comments": [{"name": "Ann", ...}]}
+
+WXR
+    WordPress eXtended RSS export files: posts and pages with their
+    tags and comments.
+
+``Importer`` buffers the rows and writes them with one executemany
+INSERT per table every ``batch_size`` rows, committing each batch, and
+allocates post ids itself so comments and tags can refer to posts
+without reading them back.  It assumes nothing else writes posts while
+it runs.  Content whose path is already taken is skipped, as are
+comments already on posts that were there before the import (same
+author, date and text), so an interrupted import can simply be run
+again.  Only a digest of each comment of the post at hand is kept for
+that, and only while its comments are coming in.
+"""
+import datetime
+import logging
+import re
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    from xml.etree import cElementTree as etree
+except ImportError:
+    from xml.etree import ElementTree as etree
+
+from sqlalchemy import func, select
+
+from wattman.lib.markup import content_hash, render
+from wattman.model import Comment, Page, Post, Tag
+
+__all__ = ['Importer', 'read_jsonl', 'read_wxr']
+
+log = logging.getLogger(__name__)
+
+WP_PREFIX = '{http://wordpress.org/export/'
+WP = WP_PREFIX + '1.0/}'
+CONTENT = '{http://purl.org/rss/1.0/modules/content/}encoded'
+SLUG_RE = re.compile(r'[^\w-]+', re.UNICODE)
+
+
+def slug(text):
+    return SLUG_RE.sub(u'-', text.strip().lower()).strip(u'-')[:100]
+
+
+def comment_key(created_on, name, content):
+    """Fixed-size digest of what tells a comment from the others on
+    its post"""
+    parts = [created_on and created_on.isoformat() or u'', name or u'',
+             content or u'']
+    return sha1(u'\x00'.join(map(unicode, parts)).encode('utf-8')).digest()
+
+
+def parse_date(value):
+    """A date from 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS', or None"""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def read_jsonl(f):
+    """Yield (kind, record) pairs from a JSON Lines file"""
+    for number, line in enumerate(f):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            log.warning('Skipping line %d: not JSON', number + 1)
+            continue
+        kind = record.pop('type', None)
+        if kind not in ('tag', 'post', 'page', 'comment'):
+            log.warning('Skipping line %d: unknown type %r', number + 1,
+                        kind)
+            continue
+        yield kind, record
+
+
+def read_wxr(f):
+    """Yield (kind, record) pairs from a WordPress WXR file"""
+    # the wp: namespace's version varies between exports
+    wp, channel = WP, None
+    for event, elem in etree.iterparse(f, events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'channel':
+                channel = elem
+            elif elem.tag.startswith(WP_PREFIX):
+                wp = elem.tag[:elem.tag.index('}') + 1]
+            continue
+        if elem.tag == wp + 'tag':
+            yield 'tag', dict(name=_text(elem, wp + 'tag_name'),
+                              path=_text(elem, wp + 'tag_slug'))
+        elif elem.tag == 'item':
+            item = _wxr_item(wp, elem)
+            if item is not None:
+                yield item
+        else:
+            continue
+        if channel is not None:
+            # done with it: keep the tree from growing
+            channel.clear()
+
+
+def _wxr_item(wp, item):
+    kind = _text(item, wp + 'post_type')
+    if kind not in ('post', 'page'):
+        return None
+    record = dict(title=_text(item, 'title'),
+                  path=_text(item, wp + 'post_name'),
+                  content=_text(item, CONTENT),
+                  posted_on=_text(item, wp + 'post_date'))
+    if kind == 'page':
+        return kind, record
+    record['draft'] = _text(item, wp + 'status') != 'publish'
+    record['tags'] = [dict(name=_unicode(category.text),
+                           path=_unicode(category.get('nicename')))
+                      for category in item.findall('category')
+                      if category.get('domain') in ('tag', 'post_tag')]
+    record['comments'] = [
+        dict(name=_text(comment, wp + 'comment_author'),
+             email=_text(comment, wp + 'comment_author_email'),
+             url=_text(comment, wp + 'comment_author_url'),
+             user_ip=_text(comment, wp + 'comment_author_IP'),
+             created_on=_text(comment, wp + 'comment_date'),
+             content=_text(comment, wp + 'comment_content'),
+             approved=_text(comment, wp + 'comment_approved') == '1')
+        for comment in item.findall(wp + 'comment')
+        if _text(comment, wp + 'comment_approved') != 'spam']
+    return kind, record
+
+
+def _unicode(value):
+    # (cElementTree gives ASCII text as str)
+    if value is None:
+        return None
+    return unicode(value)
+
+
+def _text(elem, path):
+    return _unicode(elem.findtext(path))
+
+
+class Importer(object):
+
+    """Writes imported records to ``engine`` in batches
+
+    ``progress`` is called with the ``counts`` after each batch.
+    """
+
+    def __init__(self, engine, batch_size=1000, progress=None):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.progress = progress
+        self.counts = dict(tag=0, post=0, page=0, comment=0, skipped=0)
+        self.page_tag = Post.tags.property.secondary
+        self._rows = dict((table, []) for table in self._tables())
+        self._buffered = 0
+        self.tags = set(row[0] for row in engine.execute(
+            select([Tag.table.c.name])))
+        self.posts = dict((row[1], row[0]) for row in engine.execute(
+            select([Post.table.c.id, Post.table.c.path])))
+        self.pages = set(row[0] for row in engine.execute(
+            select([Page.table.c.path])))
+        self.next_post_id = (engine.execute(
+            select([func.max(Post.table.c.id)])).scalar() or 0) + 1
+        # posts from here on are new, so have no comments to repeat
+        self.first_new_post_id = self.next_post_id
+        # the existing post whose comments were last imported, and the
+        # comment_key()s of the comments it has
+        self._keys_post_id = None
+        self._comment_keys = set()
+
+    def _tables(self):
+        # in the order they're written
+        return [Tag.table, Post.table, Page.table, self.page_tag,
+                Comment.table]
+
+    def run(self, records):
+        """Import every (kind, record); returns the counts"""
+        for kind, record in records:
+            getattr(self, 'add_' + kind)(record)
+        self.flush()
+        return self.counts
+
+    def add_tag(self, record):
+        name = (record.get('name') or u'').strip()[:20]
+        if not name:
+            self.counts['skipped'] += 1
+            return None
+        if name not in self.tags:
+            self.tags.add(name)
+            self._add(Tag.table, 'tag', dict(
+                name=name, path=record.get('path') or slug(name)))
+        return name
+
+    def add_post(self, record):
+        path = record.get('path') or slug(record.get('title') or u'')
+        if not path:
+            self.counts['skipped'] += 1
+            return
+        if path in self.posts:
+            # (its comments may not all have made it last time)
+            self.counts['skipped'] += 1
+            self._add_comments(self.posts[path], record)
+            return
+        post_id = self.posts[path] = self.next_post_id
+        self.next_post_id += 1
+        content = record.get('content') or u''
+        self._add(Post.table, 'post', dict(
+            id=post_id, title=record.get('title'), path=path,
+            content=content, content_html=unicode(render(content)),
+            content_hash=content_hash(content),
+            posted_on=parse_date(record.get('posted_on')),
+            created_on=parse_date(record.get('created_on') or
+                                  record.get('posted_on')),
+            updated_on=datetime.datetime.utcnow(),
+            draft=bool(record.get('draft', False)),
+            comments_allowed=bool(record.get('comments_allowed', True)),
+            comment_count=0, approved_count=0))
+        names = set()
+        for tag in record.get('tags') or ():
+            if not isinstance(tag, dict):
+                tag = dict(name=tag)
+            name = self.add_tag(tag)
+            if name is not None and name not in names:
+                names.add(name)
+                self._add(self.page_tag, None,
+                          dict(post_id=post_id, tag_name=name))
+        self._add_comments(post_id, record)
+
+    def _add_comments(self, post_id, record):
+        for comment in record.get('comments') or ():
+            comment['post_id'] = post_id
+            self.add_comment(comment)
+
+    def add_page(self, record):
+        path = record.get('path') or slug(record.get('title') or u'')
+        if not path or path in self.pages:
+            self.counts['skipped'] += 1
+            return
+        self.pages.add(path)
+        content = record.get('content') or u''
+        self._add(Page.table, 'page', dict(
+            title=record.get('title'), path=path, content=content,
+            content_html=unicode(render(content)),
+            content_hash=content_hash(content),
+            created_on=parse_date(record.get('created_on')),
+            updated_on=datetime.datetime.utcnow()))
+
+    def add_comment(self, record):
+        post_id = record.get('post_id') or self.posts.get(record.get('post'))
+        if post_id is None:
+            self.counts['skipped'] += 1
+            return
+        created_on = parse_date(record.get('created_on'))
+        if post_id < self.first_new_post_id:
+            key = comment_key(created_on, record.get('name'),
+                              record.get('content'))
+            keys = self._existing_comment_keys(post_id)
+            if key in keys:
+                self.counts['skipped'] += 1
+                return
+            keys.add(key)
+        self._add(Comment.table, 'comment', dict(
+            post_id=post_id, name=record.get('name'),
+            email=record.get('email'), url=record.get('url') or None,
+            user_ip=record.get('user_ip'), content=record.get('content'),
+            created_on=created_on,
+            approved=bool(record.get('approved', False))))
+
+    def _existing_comment_keys(self, post_id):
+        """The comment_key()s of the comments on ``post_id``, written or
+        waiting to be; the previous post's are dropped"""
+        if post_id != self._keys_post_id:
+            comment = Comment.table
+            self._keys_post_id = post_id
+            self._comment_keys = set(
+                comment_key(*row) for row in self.engine.execute(
+                    select([comment.c.created_on, comment.c.name,
+                            comment.c.content])
+                    .where(comment.c.post_id == post_id)))
+            self._comment_keys.update(
+                comment_key(row['created_on'], row['name'], row['content'])
+                for row in self._rows[Comment.table]
+                if row['post_id'] == post_id)
+        return self._comment_keys
+
+    def _add(self, table, kind, row):
+        self._rows[table].append(row)
+        if kind is not None:
+            self.counts[kind] += 1
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write and commit the buffered rows"""
+        connection = self.engine.connect()
+        try:
+            transaction = connection.begin()
+            for table in self._tables():
+                rows = self._rows[table]
+                if rows:
+                    connection.execute(table.insert(), rows)
+                    del rows[:]
+            transaction.commit()
+        finally:
+            connection.close()
+        self._buffered = 0
+        if self.progress is not None:
+            self.progress(self.counts)
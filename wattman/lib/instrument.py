@@ -0,0 +1,206 @@
+"""Per-request SQL and timing instrumentation
+
+``InstrumentMiddleware`` times every request that reaches the
+application and, with ``SQLTimer`` installed on the engines and
+``base.render`` reporting template times, records for each one:
+
+* the route (``controller.action``) and status
+* how many SQL statements it ran and how long they took
+* how long its templates took to render
+* its wall time
+
+A statement run ``repeat_threshold`` or more times by one request is
+logged as a likely N+1 query.  The last ``history`` requests are kept
+and ``Instrumentation.summary()`` aggregates them per route, for the
+admin-only ``/admin/instrumentation`` page.  With ``profile`` set every
+request runs under cProfile and requests slower than ``slow`` seconds
+leave their profile in ``<cache_dir>/profiles``, for ``pstats``.
+"""
+import cProfile
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from paste.deploy.converters import asbool, asint
+from sqlalchemy.interfaces import ConnectionProxy
+
+__all__ = ['Instrumentation', 'InstrumentMiddleware', 'RequestStats',
+           'SQLTimer']
+
+log = logging.getLogger(__name__)
+
+UNSAFE_RE = re.compile(r'[^\w.-]+')
+
+
+class RequestStats(object):
+
+    """What one request did"""
+
+    def __init__(self, path):
+        self.path = path
+        self.route = None
+        self.status = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.wall_time = 0.0
+        self.statements = {}
+
+    def repeated(self, threshold):
+        """The statements run at least ``threshold`` times"""
+        return sorted((count, statement)
+                      for statement, count in self.statements.items()
+                      if count >= threshold)
+
+
+class Instrumentation(object):
+
+    """Collects ``RequestStats`` for the requests in progress and keeps
+    the latest ``history`` of them"""
+
+    def __init__(self, enabled=False, history=1000, repeat_threshold=5,
+                 slow=1.0, profile=False, profile_dir=None):
+        self.enabled = enabled
+        self.repeat_threshold = repeat_threshold
+        self.slow = slow
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.history = deque(maxlen=history)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the ``instrument.*`` settings"""
+        return cls(enabled=asbool(config.get('instrument.enabled', False)),
+                   history=asint(config.get('instrument.history', 1000)),
+                   repeat_threshold=asint(config.get(
+                       'instrument.repeat_threshold', 5)),
+                   slow=float(config.get('instrument.slow', 1.0)),
+                   profile=asbool(config.get('instrument.profile', False)),
+                   profile_dir=os.path.join(config['pylons.cache_dir'],
+                                            'profiles'))
+
+    def current(self):
+        """The stats of this thread's request, or None"""
+        return getattr(self._local, 'stats', None)
+
+    def begin(self, path):
+        self._local.stats = RequestStats(path)
+        return self._local.stats
+
+    def end(self, stats):
+        self._local.stats = None
+        repeated = stats.repeated(self.repeat_threshold)
+        for count, statement in repeated:
+            log.warning('Possible N+1 query in %s: ran %d times: %s',
+                        stats.route, count, statement)
+        if stats.wall_time >= self.slow:
+            log.warning('Slow request %s (%s): %.3fs, %d queries in %.3fs',
+                        stats.path, stats.route, stats.wall_time,
+                        stats.queries, stats.sql_time)
+        self._lock.acquire()
+        try:
+            self.history.append(stats)
+        finally:
+            self._lock.release()
+
+    def record_sql(self, statement, elapsed):
+        stats = self.current()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_time += elapsed
+            stats.statements[statement] = \
+                stats.statements.get(statement, 0) + 1
+
+    def record_render(self, elapsed):
+        stats = self.current()
+        if stats is not None:
+            stats.render_time += elapsed
+
+    def summary(self):
+        """Per-route averages and maximums over the kept requests"""
+        self._lock.acquire()
+        try:
+            history = list(self.history)
+        finally:
+            self._lock.release()
+        routes = {}
+        for stats in history:
+            route = routes.setdefault(stats.route or 'unrouted', dict(
+                requests=0, wall_time=0.0, max_wall_time=0.0, queries=0,
+                max_queries=0, sql_time=0.0, render_time=0.0, repeated=0))
+            route['requests'] += 1
+            route['wall_time'] += stats.wall_time
+            route['max_wall_time'] = max(route['max_wall_time'],
+                                         stats.wall_time)
+            route['queries'] += stats.queries
+            route['max_queries'] = max(route['max_queries'], stats.queries)
+            route['sql_time'] += stats.sql_time
+            route['render_time'] += stats.render_time
+            if stats.repeated(self.repeat_threshold):
+                route['repeated'] += 1
+        for route in routes.values():
+            for key in 'wall_time', 'queries', 'sql_time', 'render_time':
+                route[key] = route[key] / float(route['requests'])
+        return dict(requests=len(history), routes=routes)
+
+    def dump_profile(self, profile, stats):
+        if not os.path.isdir(self.profile_dir):
+            os.makedirs(self.profile_dir)
+        name = '%d-%s.prof' % (time.time() * 1000,
+                               UNSAFE_RE.sub('_', stats.route or 'unrouted'))
+        profile.dump_stats(os.path.join(self.profile_dir, name))
+
+
+class SQLTimer(ConnectionProxy):
+
+    """Engine proxy that reports each statement to ``instrumentation``"""
+
+    def __init__(self, instrumentation):
+        self.instrumentation = instrumentation
+
+    def cursor_execute(self, execute, cursor, statement, parameters,
+                       context, executemany):
+        start = time.time()
+        try:
+            return execute(cursor, statement, parameters, context)
+        finally:
+            self.instrumentation.record_sql(statement, time.time() - start)
+
+
+class InstrumentMiddleware(object):
+
+    """Records ``RequestStats`` for each request"""
+
+    def __init__(self, app, instrumentation):
+        self.app = app
+        self.instrumentation = instrumentation
+
+    def __call__(self, environ, start_response):
+        instrumentation = self.instrumentation
+        stats = instrumentation.begin(environ.get('PATH_INFO', ''))
+        def recording_start_response(status, headers, exc_info=None):
+            stats.status = int(status.split(None, 1)[0])
+            return start_response(status, headers, exc_info)
+        profile = None
+        if instrumentation.profile:
+            profile = cProfile.Profile()
+            profile.enable()
+        start = time.time()
+        try:
+            return self.app(environ, recording_start_response)
+        finally:
+            stats.wall_time = time.time() - start
+            if profile is not None:
+                profile.disable()
+            route = environ.get('pylons.routes_dict') or {}
+            if route.get('controller'):
+                stats.route = '%s.%s' % (route['controller'],
+                                         route.get('action'))
+            instrumentation.end(stats)
+            if profile is not None and stats.wall_time >= instrumentation.slow:
+                instrumentation.dump_profile(profile, stats)
@@ -0,0 +1,120 @@
+"""Background verification of commenters' links
+
+Comment forms only check that a URL is well formed.  Whether it
+actually resolves is found out later by the ``LinkChecker``, which
+probes links on a small worker pool and remembers the verdict per
+link (scheme, host, path and query; one missing page on a host says
+nothing about the others).  Templates ask for the verdict when they
+render a comment and only link the author's name once the link is
+known to answer.
+"""
+import httplib
+import logging
+import socket
+import sys
+import threading
+import urllib2
+import urlparse
+
+from paste.deploy.converters import asint
+
+from wattman.lib.cache import TTLCache
+from wattman.lib.workers import WorkerPool
+
+__all__ = ['LinkChecker']
+
+log = logging.getLogger(__name__)
+
+
+class HeadRequest(urllib2.Request):
+    def get_method(self):
+        return 'HEAD'
+
+
+class LinkChecker(object):
+
+    """Checks links in the background and caches the verdict per link
+
+    At most ``workers`` checks run at once; a good verdict is kept for
+    ``ttl`` seconds and a bad one for ``failure_ttl``.
+    """
+
+    def __init__(self, workers=2, ttl=86400, failure_ttl=3600, timeout=5):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.timeout = timeout
+        self.verdicts = TTLCache(ttl)
+        self.pool = WorkerPool(workers, name='linkcheck')
+        self._lock = threading.Lock()
+        self._pending = set()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a checker from the ``linkcheck.*`` settings"""
+        return cls(workers=asint(config.get('linkcheck.workers', 2)),
+                   ttl=asint(config.get('linkcheck.ttl', 86400)),
+                   failure_ttl=asint(config.get('linkcheck.failure_ttl',
+                                                3600)),
+                   timeout=asint(config.get('linkcheck.timeout', 5)))
+
+    def verdict(self, url):
+        """Return True if ``url`` is known good, False if it's known
+        bad and None if it hasn't been checked yet
+
+        Unchecked links are queued for checking.
+        """
+        key = self.key(url)
+        if not key:
+            return False
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            self.check(url)
+        return verdict
+
+    def check(self, url):
+        """Queue ``url`` for checking unless it's already known or
+        being checked"""
+        key = self.key(url)
+        if not key or key in self.verdicts:
+            return
+        self._lock.acquire()
+        try:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        finally:
+            self._lock.release()
+        self.pool.submit(self._check, key, url)
+
+    def key(self, url):
+        """What ``url``'s verdict is cached under: the URL without its
+        fragment, with the scheme and host lowercased (None if it has
+        no host)"""
+        scheme, host, path, query, fragment = urlparse.urlsplit(url or '')
+        if not host:
+            return None
+        return urlparse.urlunsplit((scheme.lower(), host.lower(),
+                                    path or '/', query, ''))
+
+    def _check(self, key, url):
+        try:
+            ok = self._exists(url)
+            self.verdicts.set(key, ok, ok and self.ttl or self.failure_ttl)
+        finally:
+            self._lock.acquire()
+            try:
+                self._pending.discard(key)
+            finally:
+                self._lock.release()
+
+    def _exists(self, url):
+        try:
+            urllib2.urlopen(HeadRequest(url), timeout=self.timeout).close()
+        except urllib2.HTTPError:
+            # Some servers don't do HEAD; they still answered
+            return sys.exc_info()[1].code == 405
+        except (urllib2.URLError, httplib.HTTPException, socket.error,
+                ValueError):
+            log.debug('Link check failed for %s', url, exc_info=True)
+            return False
+        return True
@@ -0,0 +1,57 @@
+"""Turns post and page content into sanitized HTML
+
+Content is written in Markdown.  Raw HTML in it is escaped, links and
+images may only point at http(s), mailto or relative URLs, and bare
+URLs are auto-linked.  ``render()`` is slow enough that it runs when
+content is saved, not when it's viewed (see wattman/model/rendering.py).
+
+Bump ``VERSION`` whenever ``render()``'s output changes, then re-render
+the stored HTML with ``paster render-content``.
+"""
+import re
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+from webhelpers.html import literal
+from webhelpers.html.converters import markdown
+from webhelpers.html.tools import auto_link
+
+__all__ = ['VERSION', 'content_hash', 'render']
+
+VERSION = 2
+
+# href/src attributes markdown wrote from the author's [links](...)
+URL_ATTR_RE = re.compile(r'\b(href|src)="([^"]*)"')
+# (no entities in scheme-less relative URLs: '&#58;' is a colon)
+SAFE_URL_RE = re.compile(r'^(https?:|mailto:|[/#?]|[^:&]*$)', re.IGNORECASE)
+# links markdown already made, which auto_link mustn't link again
+ANCHOR_RE = re.compile(r'(<a\b.*?</a>)', re.IGNORECASE | re.DOTALL)
+
+
+def content_hash(text):
+    """Hash of ``text`` and the renderer version, to tell when stored
+    HTML is out of date"""
+    return sha1('%d:%s' % (VERSION, (text or u'').encode('utf-8'))) \
+        .hexdigest()
+
+
+def render(text):
+    """The sanitized HTML for Markdown ``text``"""
+    if not text:
+        return literal(u'')
+    html = unicode(markdown(text, safe_mode='escape'))
+    html = URL_ATTR_RE.sub(_check_url, html)
+    # (split() puts the anchors at the odd indexes)
+    parts = ANCHOR_RE.split(html)
+    for i in range(0, len(parts), 2):
+        parts[i] = auto_link(literal(parts[i]))
+    return literal(u''.join(parts))
+
+
+def _check_url(match):
+    attr, url = match.groups()
+    if SAFE_URL_RE.match(url):
+        return match.group(0)
+    return '%s="#"' % attr
@@ -0,0 +1,189 @@
+"""Background spam checking for public comments
+
+Public comments are saved unapproved and left for the
+``ModerationQueue``, which picks up pending comments in batches, checks
+them against Akismet on a pool of worker threads and approves the ones
+that aren't spam.  Nobody waits on Akismet inside a request.
+
+A pending comment is one with ``approved`` False and ``spam`` still
+unset.  The queue walks the pending comments in id order, keeping the
+highest id it has handed to Akismet, so every pass moves on to newer
+comments.  Comments whose check fails (Akismet down, timeouts) stay
+pending and are retried on a later pass, backing off each time they
+fail again.  A restarted queue starts again from the oldest pending
+comment.
+"""
+import logging
+import threading
+import time
+
+from paste.deploy.converters import asint
+
+from wattman.lib.akismet import Akismet
+from wattman.lib.cache import TTLCache
+from wattman.lib.workers import WorkerPool
+from wattman.model import Session, Comment
+
+__all__ = ['ModerationQueue']
+
+log = logging.getLogger(__name__)
+
+
+class ModerationQueue(object):
+
+    """Batches pending comments through an Akismet checker
+
+    ``checker`` is anything with Akismet's ``comment_check(comment,
+    data)`` method.  Verdicts are cached per author email and IP, so a
+    regular commenter (or a persistent spammer) is only checked once
+    every ``cache_ttl`` seconds.
+    """
+
+    def __init__(self, checker, workers=4, batch_size=20, interval=5,
+                 cache_ttl=3600, max_backoff=3600):
+        self.checker = checker
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        # The highest comment id checked so far, and the comments whose
+        # check failed: id to (failures, when to retry)
+        self._cursor = 0
+        self._retry = {}
+        self._behind = False
+        self.verdicts = TTLCache(cache_ttl)
+        self.pool = WorkerPool(workers, name='akismet')
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a queue from the ``akismet.*`` settings"""
+        checker = Akismet(config['akismet.key'],
+                          config.get('akismet.blog_url', ''),
+                          api_url=config.get('akismet.api_url'),
+                          timeout=asint(config.get('akismet.timeout', 10)))
+        return cls(checker,
+                   workers=asint(config.get('akismet.workers', 4)),
+                   batch_size=asint(config.get('akismet.batch_size', 20)),
+                   interval=asint(config.get('akismet.interval', 5)),
+                   cache_ttl=asint(config.get('akismet.cache_ttl', 3600)),
+                   max_backoff=asint(config.get('akismet.max_backoff',
+                                                3600)))
+
+    def start(self):
+        """Start checking pending comments in the background"""
+        if self._running:
+            return
+        self._running = True
+        self.pool.start()
+        self._thread = threading.Thread(target=self._run,
+                                        name='moderation-queue')
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.pool.stop()
+
+    def wake(self):
+        """Check pending comments now rather than on the next poll"""
+        self._wakeup.set()
+
+    def run_once(self):
+        """Check one batch of pending comments
+
+        Returns the number of comments that got a verdict.
+        """
+        now = time.time()
+        try:
+            due = sorted(id for id, (failures, retry_at)
+                         in self._retry.items() if retry_at <= now)
+            due = due[:self.batch_size]
+            comments = []
+            if due:
+                comments = self._pending() \
+                    .filter(Comment.id.in_(due)) \
+                    .order_by(Comment.id).all()
+                # (the others were moderated or deleted meanwhile)
+                for id in set(due) - set(c.id for c in comments):
+                    del self._retry[id]
+            fresh = self._pending() \
+                .filter(Comment.id > self._cursor) \
+                .order_by(Comment.id) \
+                .limit(self.batch_size - len(comments)).all()
+            if fresh:
+                self._cursor = fresh[-1].id
+            comments.extend(fresh)
+            self._behind = len(comments) == self.batch_size
+            if not comments:
+                return 0
+            # One check per author and IP, however many comments they
+            # have waiting
+            jobs = {}
+            for c in comments:
+                key = self._cache_key(c)
+                if key not in jobs:
+                    jobs[key] = (key, c.content, self._akismet_data(c))
+            jobs = jobs.values()
+            verdicts = dict(zip([job[0] for job in jobs],
+                                self.pool.map(self._check, jobs)))
+            decided = 0
+            for comment in comments:
+                spam = verdicts[self._cache_key(comment)]
+                if spam is None:
+                    failures = self._retry.get(comment.id, (0, 0))[0] + 1
+                    backoff = min(self.interval * 2 ** failures,
+                                  self.max_backoff)
+                    self._retry[comment.id] = (failures, now + backoff)
+                    continue
+                self._retry.pop(comment.id, None)
+                comment.spam = spam
+                comment.approved = not spam
+                decided += 1
+            Session.commit()
+            return decided
+        finally:
+            Session.remove()
+
+    def _run(self):
+        while self._running:
+            try:
+                decided = self.run_once()
+            except Exception:
+                log.exception('Comment moderation pass failed')
+                decided = 0
+            # Go straight on to the next batch while there's a backlog
+            if decided < self.batch_size and not self._behind:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+
+    def _pending(self):
+        return Session.query(Comment) \
+            .filter(Comment.approved == False) \
+            .filter(Comment.spam == None)
+
+    def _check(self, job):
+        key, content, data = job
+        spam = self.verdicts.get(key)
+        if spam is None:
+            spam = self.checker.comment_check(content, data)
+            self.verdicts.set(key, spam)
+        return spam
+
+    def _cache_key(self, comment):
+        return ((comment.email or u'').lower(), comment.user_ip)
+
+    def _akismet_data(self, comment):
+        return {
+            'user_ip': comment.user_ip,
+            'user_agent': comment.user_agent,
+            'comment_author': comment.name,
+            'comment_author_email': comment.email,
+            'comment_author_url': comment.url,
+            'comment_type': 'comment',
+        }
@@ -0,0 +1,244 @@
+"""Whole-page cache for anonymous visitors
+
+``PageCacheMiddleware`` keeps the complete response to anonymous GETs
+of content pages, so repeat views skip routing, the controller, the
+database and Mako altogether.
+
+Only pages that say what they show are cached.  A controller calls
+``depends_on()`` with the entities it rendered, which tags the cached
+page with them; ``PageCacheInvalidator`` watches the session and, when
+a change to a post, page, comment or tag commits, invalidates the
+pages tagged with it.  Invalidation never touches the cached pages
+themselves: each tag has a version token, a cached page records the
+versions it was rendered against, and a page whose versions are out of
+date is treated as a miss.  That works the same whether the pages are
+held in memory or in files shared by several server processes.
+
+Every entity also has a ``<kind>:*`` tag that changes whenever any of
+that kind changes; listings (e.g. the latest posts) depend on those.
+Pages are kept apart for each ``stamp`` (of the templates and the asset
+build they were rendered with), so a cache that outlives the process
+never serves pages linking to assets that have since changed.
+"""
+import logging
+import os
+import random
+import threading
+import weakref
+
+from paste.deploy.converters import asbool, asint, aslist
+from sqlalchemy.orm import object_mapper
+from sqlalchemy.orm.interfaces import SessionExtension
+
+from wattman.lib.cache import FileCache, TTLCache
+
+__all__ = ['PageCache', 'PageCacheInvalidator', 'PageCacheMiddleware',
+           'depends_on', 'tags_for']
+
+log = logging.getLogger(__name__)
+
+ENVIRON_KEY = 'wattman.pagecache.tags'
+
+
+def tags_for(obj):
+    """The invalidation tag for an entity, e.g. ``post:12``"""
+    pk = object_mapper(obj).primary_key_from_instance(obj)[0]
+    return u'%s:%s' % (type(obj).__name__.lower(), pk)
+
+
+def depends_on(environ, *things):
+    """Tag the page being rendered with entities (or tag strings) so
+    it can be cached until one of them changes
+
+    Pages that never call this aren't cached.
+    """
+    tags = environ.setdefault(ENVIRON_KEY, [])
+    for thing in things:
+        if isinstance(thing, basestring):
+            tags.append(thing)
+        else:
+            tags.append(tags_for(thing))
+
+
+def _token():
+    return '%016x' % random.getrandbits(64)
+
+
+class PageCache(object):
+
+    """Cached responses plus the version tokens of their tags
+
+    ``store`` is a ``TTLCache`` (memory) or ``FileCache`` (file).
+    """
+
+    def __init__(self, store, expire=3600, stamp=''):
+        self.store = store
+        self.expire = expire
+        self.stamp = stamp
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stores = self.invalidations = 0
+
+    @classmethod
+    def from_config(cls, config, stamp=''):
+        """Build a cache from the ``pagecache.*`` settings"""
+        expire = asint(config.get('pagecache.expire', 3600))
+        if config.get('pagecache.type', 'memory') == 'file':
+            data_dir = config.get('pagecache.data_dir') or \
+                os.path.join(config['pylons.cache_dir'], 'pagecache')
+            store = FileCache(data_dir, expire)
+        else:
+            store = TTLCache(expire, asint(config.get('pagecache.max_size',
+                                                      10000)))
+        return cls(store, expire, stamp)
+
+    def generation(self):
+        """Token that changes with every invalidation"""
+        return self.store.get('generation')
+
+    def lookup(self, key):
+        """Return the (status, headers, body) cached for ``key`` if it's
+        still current, else None"""
+        entry = self.store.get(self._key(key))
+        if entry is not None:
+            status, headers, body, versions = entry
+            for tag, version in versions:
+                if self.store.get('tag:' + tag) != version:
+                    entry = None
+                    break
+        self._count(entry is None and 'misses' or 'hits')
+        if entry is None:
+            return None
+        return status, headers, body
+
+    def save(self, key, status, headers, body, tags):
+        versions = [(tag, self.store.get('tag:' + tag))
+                    for tag in set(tags)]
+        self.store.set(self._key(key), (status, headers, body, versions))
+        self._count('stores')
+
+    def _key(self, key):
+        return 'page:%s:%s' % (self.stamp, key)
+
+    def invalidate(self, tags):
+        """Make every page tagged with any of ``tags`` stale"""
+        for tag in tags:
+            self.store.set('tag:' + tag, _token())
+        self.store.set('generation', _token())
+        self._count('invalidations')
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, stores=self.stores,
+                    invalidations=self.invalidations)
+
+    def _count(self, counter):
+        self._lock.acquire()
+        try:
+            setattr(self, counter, getattr(self, counter) + 1)
+        finally:
+            self._lock.release()
+
+
+class PageCacheMiddleware(object):
+
+    """Serves and fills the page cache for anonymous GETs under
+    ``paths``
+
+    A request carrying the AuthKit cookie always goes to the
+    application, and a response that sets a cookie is never cached.
+    """
+
+    def __init__(self, app, cache, paths, auth_cookie='authkit'):
+        self.app = app
+        self.cache = cache
+        self.paths = tuple(paths)
+        self.auth_cookie = auth_cookie + '='
+
+    @classmethod
+    def from_config(cls, app, config):
+        """Wrap ``app`` if ``pagecache.enabled`` is set"""
+        if not asbool(config.get('pagecache.enabled', False)):
+            return app
+        paths = aslist(config.get('pagecache.paths', '/post/ /page/ /tag/'))
+        return cls(app, config['pylons.app_globals'].page_cache, paths,
+                   config.get('authkit.cookie.name', 'authkit'))
+
+    def __call__(self, environ, start_response):
+        if not self.cacheable(environ):
+            return self.app(environ, start_response)
+        key = '%s%s%s?%s' % (environ.get('HTTP_HOST', ''),
+                             environ.get('SCRIPT_NAME', ''),
+                             environ.get('PATH_INFO', ''),
+                             environ.get('QUERY_STRING', ''))
+        cached = self.cache.lookup(key)
+        if cached is not None:
+            status, headers, body = cached
+            etag = [v for h, v in headers if h.lower() == 'etag']
+            if etag and environ.get('HTTP_IF_NONE_MATCH') == etag[0]:
+                # (the validators of a cached page are still current)
+                start_response('304 Not Modified', [
+                    (h, v) for h, v in headers if h.lower() in
+                    ('etag', 'last-modified', 'cache-control')] +
+                    [('X-Cache', 'HIT')])
+                return []
+            start_response(status, headers + [('X-Cache', 'HIT')])
+            return [body]
+
+        generation = self.cache.generation()
+        response = []
+        def capture(status, headers, exc_info=None):
+            response[:] = [status, headers]
+            return start_response(status, headers + [('X-Cache', 'MISS')],
+                                  exc_info)
+        app_iter = self.app(environ, capture)
+        try:
+            body = ''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        status, headers = response
+        tags = environ.get(ENVIRON_KEY)
+        if tags and status.startswith('200') and \
+                not [h for h, v in headers if h.lower() == 'set-cookie'] and \
+                self.cache.generation() == generation:
+            # (nothing was invalidated while we rendered)
+            self.cache.save(key, status, headers, body, tags)
+        return [body]
+
+    def cacheable(self, environ):
+        return environ['REQUEST_METHOD'] == 'GET' and \
+            environ.get('PATH_INFO', '').startswith(self.paths) and \
+            self.auth_cookie not in environ.get('HTTP_COOKIE', '')
+
+
+class PageCacheInvalidator(SessionExtension):
+
+    """Invalidates cached pages when the entities they show change
+
+    Tags are collected as changes are flushed and only invalidated
+    once the transaction commits.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._tags = weakref.WeakKeyDictionary()
+
+    def after_flush(self, session, flush_context):
+        tags = self._tags.setdefault(session, set())
+        for obj in list(session.new) + list(session.dirty) + \
+                list(session.deleted):
+            tags.add(tags_for(obj))
+            tags.add(type(obj).__name__.lower() + ':*')
+            # a post's page shows its comments and lists its tags
+            post_id = getattr(obj, 'post_id', None)
+            if post_id is not None:
+                tags.add(u'post:%s' % post_id)
+            for tag in obj.__dict__.get('tags', ()):
+                tags.add(tags_for(tag))
+
+    def after_commit(self, session):
+        tags = self._tags.pop(session, None)
+        if tags:
+            self.cache.invalidate(tags)
+
+    def after_rollback(self, session):
+        self._tags.pop(session, None)
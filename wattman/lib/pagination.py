@@ -0,0 +1,194 @@
+"""Keyset ("seek") pagination with opaque cursors
+
+OFFSET paging makes the database read and throw away every row before
+the page, so deep archive pages get slower the deeper they are.  A
+``Keyset`` instead remembers where a page ended -- the sort key and id
+of its last row -- and asks for the rows beyond that, which an index on
+the sort key finds directly; page 5000 costs what page 1 does.
+
+Positions are handed out as cursors: URL-safe strings, opaque to the
+client, that go in a query string (``/tag/python?page=<cursor>``).  A
+cursor points either after or before a row, so a page can link to the
+next and the previous page.  Rows whose sort key is NULL come after all
+the others, ordered by id, whatever the database's NULL ordering.
+
+    >>> page = post_page(request.params.get('page'))
+    >>> page.items, page.next, page.previous
+
+"""
+import base64
+import datetime
+try:
+    import json
+except ImportError:
+    import simplejson as json
+import operator
+
+import sqlalchemy as sa
+
+from wattman.model import Comment, Post
+
+__all__ = ['InvalidCursor', 'Keyset', 'KeysetPage', 'comment_keyset',
+           'comment_page', 'post_keyset', 'post_page', 'tag_page']
+
+
+class InvalidCursor(ValueError):
+
+    """A cursor that wasn't made by this keyset or can't be decoded"""
+
+
+class KeysetPage(object):
+
+    """One page of ``items``, with the cursors of the pages around it
+    (None at either end)"""
+
+    def __init__(self, items, next=None, previous=None):
+        self.items = items
+        self.next = next
+        self.previous = previous
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class Keyset(object):
+
+    """Pages through queries for ``entity`` ordered by its ``key``
+    attribute and then the unique ``tiebreak`` (e.g. ``'posted_on'``
+    and ``'id'``)"""
+
+    def __init__(self, entity, key, tiebreak='id', descending=True,
+                 per_page=20):
+        self.entity = entity
+        self.key = key
+        self.tiebreak = tiebreak
+        self.descending = descending
+        self.per_page = per_page
+
+    def page(self, query, cursor=None, per_page=None):
+        """The page of ``query`` at ``cursor`` (the first page if None);
+        ``query``'s own ordering is replaced"""
+        per_page = per_page or self.per_page
+        query = query.order_by(None)
+        if cursor is None:
+            items = self._fetch(query, None, False, per_page + 1)
+            return KeysetPage(items[:per_page], self._next(items, per_page))
+        backwards, position = self.decode(cursor)
+        items = self._fetch(query, position, backwards, per_page + 1)
+        if backwards:
+            more = len(items) > per_page
+            items = items[:per_page]
+            items.reverse()
+            return KeysetPage(items,
+                              items and self.encode(False, items[-1]) or None,
+                              more and self.encode(True, items[0]) or None)
+        return KeysetPage(items[:per_page], self._next(items, per_page),
+                          items and self.encode(True, items[0]) or None)
+
+    def _next(self, items, per_page):
+        if len(items) > per_page:
+            return self.encode(False, items[per_page - 1])
+        return None
+
+    def _fetch(self, query, position, backwards, limit):
+        """Up to ``limit`` rows beyond ``position`` (before it if
+        ``backwards``), nearest first"""
+        key = getattr(self.entity, self.key)
+        tiebreak = getattr(self.entity, self.tiebreak)
+        if self.descending != backwards:
+            beyond, within, order = operator.lt, operator.le, sa.desc
+        else:
+            beyond, within, order = operator.gt, operator.ge, sa.asc
+        # rows with a key, then those without
+        segments = [False, True]
+        if backwards:
+            segments.reverse()
+        if position is not None:
+            segments = segments[segments.index(position[0] is None):]
+        items = []
+        for null in segments:
+            if null:
+                q = query.filter(key == None).order_by(order(tiebreak))
+                if position is not None and position[0] is None:
+                    q = q.filter(beyond(tiebreak, position[1]))
+            else:
+                q = query.filter(key != None) \
+                    .order_by(order(key), order(tiebreak))
+                if position is not None and position[0] is not None:
+                    value, last = position
+                    # the range on key alone lets the index seek to it
+                    q = q.filter(within(key, value)).filter(sa.or_(
+                        beyond(key, value), beyond(tiebreak, last)))
+            items.extend(q.limit(limit - len(items)).all())
+            if len(items) >= limit:
+                break
+        return items
+
+    def encode(self, backwards, item):
+        """The cursor pointing before (or after) ``item``"""
+        value = getattr(item, self.key)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        data = json.dumps([backwards and 'b' or 'a', value,
+                           getattr(item, self.tiebreak)],
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(data).rstrip('=')
+
+    def decode(self, cursor):
+        """(backwards, (key value, tiebreak value)) from ``cursor``"""
+        try:
+            cursor = str(cursor)
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, value, last = json.loads(data)
+            if direction not in ('a', 'b') or last is None:
+                raise ValueError(direction)
+            if value is not None:
+                value = self._load(self.key, value)
+            last = self._load(self.tiebreak, last)
+        except (TypeError, ValueError, UnicodeError):
+            raise InvalidCursor(cursor)
+        return direction == 'b', (value, last)
+
+    def _load(self, column, value):
+        """``value`` decoded from JSON as a value of ``column``; raises
+        ValueError if it can't be one"""
+        type = self.entity.table.c[column].type
+        if isinstance(type, sa.DateTime):
+            return datetime.datetime.strptime(value[:19],
+                                              '%Y-%m-%dT%H:%M:%S')
+        if isinstance(type, sa.Date):
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        if isinstance(type, sa.Integer):
+            # (bool is an int, but not a row's id)
+            if isinstance(value, bool) or \
+                    not isinstance(value, (int, long)):
+                raise ValueError(value)
+        elif isinstance(type, sa.String):
+            if not isinstance(value, basestring):
+                raise ValueError(value)
+        elif isinstance(value, (list, dict)):
+            raise ValueError(value)
+        return value
+
+post_keyset = Keyset(Post, 'posted_on')
+comment_keyset = Keyset(Comment, 'created_on', descending=False, per_page=50)
+
+
+def post_page(cursor=None, per_page=None):
+    """A page of the published posts, newest first"""
+    return post_keyset.page(Post.published(), cursor, per_page)
+
+
+def tag_page(tag, cursor=None, per_page=None):
+    """A page of the published posts with ``tag``, newest first"""
+    query = Post.published().filter(Post.tags.contains(tag))
+    return post_keyset.page(query, cursor, per_page)
+
+
+def comment_page(post, cursor=None, per_page=None):
+    """A page of ``post``'s approved comments, oldest first"""
+    query = Comment.query.filter_by(post=post, approved=True)
+    return comment_keyset.page(query, cursor, per_page)
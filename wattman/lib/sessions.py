@@ -0,0 +1,323 @@
+"""Session storage chosen by configuration
+
+Beaker keeps each session in a file under ``cache_dir``, so every
+request that touches a session takes a file lock and reads the file,
+and, since Beaker records the time of every access, writes it back
+too, whether or not anything in it changed.
+
+``sessions.type`` picks where sessions are kept instead:
+
+``file``
+    Beaker's own files (the default).
+``sqlite``
+    One SQLite database in WAL mode, so reads never wait on a write,
+    read through a memory map (``sessions.mmap_size``).  Server
+    processes on one host can share it.
+``memory``
+    A dict, for a single server process.
+
+Both are plugged into Beaker's ``SessionMiddleware`` as its namespace
+class, so a session is still only loaded when a request first uses it.
+``StoreNamespaceManager`` writes a session back only when its contents
+changed; a session that was only read has its access time updated at
+most once every ``sessions.touch`` seconds, without rewriting the data.
+Sessions aren't expired one by one on the way in: ``SessionStore``
+runs a sweeper thread that deletes every session idle for longer than
+``sessions.expire`` in one statement, every ``sessions.sweep_interval``
+seconds.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from beaker.container import NamespaceManager
+from paste.deploy.converters import asint
+
+__all__ = ['MemoryStore', 'SQLiteStore', 'SessionStore',
+           'StoreNamespaceManager']
+
+log = logging.getLogger(__name__)
+
+# Beaker keeps a session's data under this key of its namespace
+KEY = 'session'
+
+
+class MemoryStore(object):
+
+    """Sessions in a dict: id to (pickled data, access time)"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def load(self, id):
+        """The pickled data of session ``id`` and when it was last
+        accessed, or None"""
+        return self._sessions.get(id)
+
+    def save(self, id, data, accessed):
+        self._sessions[id] = (data, accessed)
+
+    def touch(self, id, accessed):
+        self._lock.acquire()
+        try:
+            if id in self._sessions:
+                self._sessions[id] = (self._sessions[id][0], accessed)
+        finally:
+            self._lock.release()
+
+    def delete(self, id):
+        self._sessions.pop(id, None)
+
+    def sweep(self, before):
+        """Delete the sessions last accessed before ``before``; returns
+        how many were"""
+        self._lock.acquire()
+        try:
+            expired = [id for id, (data, accessed) in
+                       list(self._sessions.items()) if accessed < before]
+            for id in expired:
+                del self._sessions[id]
+        finally:
+            self._lock.release()
+        return len(expired)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteStore(object):
+
+    """Sessions in a SQLite database at ``path``, in WAL mode, read
+    through a memory map of up to ``mmap_size`` bytes
+
+    Each thread has its own connection.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS session ('
+              'id TEXT PRIMARY KEY, data BLOB NOT NULL, '
+              'accessed REAL NOT NULL)')
+    INDEX = ('CREATE INDEX IF NOT EXISTS session_accessed '
+             'ON session (accessed)')
+
+    def __init__(self, path, mmap_size=64 * 1024 * 1024, busy_timeout=5):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        connection = self._connection()
+        connection.execute(self.SCHEMA)
+        connection.execute(self.INDEX)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # (autocommit: every statement is its own transaction)
+            connection = sqlite3.connect(self.path,
+                                         timeout=self.busy_timeout,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute('PRAGMA mmap_size = %d' % self.mmap_size)
+            self._local.connection = connection
+        return connection
+
+    def load(self, id):
+        row = self._connection().execute(
+            'SELECT data, accessed FROM session WHERE id = ?',
+            (id,)).fetchone()
+        if row is None:
+            return None
+        return bytes(row[0]), row[1]
+
+    def save(self, id, data, accessed):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO session (id, data, accessed) '
+            'VALUES (?, ?, ?)', (id, sqlite3.Binary(data), accessed))
+
+    def touch(self, id, accessed):
+        self._connection().execute(
+            'UPDATE session SET accessed = ? WHERE id = ?', (accessed, id))
+
+    def delete(self, id):
+        self._connection().execute('DELETE FROM session WHERE id = ?',
+                                   (id,))
+
+    def sweep(self, before):
+        return self._connection().execute(
+            'DELETE FROM session WHERE accessed < ?', (before,)).rowcount
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT count(*) FROM session').fetchone()[0]
+
+    def close(self):
+        """Close this thread's connection"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class StoreNamespaceManager(NamespaceManager):
+
+    """Beaker namespace for one session, kept in ``store``
+
+    Remembers the data it loaded and skips writing the same data back;
+    only the access time is updated then, and only if the stored one is
+    more than ``touch`` seconds old.  (Beaker's own arguments, such as
+    ``data_dir``, are ignored.)
+    """
+
+    def __init__(self, namespace, store=None, touch=60, **kwargs):
+        NamespaceManager.__init__(self, namespace)
+        self.store = store
+        self.touch = touch
+        self._loaded = None
+
+    def __getitem__(self, key):
+        if key != KEY:
+            raise KeyError(key)
+        row = self.store.load(self.namespace)
+        if row is None:
+            raise KeyError(key)
+        self._loaded = row
+        data, accessed = row
+        session = pickle.loads(data)
+        # (the access time is kept beside the data, so that touching a
+        # session doesn't mean rewriting it)
+        session['_accessed_time'] = accessed
+        return session
+
+    def __setitem__(self, key, session):
+        if key != KEY:
+            raise KeyError(key)
+        session = dict(session)
+        accessed = session.pop('_accessed_time', None) or time.time()
+        data = pickle.dumps(session, pickle.HIGHEST_PROTOCOL)
+        if self._loaded is not None and self._loaded[0] == data:
+            if accessed - self._loaded[1] >= self.touch:
+                self.store.touch(self.namespace, accessed)
+                self._loaded = (data, accessed)
+            return
+        self.store.save(self.namespace, data, accessed)
+        self._loaded = (data, accessed)
+
+    def __contains__(self, key):
+        return key == KEY and self.store.load(self.namespace) is not None
+
+    def __delitem__(self, key):
+        if key != KEY:
+            raise KeyError(key)
+        self.store.delete(self.namespace)
+        self._loaded = None
+
+    def keys(self):
+        if KEY in self:
+            return [KEY]
+        return []
+
+    def do_remove(self):
+        self.store.delete(self.namespace)
+        self._loaded = None
+
+
+class SessionStore(object):
+
+    """The configured session store and its sweeper
+
+    ``store`` is None for Beaker's own file storage, which is left as
+    it is.  Otherwise sessions idle for ``expire`` seconds are deleted
+    every ``sweep_interval`` seconds once ``start()`` is called.
+    """
+
+    def __init__(self, store=None, expire=1209600, sweep_interval=300,
+                 touch=60):
+        self.store = store
+        self.expire = expire
+        self.sweep_interval = sweep_interval
+        self.touch = touch
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the store named by ``sessions.type`` from the
+        ``sessions.*`` settings"""
+        type = config.get('sessions.type', 'file')
+        if type == 'file':
+            store = None
+        elif type == 'memory':
+            store = MemoryStore()
+        elif type == 'sqlite':
+            path = config.get('sessions.path') or \
+                os.path.join(config['pylons.cache_dir'], 'sessions.db')
+            store = SQLiteStore(path, asint(config.get('sessions.mmap_size',
+                                                       64 * 1024 * 1024)))
+        else:
+            raise ValueError('Unknown sessions.type: %r' % type)
+        # (not sooner than Beaker would time them out itself)
+        expire = max(asint(config.get('sessions.expire', 1209600)),
+                     asint(config.get('beaker.session.timeout') or 0))
+        return cls(store, expire=expire,
+                   sweep_interval=asint(config.get('sessions.sweep_interval',
+                                                   300)),
+                   touch=asint(config.get('sessions.touch', 60)))
+
+    def middleware_options(self):
+        """Keyword arguments for Beaker's ``SessionMiddleware``"""
+        if self.store is None:
+            return {}
+        return dict(namespace_class=StoreNamespaceManager, store=self.store,
+                    touch=self.touch)
+
+    def sweep(self):
+        """Delete the expired sessions now; returns how many there
+        were"""
+        if self.store is None:
+            return 0
+        return self.store.sweep(time.time() - self.expire)
+
+    def start(self):
+        """Start sweeping expired sessions in the background"""
+        if self._running or self.store is None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='session-sweeper')
+        self._thread.setDaemon(True)
+        self._thread.start()
+        # (rather than have it wake up while the interpreter shuts down)
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._wakeup.clear()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.sweep_interval)
+            if not self._running:
+                break
+            try:
+                swept = self.sweep()
+            except Exception:
+                log.exception('Sweeping expired sessions failed')
+            else:
+                if swept:
+                    log.debug('Swept %d expired sessions', swept)
@@ -0,0 +1,103 @@
+"""Compiling the Mako templates ahead of traffic
+
+Mako compiles a template into a Python module (under the lookup's
+``module_directory``) the first time it's looked up, and keeps it in
+the lookup's in-memory collection from then on; each new server process
+pays for that on its first requests.  ``warm_up()`` looks up every
+template under the lookup's directories, so they're compiled (or their
+up-to-date modules loaded), checked for errors and collected before the
+first request.  It runs at startup with ``templates.warmup = true``,
+and from::
+
+    $ paster warm-templates development.ini
+
+"""
+import logging
+import os
+import time
+
+from mako import exceptions
+
+__all__ = ['TemplateResult', 'find_templates', 'log_results', 'module_file',
+           'warm_up']
+
+log = logging.getLogger(__name__)
+
+# Files under the template directories that are templates
+EXTENSIONS = ('.mako', '.html')
+
+
+class TemplateResult(object):
+
+    """How long looking up the template at ``uri`` took, whether it was
+    ``compiled`` (rather than loaded from an up-to-date module) and the
+    ``error`` if it failed"""
+
+    def __init__(self, uri, seconds, compiled, error=None):
+        self.uri = uri
+        self.seconds = seconds
+        self.compiled = compiled
+        self.error = error
+
+
+def find_templates(directories):
+    """The URIs of the templates under ``directories``, in order"""
+    uris = set()
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                if name.startswith('.') or \
+                        not name.endswith(EXTENSIONS):
+                    continue
+                path = os.path.relpath(os.path.join(root, name), directory)
+                uris.add('/' + path.replace(os.sep, '/'))
+    return sorted(uris)
+
+
+def module_file(lookup, uri):
+    """The module Mako compiles the template at ``uri`` into, or None
+    if the lookup compiles in memory"""
+    if lookup.module_directory is None:
+        return None
+    return os.path.abspath(os.path.join(lookup.module_directory,
+                                        uri.lstrip('/') + '.py'))
+
+
+def warm_up(lookup, force=False):
+    """Look up every template the ``lookup`` can find, compiling those
+    whose modules are missing or stale (all of them with ``force``)
+
+    Returns a ``TemplateResult`` per template.  A template that fails to
+    compile is reported, not raised, so one bad template doesn't keep
+    the others from being warmed.
+    """
+    results = []
+    for uri in find_templates(lookup.directories):
+        path = module_file(lookup, uri)
+        if force and path is not None and os.path.exists(path):
+            os.remove(path)
+        before = path is not None and os.path.exists(path) and \
+            os.path.getmtime(path)
+        start = time.time()
+        error = None
+        try:
+            lookup.get_template(uri)
+        except (exceptions.MakoException, SyntaxError, IOError):
+            error = exceptions.text_error_template().render()
+        seconds = time.time() - start
+        compiled = path is None or not before or \
+            (os.path.exists(path) and os.path.getmtime(path) != before)
+        results.append(TemplateResult(uri, seconds, compiled, error))
+    return results
+
+
+def log_results(results):
+    """Log what ``warm_up()`` did"""
+    for result in results:
+        if result.error:
+            log.error('Template %s failed to compile:\n%s', result.uri,
+                      result.error)
+    log.info('Warmed %d templates (%d compiled) in %.3fs', len(results),
+             len([r for r in results if r.compiled]),
+             sum(r.seconds for r in results))
@@ -0,0 +1,74 @@
+"""A fixed-size pool of background worker threads"""
+import logging
+import threading
+import Queue
+
+__all__ = ['WorkerPool']
+
+log = logging.getLogger(__name__)
+
+
+class WorkerPool(object):
+
+    """Runs callables on a bounded number of daemon threads
+
+    The pool never has more than ``size`` calls in flight, which keeps
+    slow outbound requests (spam checks, link checks) from piling up.
+    """
+
+    def __init__(self, size, name='worker'):
+        self.size = size
+        self.name = name
+        self._jobs = Queue.Queue()
+        self._threads = []
+
+    def start(self):
+        while len(self._threads) < self.size:
+            t = threading.Thread(target=self._work, name='%s-%d' %
+                                 (self.name, len(self._threads)))
+            t.setDaemon(True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """Let the workers finish their current job and exit"""
+        for t in self._threads:
+            self._jobs.put(None)
+        self._threads = []
+
+    def submit(self, func, *args):
+        """Queue ``func(*args)`` to run on a worker thread"""
+        if not self._threads:
+            self.start()
+        self._jobs.put((func, args, None))
+
+    def map(self, func, items):
+        """Call ``func`` on every item concurrently and return the
+        results in order; a call that raises yields None
+        """
+        if not self._threads:
+            self.start()
+        results = [None] * len(items)
+        done = Queue.Queue()
+        for i, item in enumerate(items):
+            self._jobs.put((func, (item,), (done, results, i)))
+        for item in items:
+            done.get()
+        return results
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            func, args, reply = job
+            result = None
+            try:
+                result = func(*args)
+            except Exception:
+                log.exception('%s failed running %r', self.name, func)
+            finally:
+                if reply is not None:
+                    done, results, i = reply
+                    results[i] = result
+                    done.put(i)
@@ -14,16 +14,49 @@ metadata = elixir.metadata
 elixir.options_defaults.update(dict(shortnames=True, inheritance='multi', polymorphic=True))
 
 from entities import *
+from wattman.model.indexes import define_indexes
+from wattman.model.pathindex import PathIndexExtension, path_index
+from wattman.model.search import SearchIndexExtension, search_index
+from wattman.model.summary import ContentSummaryExtension, content_summary
+
+# Session extensions installed by init_model()
+session_extensions = [PathIndexExtension(path_index),
+                      SearchIndexExtension(search_index),
+                      ContentSummaryExtension(content_summary)]
+
+def register_extension(extension):
+    """Add a session extension for init_model() to install, replacing
+    any earlier one of the same class"""
+    session_extensions[:] = [ext for ext in session_extensions
+                             if type(ext) is not type(extension)]
+    session_extensions.append(extension)
 
 # this will be called in config/environment.py
-def init_model(engine):
-    """Call me before using any of the tables or classes in the model"""
-    elixir.session.configure(bind=engine)
-    metadata.bind = engine
+def init_model(engine, read_engines=(), read_window=None):
+    """Call me before using any of the tables or classes in the model
+
+    Queries are sent to the ``read_engines`` (replicas of ``engine``)
+    when there are any; see meta.EngineRouter.
+    """
+    elixir.session.configure(bind=engine, extension=session_extensions)
+    metadata.bind = meta.engine = engine
+    meta.router.configure(read_engines, read_window)
 
     if elixir.options_defaults.get('autoload', False) and not metadata.is_bound():
         elixir.delay_setup = True
 
     if not elixir.options_defaults.get('autoload', False):
-        elixir.setup_all(True)
+        elixir.setup_all()
+        define_indexes()
+        new_summaries = content_summary.create(engine)
+        metadata.create_all()
+        if search_index.create(engine):
+            search_index.rebuild(Session)
+            Session.commit()
+            Session.remove()
+        if new_summaries:
+            content_summary.rebuild(Session)
+            Session.commit()
+            Session.remove()
+        path_index.load()
 
@@ -0,0 +1,90 @@
+"""Keeps the comment counters on Post up to date
+
+``Post.comment_count`` and ``Post.approved_count`` are denormalized so
+that listings can show "N comments" without touching the comment
+table.  ``CommentCounter`` adjusts them with an UPDATE on the flush's
+own connection whenever a comment is inserted, approved, moved or
+deleted, so the counters commit or roll back with the comment itself.
+The UPDATE also stamps the post's ``updated_on``, since its page shows
+its comments.  ``Post.rebuild_comment_counts()`` recomputes the
+counters from scratch.
+"""
+import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import instance_state
+from sqlalchemy.orm.interfaces import EXT_CONTINUE, MapperExtension
+
+__all__ = ['CommentCounter', 'COUNTERS']
+
+COUNTERS = ['comment_count', 'approved_count']
+
+# Attributes whose changes move a comment between counters
+WATCHED = set(['approved', 'post', 'post_id'])
+
+
+class CommentCounter(MapperExtension):
+
+    """Mapper extension for Comment that maintains Post's counters
+
+    Updates and deletes read the comment's stored post and approval
+    from the database first, since the loaded values may be expired or
+    already overwritten.
+    """
+
+    def after_insert(self, mapper, connection, instance):
+        self._adjust(mapper, connection, instance, instance.post_id,
+                     1, instance.approved and 1 or 0)
+        return EXT_CONTINUE
+
+    def before_update(self, mapper, connection, instance):
+        if WATCHED.isdisjoint(instance_state(instance).committed_state):
+            return EXT_CONTINUE
+        old = self._stored(mapper, connection, instance)
+        new = (instance.post_id, bool(instance.approved))
+        if old != new:
+            self._adjust(mapper, connection, instance, old[0], -1,
+                         old[1] and -1 or 0)
+            self._adjust(mapper, connection, instance, new[0], 1,
+                         new[1] and 1 or 0)
+        return EXT_CONTINUE
+
+    def before_delete(self, mapper, connection, instance):
+        post_id, approved = self._stored(mapper, connection, instance)
+        self._adjust(mapper, connection, instance, post_id, -1,
+                     approved and -1 or 0)
+        return EXT_CONTINUE
+
+    def _stored(self, mapper, connection, instance):
+        """The (post_id, approved) currently stored for ``instance``"""
+        table = mapper.local_table
+        row = connection.execute(
+            select([table.c.post_id, table.c.approved],
+                   table.c.id == instance.id)).fetchone()
+        if row is None:
+            return None, False
+        return row[0], bool(row[1])
+
+    def _adjust(self, mapper, connection, instance, post_id, total,
+                approved):
+        if post_id is None:
+            return
+        post_mapper = mapper.get_property('post').mapper
+        table = post_mapper.local_table
+        connection.execute(table.update()
+                           .where(table.c.id == post_id)
+                           .values(comment_count=table.c.comment_count + total,
+                                   approved_count=table.c.approved_count +
+                                   approved,
+                                   updated_on=datetime.datetime.utcnow()))
+        # Make sure a Post already in memory picks up the new counts
+        post = instance.__dict__.get('post')
+        if post is None or post.id != post_id:
+            session = object_session(instance)
+            key = post_mapper.identity_key_from_primary_key([post_id])
+            post = session is not None and session.identity_map.get(key)
+        if post:
+            state = instance_state(post)
+            state.expire_attributes(state.dict, COUNTERS + ['updated_on'])
+
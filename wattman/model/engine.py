@@ -0,0 +1,118 @@
+"""Creates the database engine from the ``sqlalchemy.*`` settings
+
+On top of what ``sqlalchemy.engine_from_config`` understands (e.g.
+``pool_size``, ``max_overflow``, ``pool_recycle`` and ``pool_timeout``)
+this takes:
+
+``sqlalchemy.pool_pre_ping``
+    Test each connection as it's taken from the pool and replace it if
+    the database has gone away.
+
+``sqlalchemy.pragma.<name>``
+    SQLite ``PRAGMA``s to set on every new connection.
+
+``sqlalchemy.read.<name>.*``
+    Read-only replicas of the database, each configured like the
+    primary (``sqlalchemy.read.<name>.url`` and so on); see
+    ``read_engines_from_config()``.
+
+``sqlalchemy.read.window``
+    How many seconds a client keeps reading from the primary after it
+    has written, so that it sees its own writes (default 5).
+
+SQLite database files get a real connection pool shared by all threads
+instead of SQLAlchemy's one-connection-per-thread default, and are run
+in WAL mode (readers don't block the writer) with the ``PRAGMAS``
+below unless they're overridden.
+"""
+import re
+
+import sqlalchemy as sa
+from paste.deploy.converters import asbool
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.interfaces import PoolListener
+from sqlalchemy.pool import QueuePool
+
+__all__ = ['PRAGMAS', 'PrePing', 'SQLitePragmas', 'engine_from_config',
+           'read_engines_from_config']
+
+# Defaults for SQLite database files
+PRAGMAS = dict(journal_mode='WAL', synchronous='NORMAL',
+               busy_timeout='5000', temp_store='MEMORY', cache_size='-16000')
+
+PRAGMA_RE = re.compile(r'^\w+$')
+
+
+class PrePing(PoolListener):
+
+    """Replaces pooled connections that no longer work"""
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        try:
+            cursor = dbapi_con.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+        except Exception:
+            # the pool retries with a new connection
+            raise DisconnectionError('Connection failed pre-ping')
+
+
+class SQLitePragmas(PoolListener):
+
+    """Sets ``pragmas`` on each new SQLite connection"""
+
+    def __init__(self, pragmas):
+        for name, value in pragmas.items():
+            if not PRAGMA_RE.match(name) or not PRAGMA_RE.match(
+                    value.lstrip('-')):
+                raise ValueError('Bad SQLite pragma: %s = %s' %
+                                 (name, value))
+        self.pragmas = sorted(pragmas.items())
+
+    def connect(self, dbapi_con, con_record):
+        cursor = dbapi_con.cursor()
+        for name, value in self.pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+
+def engine_from_config(config, prefix='sqlalchemy.', **kwargs):
+    """Create the engine configured by the ``prefix``-ed settings"""
+    options = dict((key, value) for key, value in config.items()
+                   if key.startswith(prefix) and
+                   not key.startswith(prefix + 'read.'))
+    pre_ping = asbool(options.pop(prefix + 'pool_pre_ping', False))
+    pragmas = {}
+    for key in list(options):
+        if key.startswith(prefix + 'pragma.'):
+            pragmas[key[len(prefix + 'pragma.'):]] = options.pop(key)
+
+    listeners = list(kwargs.pop('listeners', []))
+    url = make_url(options[prefix + 'url'])
+    if url.drivername.startswith('sqlite'):
+        if url.database and url.database != ':memory:':
+            kwargs.setdefault('poolclass', QueuePool)
+            kwargs.setdefault('connect_args', dict(check_same_thread=False))
+            for name, value in PRAGMAS.items():
+                pragmas.setdefault(name, value)
+        if pragmas:
+            listeners.append(SQLitePragmas(pragmas))
+    if pre_ping:
+        listeners.append(PrePing())
+    return sa.engine_from_config(options, prefix, listeners=listeners,
+                                 **kwargs)
+
+
+def read_engines_from_config(config, prefix='sqlalchemy.', **kwargs):
+    """Create the replica engines configured by the ``<prefix>read.*``
+    settings; returns them and the read-your-writes window"""
+    read_prefix = prefix + 'read.'
+    names = set()
+    for key in config:
+        if key.startswith(read_prefix) and key.endswith('.url'):
+            names.add(key[len(read_prefix):-len('.url')])
+    engines = [engine_from_config(config, '%s%s.' % (read_prefix, name),
+                                  **kwargs)
+               for name in sorted(names)]
+    return engines, float(config.get(read_prefix + 'window', 5))
@@ -1,11 +1,24 @@
 from elixir import *
+from sqlalchemy import bindparam, case, func, select
+from sqlalchemy.orm import joinedload, subqueryload
+
+from wattman.model.counters import CommentCounter
+from wattman.model.meta import Session
+from wattman.model.rendering import ContentRenderer
+from wattman.model.timestamps import Timestamper
 
 class Page(Entity):
     """docstring for Page"""
     title = Field(Unicode(100))
     path = Field(Unicode(100))
     content = Field(UnicodeText)
+    # rendered from content by ContentRenderer, see rendering.py
+    content_html = Field(UnicodeText)
+    content_hash = Field(String(40))
     created_on = Field(Date)
+    # UTC, maintained by Timestamper, see timestamps.py
+    updated_on = Field(DateTime)
+    using_mapper_options(extension=[ContentRenderer(), Timestamper()])
         
 class Author(Entity):
     """docstring for Page"""
@@ -18,12 +31,90 @@ class Post(Entity):
     title = Field(Unicode(100))
     path = Field(Unicode(100))
     content = Field(UnicodeText)
+    # rendered from content by ContentRenderer, see rendering.py
+    content_html = Field(UnicodeText)
+    content_hash = Field(String(40))
     created_on = Field(Date)
     comments_allowed = Field(Boolean)
-    draft = Field(Boolean)
+    draft = Field(Boolean, default=False)
     posted_on = Field(Date)
+    # maintained by CommentCounter, see counters.py
+    comment_count = Field(Integer, default=0)
+    approved_count = Field(Integer, default=0)
+    # UTC, maintained by Timestamper and CommentCounter
+    updated_on = Field(DateTime)
     comments = OneToMany('Comment')
     tags = ManyToMany('Tag', tablename="page_tag")
+    using_mapper_options(extension=[ContentRenderer(), Timestamper()])
+
+    # Listing queries.  Tags come back with the posts in one extra
+    # query, however many posts there are.
+
+    @classmethod
+    def published(cls):
+        """Query for posts that aren't drafts, newest first"""
+        return cls.query.filter(cls.draft == False) \
+            .order_by(cls.posted_on.desc(), cls.id.desc())
+
+    @classmethod
+    def recent(cls, limit=10):
+        """The latest ``limit`` published posts"""
+        return cls.published().options(subqueryload('tags')) \
+            .limit(limit).all()
+
+    @classmethod
+    def by_tag(cls, path, limit=10):
+        """The latest ``limit`` published posts tagged with ``path``"""
+        return cls.published().join(cls.tags).filter(Tag.path == path) \
+            .options(subqueryload('tags')).limit(limit).all()
+
+    @classmethod
+    def by_path(cls, path):
+        """The post at ``path`` with its tags and comments, or None"""
+        return cls.query.filter_by(path=path) \
+            .options(joinedload('tags'), subqueryload('comments')).first()
+
+    @classmethod
+    def listing_stamp(cls, tag=None):
+        """What a listing of the published posts (those tagged with
+        ``tag``, if given) is current as of: when one of them last
+        changed (UTC, or None) and how many there are
+
+        Deleting or unpublishing a post that isn't the latest to change
+        leaves the time as it was, but not the count.
+        """
+        query = Session.query(func.max(cls.updated_on),
+                              func.count(cls.id)) \
+            .filter(cls.draft == False)
+        if tag is not None:
+            page_tag = cls.tags.property.secondary
+            query = query.filter(cls.id.in_(
+                select([page_tag.c.post_id])
+                .where(page_tag.c.tag_name == tag.name)))
+        updated, count = query.one()
+        return updated, count
+
+    @classmethod
+    def rebuild_comment_counts(cls):
+        """Recompute every post's comment counters from Comment with a
+        single GROUP BY; returns the number of posts with comments"""
+        post, comment = cls.table, Comment.table
+        approved = func.sum(case([(comment.c.approved == True, 1)], else_=0))
+        counts = Session.execute(
+            select([comment.c.post_id, func.count(comment.c.id), approved])
+            .where(comment.c.post_id != None)
+            .group_by(comment.c.post_id)).fetchall()
+        Session.execute(post.update().values(comment_count=0,
+                                             approved_count=0))
+        if counts:
+            Session.execute(
+                post.update().where(post.c.id == bindparam('post_id'))
+                .values(comment_count=bindparam('total'),
+                        approved_count=bindparam('approved')),
+                [dict(post_id=row[0], total=row[1], approved=row[2] or 0)
+                 for row in counts])
+        Session.expire_all()
+        return len(counts)
 
 
 class Comment(Entity):
@@ -35,7 +126,12 @@ class Comment(Entity):
     created_on = Field(Date)
     approved = Field(Boolean)
     url = Field(Unicode(100))
+    user_ip = Field(Unicode(39))
+    user_agent = Field(Unicode(255))
+    # None until the moderation queue has checked the comment
+    spam = Field(Boolean)
     post = ManyToOne('Post')
+    using_mapper_options(extension=CommentCounter())
     
   
         
@@ -0,0 +1,36 @@
+"""Indexes on the columns the site looks up, filters and sorts on
+
+Elixir can't declare composite indexes, so they're all listed here and
+attached to the tables by ``init_model`` before the tables are created.
+Existing databases get them from ``paster setup-app`` (see migrate.py).
+"""
+import sqlalchemy as sa
+
+from wattman.model.entities import Comment, Page, Post, Tag
+
+__all__ = ['INDEXES', 'define_indexes']
+
+# (name, entity, columns)
+INDEXES = [
+    # uniqueness checks and /page/{path}, /post/{path}, /tag/{path}
+    ('ix_page_path', Page, ['path']),
+    ('ix_post_path', Post, ['path']),
+    ('ix_tag_path', Tag, ['path']),
+    # latest published posts: WHERE draft = 0 ORDER BY posted_on DESC, id
+    ('ix_post_published', Post, ['draft', 'posted_on']),
+    # the latest change to a post: MAX(updated_on), for HTTP validators
+    ('ix_post_updated', Post, ['updated_on']),
+    # a post's (approved) comments
+    ('ix_comment_post_approved', Comment, ['post_id', 'approved']),
+    # a page of a post's approved comments, see wattman.lib.pagination
+    ('ix_comment_post_created', Comment, ['post_id', 'approved',
+                                          'created_on']),
+]
+
+
+def define_indexes():
+    """Attach the ``INDEXES`` to their tables"""
+    for name, entity, columns in INDEXES:
+        table = entity.table
+        if name not in [index.name for index in table.indexes]:
+            sa.Index(name, *[table.c[column] for column in columns])
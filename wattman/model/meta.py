@@ -1,17 +1,119 @@
-"""SQLAlchemy Metadata and Session object"""
+"""SQLAlchemy Metadata and Session object
+
+The session sends everything to the primary engine unless read-only
+replicas are configured (see ``EngineRouter``).
+"""
+import random
+import threading
+import time
+
 from sqlalchemy import MetaData
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.orm.session import Session as _Session
+from sqlalchemy.sql.expression import CompoundSelect, Select, _TextClause
+
+__all__ = ['EngineRouter', 'RoutingSession', 'engine', 'metadata',
+           'router', 'Session']
+
+
+class EngineRouter(object):
+
+    """Chooses between the primary engine and its read replicas
+
+    Queries go to a random replica and flushes (and any other statement
+    that isn't a SELECT) go to the primary.  So that a client always
+    sees its own writes, once a session has written, its client's
+    queries go to the primary for the next ``window`` seconds.  The
+    client is whatever ``begin_request()`` was given for the current
+    thread (e.g. the web user's session cookie).
+    """
+
+    def __init__(self, replicas=(), window=5):
+        self.replicas = list(replicas)
+        self.window = window
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = {}
+
+    def configure(self, replicas=(), window=None):
+        self.replicas = list(replicas)
+        if window is not None:
+            self.window = window
+        self._writes.clear()
+
+    def begin_request(self, client):
+        self._local.client = client
+
+    def end_request(self):
+        self._local.client = None
+
+    def wrote(self):
+        """Note that the current client just wrote to the primary"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            return
+        self._lock.acquire()
+        try:
+            now = time.time()
+            if len(self._writes) > 10000:
+                for key, when in self._writes.items():
+                    if when + self.window < now:
+                        del self._writes[key]
+            self._writes[client] = now
+        finally:
+            self._lock.release()
+
+    def recently_wrote(self):
+        client = getattr(self._local, 'client', None)
+        when = client is not None and self._writes.get(client)
+        return bool(when) and time.time() - when < self.window
+
+    def replica(self):
+        return random.choice(self.replicas)
+
+
+class RoutingSession(_Session):
+
+    """Session that reads from ``router``'s replicas where it can"""
+
+    # set by the session until it's closed
+    _wrote = False
+
+    def get_bind(self, mapper=None, clause=None):
+        primary = _Session.get_bind(self, mapper, clause)
+        if not router.replicas:
+            return primary
+        if self._flushing or self._is_write(clause):
+            self._wrote = True
+            router.wrote()
+            return primary
+        if clause is None or self._wrote or router.recently_wrote():
+            return primary
+        return router.replica()
+
+    def close(self):
+        self._wrote = False
+        _Session.close(self)
+
+    def _is_write(self, clause):
+        if clause is None or isinstance(clause, (Select, CompoundSelect)):
+            return False
+        if isinstance(clause, _TextClause):
+            return not unicode(clause.text).lstrip().upper() \
+                .startswith('SELECT')
+        return True
 
-__all__ = ['engine', 'metadata', 'Session']
 
 # SQLAlchemy database engine.  Updated by model.init_model().
 engine = None
 
+# Routes the Session's reads to replicas.  Updated by model.init_model().
+router = EngineRouter()
+
 # SQLAlchemy session manager.  Updated by model.init_model().
-Session = scoped_session(sessionmaker())
+Session = scoped_session(sessionmaker(class_=RoutingSession))
 
 
-# Global metadata. If you have multiple databases with overlapping table 
+# Global metadata. If you have multiple databases with overlapping table
 # names, you'll need a metadata for each database.
 metadata = MetaData()
-
@@ -0,0 +1,64 @@
+"""Brings databases created by older versions of wattman up to date
+
+``metadata.create_all()`` only creates missing tables.  ``upgrade()``
+also adds the columns and indexes that were introduced since an
+existing table was created, using the ALTER TABLE ... ADD COLUMN that
+SQLite supports, and builds the search index if it's missing.
+"""
+import logging
+
+from sqlalchemy.engine.reflection import Inspector
+
+from wattman.model import Session, Page, Post, metadata
+from wattman.model.rendering import rerender
+from wattman.model.search import search_index
+
+__all__ = ['upgrade']
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(engine):
+    """Add missing columns and indexes; returns the names of what was
+    added"""
+    inspector = Inspector.from_engine(engine)
+    existing_tables = inspector.get_table_names()
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = set(c['name'] for c in inspector.get_columns(table.name))
+        for column in table.c:
+            if column.name in columns:
+                continue
+            engine.execute('ALTER TABLE %s ADD COLUMN %s %s' % (
+                preparer.format_table(table),
+                preparer.format_column(column),
+                column.type.compile(dialect=engine.dialect)))
+            added.append('%s.%s' % (table.name, column.name))
+        indexes = set(ix['name'] for ix in inspector.get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(bind=engine)
+                added.append(index.name)
+    if search_index.create(engine):
+        search_index.rebuild(Session)
+        Session.commit()
+        added.append(search_index.name)
+    for name in added:
+        log.info('Added %s', name)
+
+    # Published listings use the (draft, posted_on) index, which needs
+    # draft to be set
+    engine.execute(Post.table.update()
+                   .where(Post.table.c.draft == None)
+                   .values(draft=False))
+    if 'post.comment_count' in added:
+        Post.rebuild_comment_counts()
+        Session.commit()
+    for entity in Post, Page:
+        if '%s.content_html' % entity.table.name in added:
+            rerender(Session, entity)
+            Session.commit()
+    return added
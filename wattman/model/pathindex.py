@@ -0,0 +1,170 @@
+"""In-process index of the unique path and name columns
+
+The form validators in ``wattman.model.widgets`` ask this index whether
+a path (or tag name) is already taken before they go to the database.
+The index is warmed once by ``init_model`` and kept current by
+``PathIndexExtension``, which watches the session's flushes.
+
+The index only ever errs on the side of caution: a value it has never
+seen is free, anything else is checked against the database.
+"""
+import logging
+import threading
+import weakref
+
+import sqlalchemy as sa
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import class_mapper, object_mapper
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.orm.interfaces import SessionExtension
+
+from wattman.model.entities import Page, Post, Tag
+
+__all__ = ['PathIndex', 'PathIndexExtension', 'path_index']
+
+log = logging.getLogger(__name__)
+
+# (entity, attribute) pairs that must hold unique values
+INDEXED = ((Page, 'path'), (Post, 'path'), (Tag, 'path'), (Tag, 'name'))
+
+
+def primary_key(obj):
+    """Return the single primary key value of a flushed instance"""
+    return object_mapper(obj).primary_key_from_instance(obj)[0]
+
+
+class PathIndex(object):
+
+    """Maps the unique values of each indexed column to the primary key
+    of the row that owns them
+
+    """
+
+    def __init__(self, indexed=INDEXED):
+        self.indexed = indexed
+        self.warm = False
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def load(self):
+        """(Re)build the index from the database
+
+        Leaves the index cold if the tables can't be read yet, e.g.
+        before ``paster setup-app`` has created them.
+        """
+        values = {}
+        try:
+            for entity, attr in self.indexed:
+                pk = class_mapper(entity).primary_key[0]
+                col = getattr(entity.table.c, attr)
+                # (labelled: Tag's name is both the key and a value, and
+                # an unlabelled select would have only the one column)
+                rows = sa.select([pk.label('pk'),
+                                  col.label('value')]).execute()
+                values[(entity, attr)] = dict((row['value'], row['pk'])
+                                              for row in rows
+                                              if row['value'] is not None)
+        except SQLAlchemyError:
+            log.warning('Path index not warmed; falling back to the '
+                        'database for uniqueness checks', exc_info=True)
+            self.clear()
+            return
+        self._lock.acquire()
+        try:
+            self._values = values
+            self.warm = True
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Empty the index and mark it cold"""
+        self._lock.acquire()
+        try:
+            self._values = {}
+            self.warm = False
+        finally:
+            self._lock.release()
+
+    def may_conflict(self, entity, attr, value, exclude=None):
+        """Return False only when ``value`` is known to be free
+
+        ``exclude`` is the primary key of the row being edited, which
+        is allowed to keep its own value.
+        """
+        if not self.warm:
+            return True
+        owner = self._values.get((entity, attr), {}).get(value)
+        if owner is None:
+            return False
+        return exclude is None or unicode(owner) != unicode(exclude)
+
+    def add(self, entity, attr, value, pk):
+        if value is None:
+            return
+        self._lock.acquire()
+        try:
+            self._values.setdefault((entity, attr), {})[value] = pk
+        finally:
+            self._lock.release()
+
+    def discard(self, entity, attr, value, pk):
+        """Forget ``value`` if it's still owned by ``pk``"""
+        self._lock.acquire()
+        try:
+            values = self._values.get((entity, attr), {})
+            if value in values and values[value] == pk:
+                del values[value]
+        finally:
+            self._lock.release()
+
+    def attributes(self, obj):
+        """Yield the (entity, attribute) pairs indexed for ``obj``"""
+        for entity, attr in self.indexed:
+            if isinstance(obj, entity):
+                yield entity, attr
+
+
+class PathIndexExtension(SessionExtension):
+
+    """Keeps a ``PathIndex`` in step with flushed changes
+
+    New values are indexed as soon as they're flushed; an uncommitted
+    value in the index only costs a database check.  Values that go
+    away are only dropped once the transaction commits.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._removed = weakref.WeakKeyDictionary()
+
+    def after_flush(self, session, flush_context):
+        index = self.index
+        removed = self._removed.setdefault(session, [])
+        for obj in session.new:
+            for entity, attr in index.attributes(obj):
+                index.add(entity, attr, getattr(obj, attr), primary_key(obj))
+        for obj in session.dirty:
+            for entity, attr in index.attributes(obj):
+                hist = get_history(obj, attr)
+                pk = primary_key(obj)
+                for value in hist.added:
+                    index.add(entity, attr, value, pk)
+                for value in hist.deleted:
+                    removed.append((entity, attr, value, pk))
+        for obj in session.deleted:
+            for entity, attr in index.attributes(obj):
+                hist = get_history(obj, attr)
+                pk = primary_key(obj)
+                for value in hist.sum():
+                    removed.append((entity, attr, value, pk))
+
+    def after_commit(self, session):
+        for entity, attr, value, pk in self._removed.pop(session, ()):
+            self.index.discard(entity, attr, value, pk)
+
+    def after_rollback(self, session):
+        self._removed.pop(session, None)
+
+
+# The application wide index, warmed by init_model()
+path_index = PathIndex()
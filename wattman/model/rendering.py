@@ -0,0 +1,66 @@
+"""Keeps the pre-rendered HTML of posts and pages up to date
+
+Posts and pages store their Markdown ``content`` alongside the
+``content_html`` rendered from it and the ``content_hash`` it was
+rendered from (see wattman/lib/markup.py), so views never render
+Markdown.  ``ContentRenderer`` re-renders as content is saved and
+``rerender()`` brings everything up to date after the renderer changes.
+"""
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm.interfaces import EXT_CONTINUE, MapperExtension
+
+from wattman.lib.markup import content_hash, render
+
+__all__ = ['ContentRenderer', 'rerender']
+
+
+class ContentRenderer(MapperExtension):
+
+    """Mapper extension that renders ``content`` into ``content_html``
+    whenever it changes"""
+
+    def before_insert(self, mapper, connection, instance):
+        self._render(instance)
+        return EXT_CONTINUE
+
+    def before_update(self, mapper, connection, instance):
+        self._render(instance)
+        return EXT_CONTINUE
+
+    def _render(self, instance):
+        digest = content_hash(instance.content)
+        if instance.content_hash != digest:
+            instance.content_html = unicode(render(instance.content))
+            instance.content_hash = digest
+
+
+def rerender(session, entity, force=False, batch_size=500):
+    """Re-render the stored HTML of every ``entity`` row that's out of
+    date (or every row, with ``force``); returns the number rendered
+
+    Works through the table ``batch_size`` rows at a time with one
+    UPDATE per batch, so it doesn't load the whole table at once.
+    """
+    table = entity.table
+    update = table.update().where(table.c.id == bindparam('row_id')) \
+        .values(content_html=bindparam('html'),
+                content_hash=bindparam('digest'))
+    rendered, last_id = 0, 0
+    while True:
+        rows = session.execute(
+            select([table.c.id, table.c.content, table.c.content_hash])
+            .where(table.c.id > last_id).order_by(table.c.id)
+            .limit(batch_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        params = []
+        for row_id, content, stored in rows:
+            digest = content_hash(content)
+            if force or stored != digest:
+                params.append(dict(row_id=row_id, digest=digest,
+                                   html=unicode(render(content))))
+        if params:
+            session.execute(update, params)
+            rendered += len(params)
+    return rendered
@@ -0,0 +1,206 @@
+"""Full-text search over posts and pages
+
+Published posts and pages are kept in an SQLite FTS5 table,
+``search_index``.  ``SearchIndexExtension`` updates it from the
+session's flushes on the flush's own connection, so the index always
+commits or rolls back together with the content.  ``search()`` returns
+bm25-ranked, paginated hits with highlighted snippets.  To keep
+searches for very common words fast, only their most recent
+``max_ranked`` matches are ranked.
+
+FTS5 is SQLite only; on other databases the index stays disabled and
+searches come back empty.
+"""
+import logging
+import re
+
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.orm.interfaces import SessionExtension
+from webhelpers.html import escape, literal
+
+from wattman.model.entities import Page, Post
+
+__all__ = ['SearchIndex', 'SearchIndexExtension', 'SearchResults',
+           'search_index']
+
+log = logging.getLogger(__name__)
+
+# Row ids in the index are id * len(KINDS) + kind
+KINDS = [Post, Page]
+
+# Indexed attributes; a flush that touches none of them leaves the
+# index alone
+WATCHED = ['title', 'path', 'content', 'draft']
+
+# Snippet highlight markers, swapped for <strong> after escaping
+MARK_START, MARK_END = u'\x02', u'\x03'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchResults(object):
+
+    """One page of search hits
+
+    Each hit is a dict with ``kind`` ('post' or 'page'), ``id``,
+    ``title``, ``path``, ``snippet`` (HTML) and ``score``.  Only the
+    ``ranked`` best matches can be paged through, however many
+    ``total`` matches there are.
+    """
+
+    def __init__(self, terms, hits, total, page, per_page, ranked=None):
+        self.terms = terms
+        self.hits = hits
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+        if ranked is None:
+            ranked = total
+        self.pages = max(1, (ranked + per_page - 1) // per_page)
+
+    def __iter__(self):
+        return iter(self.hits)
+
+    def __len__(self):
+        return len(self.hits)
+
+
+class SearchIndex(object):
+
+    """The ``search_index`` FTS5 table and the queries against it"""
+
+    name = 'search_index'
+
+    def __init__(self, max_ranked=2000):
+        self.enabled = False
+        self.max_ranked = max_ranked
+
+    def create(self, bind):
+        """Create the index table if it's missing
+
+        Returns True when the table was created (and so needs a
+        ``rebuild()`` if there's existing content).
+        """
+        self.enabled = bind.dialect.name == 'sqlite'
+        if not self.enabled:
+            log.warning('Full-text search needs SQLite FTS5; disabled')
+            return False
+        if bind.execute("SELECT name FROM sqlite_master WHERE name = ?",
+                        self.name).fetchone():
+            return False
+        bind.execute("CREATE VIRTUAL TABLE %s USING fts5(title, content, "
+                     "path UNINDEXED, tokenize='porter unicode61')" %
+                     self.name)
+        return True
+
+    def rebuild(self, session):
+        """Reindex every post and page; returns the number indexed"""
+        if not self.enabled:
+            return 0
+        session.execute('DELETE FROM %s' % self.name)
+        for kind, entity in enumerate(KINDS):
+            where = ''
+            if 'draft' in entity.table.c:
+                where = 'WHERE NOT coalesce(draft, 0)'
+            session.execute(
+                "INSERT INTO %s (rowid, title, content, path) "
+                "SELECT id * %d + %d, coalesce(title, ''), "
+                "coalesce(content, ''), path FROM %s %s" %
+                (self.name, len(KINDS), kind, entity.table.name, where))
+        return session.execute('SELECT count(*) FROM %s' %
+                               self.name).scalar()
+
+    def add(self, session, obj):
+        """(Re)index ``obj``, or drop it if it shouldn't be searchable"""
+        self.remove(session, obj)
+        if getattr(obj, 'draft', False):
+            return 0
+        session.execute('INSERT INTO %s (rowid, title, content, path) '
+                        'VALUES (:rowid, :title, :content, :path)' %
+                        self.name,
+                        dict(rowid=self.rowid(obj), title=obj.title or u'',
+                             content=obj.content or u'', path=obj.path))
+        return 1
+
+    def remove(self, session, obj):
+        session.execute('DELETE FROM %s WHERE rowid = :rowid' % self.name,
+                        dict(rowid=self.rowid(obj)))
+
+    def rowid(self, obj):
+        return obj.id * len(KINDS) + KINDS.index(type(obj))
+
+    def query(self, terms):
+        """Turn free text into an FTS5 query matching all its words"""
+        return u' '.join(u'"%s"' % word for word in WORD_RE.findall(terms))
+
+    def search(self, session, terms, page=1, per_page=10):
+        """Return the ``page``th ``SearchResults`` for ``terms``"""
+        match = self.query(terms)
+        page = max(1, page)
+        if not self.enabled or not match:
+            return SearchResults(terms, [], 0, page, per_page)
+        total = session.execute(
+            'SELECT count(*) FROM %s WHERE %s MATCH :match' %
+            (self.name, self.name), dict(match=match)).scalar()
+        # Ranking is the expensive part, so a very common word only
+        # ranks its most recent max_ranked matches
+        window, params = '', dict(match=match)
+        if total > self.max_ranked:
+            params['cutoff'] = session.execute(
+                'SELECT rowid FROM %s WHERE %s MATCH :match '
+                'ORDER BY rowid DESC LIMIT 1 OFFSET :offset' %
+                (self.name, self.name),
+                dict(match=match, offset=self.max_ranked - 1)).scalar()
+            window = 'AND rowid >= :cutoff '
+        params.update(start=MARK_START, end=MARK_END, limit=per_page,
+                      offset=(page - 1) * per_page)
+        rows = session.execute(
+            # title matches count ten times as much as content matches
+            'SELECT rowid, title, path, bm25(%(t)s, 10.0, 1.0) AS score, '
+            "snippet(%(t)s, 1, :start, :end, '...', 24) "
+            'FROM %(t)s WHERE %(t)s MATCH :match %(window)s'
+            'ORDER BY score LIMIT :limit OFFSET :offset' %
+            dict(t=self.name, window=window), params)
+        hits = []
+        for rowid, title, path, score, snippet in rows:
+            hits.append(dict(kind=KINDS[rowid % len(KINDS)].__name__.lower(),
+                             id=rowid // len(KINDS), title=title, path=path,
+                             score=-score, snippet=self.highlight(snippet)))
+        return SearchResults(terms, hits, total, page, per_page,
+                             min(total, self.max_ranked))
+
+    def highlight(self, snippet):
+        return literal(unicode(escape(snippet))
+                       .replace(MARK_START, u'<strong>')
+                       .replace(MARK_END, u'</strong>'))
+
+
+class SearchIndexExtension(SessionExtension):
+
+    """Reindexes posts and pages as they're flushed"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def after_flush(self, session, flush_context):
+        if not self.index.enabled:
+            return
+        for obj in session.new:
+            if type(obj) in KINDS:
+                self.index.add(session, obj)
+        for obj in session.dirty:
+            if type(obj) in KINDS and self._changed(obj):
+                self.index.add(session, obj)
+        for obj in session.deleted:
+            if type(obj) in KINDS:
+                self.index.remove(session, obj)
+
+    def _changed(self, obj):
+        for attr in WATCHED:
+            if hasattr(obj, attr) and get_history(obj, attr).added:
+                return True
+        return False
+
+
+# The application wide index, created by init_model()
+search_index = SearchIndex()
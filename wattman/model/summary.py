@@ -0,0 +1,196 @@
+"""Tag cloud and month archive counts
+
+Counting a tag's posts or a month's posts on every page would scan
+``page_tag`` and ``post``, so the counts of published posts per tag and
+per month are kept in two small summary tables, ``tag_summary`` and
+``month_summary``.  ``ContentSummaryExtension`` keeps them current: for
+the posts a flush touches it counts their tags and months before and
+after the flush, on the flush's own connection, and applies the
+difference, so the summaries commit or roll back with the content.
+``ContentSummary.rebuild()`` recomputes them from scratch, e.g. after a
+bulk import that bypassed the session.
+"""
+import datetime
+import itertools
+import weakref
+
+import sqlalchemy as sa
+from elixir import metadata
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.orm.attributes import (PASSIVE_NO_INITIALIZE, get_history,
+                                        instance_state)
+from sqlalchemy.orm.interfaces import SessionExtension
+
+from wattman.model.entities import Post, Tag
+
+__all__ = ['ContentSummary', 'ContentSummaryExtension', 'content_summary',
+           'month_summary', 'tag_summary']
+
+# Attributes of a post that move it between tags or months
+WATCHED = ['draft', 'posted_on', 'tags']
+
+# Ids per "IN (...)", under SQLite's limit on bound parameters
+CHUNK = 500
+
+tag_summary = sa.Table(
+    'tag_summary', metadata,
+    sa.Column('tag_name', sa.Unicode(20), primary_key=True),
+    sa.Column('post_count', sa.Integer, nullable=False, default=0))
+
+# month is 'YYYY-MM'
+month_summary = sa.Table(
+    'month_summary', metadata,
+    sa.Column('month', sa.String(7), primary_key=True),
+    sa.Column('post_count', sa.Integer, nullable=False, default=0))
+
+
+def _post_id(obj):
+    """The id of a post that's already in the database, or None"""
+    key = instance_state(obj).key
+    return key and key[1][0]
+
+
+class ContentSummary(object):
+
+    """Reads and maintains the summary tables"""
+
+    tables = [tag_summary, month_summary]
+    keys = [tag_summary.c.tag_name, month_summary.c.month]
+
+    def create(self, bind):
+        """Create the summary tables if they're missing; returns True if
+        they were (and so need a ``rebuild()``)"""
+        missing = [table for table in self.tables
+                   if not table.exists(bind=bind)]
+        for table in missing:
+            table.create(bind=bind)
+        return bool(missing)
+
+    def counts(self, connection, post_ids=None):
+        """({tag name: count}, {month: count}) of the published posts,
+        or of those among ``post_ids``"""
+        post = Post.table
+        page_tag = class_mapper(Post).get_property('tags').secondary
+        published = post.c.draft == False
+        if post_ids is None:
+            chunks = [None]
+        else:
+            post_ids = sorted(post_ids)
+            chunks = [post_ids[i:i + CHUNK]
+                      for i in xrange(0, len(post_ids), CHUNK)]
+        tags, months = {}, {}
+        for chunk in chunks:
+            where = published
+            if chunk is not None:
+                where = sa.and_(published, post.c.id.in_(chunk))
+            rows = connection.execute(
+                sa.select([page_tag.c.tag_name, sa.func.count()],
+                          where, from_obj=[page_tag.join(
+                              post, post.c.id == page_tag.c.post_id)])
+                .group_by(page_tag.c.tag_name))
+            for name, count in rows:
+                tags[name] = tags.get(name, 0) + count
+            # by day, which is portable, and then by month here
+            rows = connection.execute(
+                sa.select([post.c.posted_on, sa.func.count()],
+                          sa.and_(where, post.c.posted_on != None))
+                .group_by(post.c.posted_on))
+            for day, count in rows:
+                month = '%04d-%02d' % (day.year, day.month)
+                months[month] = months.get(month, 0) + count
+        return tags, months
+
+    def apply(self, connection, before, after):
+        """Adjust the summaries by the difference between two
+        ``counts()``"""
+        for table, key, old, new in zip(self.tables, self.keys, before,
+                                        after):
+            changed = False
+            for value in set(old) | set(new):
+                delta = new.get(value, 0) - old.get(value, 0)
+                if not delta:
+                    continue
+                changed = True
+                result = connection.execute(
+                    table.update().where(key == value)
+                    .values(post_count=table.c.post_count + delta))
+                if not result.rowcount:
+                    connection.execute(table.insert(), {key.name: value,
+                                                        'post_count': delta})
+            if changed:
+                connection.execute(table.delete()
+                                   .where(table.c.post_count <= 0))
+
+    def rebuild(self, session):
+        """Recompute both summaries from the posts"""
+        connection = session.connection()
+        for table in self.tables:
+            connection.execute(table.delete())
+        self.apply(connection, ({}, {}), self.counts(connection))
+
+    def tags(self, session):
+        """(name, path, post count) of the tags with published posts,
+        by name"""
+        tag = Tag.table
+        return session.execute(
+            sa.select([tag.c.name, tag.c.path, tag_summary.c.post_count],
+                      from_obj=[tag_summary.join(
+                          tag, tag.c.name == tag_summary.c.tag_name)])
+            .order_by(tag.c.name)).fetchall()
+
+    def months(self, session):
+        """(first day of the month, post count) of the months with
+        published posts, newest first"""
+        rows = session.execute(
+            sa.select([month_summary.c.month, month_summary.c.post_count])
+            .order_by(month_summary.c.month.desc()))
+        return [(datetime.date(int(month[:4]), int(month[5:]), 1), count)
+                for month, count in rows]
+
+
+class ContentSummaryExtension(SessionExtension):
+
+    """Keeps a ``ContentSummary`` in step with flushed posts and tags"""
+
+    def __init__(self, summary):
+        self.summary = summary
+        self._before = weakref.WeakKeyDictionary()
+
+    def before_flush(self, session, flush_context, instances):
+        # (without loading collections: only their changes matter)
+        passive = PASSIVE_NO_INITIALIZE
+        post_ids = set()
+        for obj in session.dirty:
+            if isinstance(obj, Post):
+                for attr in WATCHED:
+                    history = get_history(obj, attr, passive=passive)
+                    if history.added or history.deleted:
+                        post_ids.add(_post_id(obj))
+                        break
+            elif isinstance(obj, Tag):
+                history = get_history(obj, 'posts', passive=passive)
+                post_ids.update(_post_id(post) for post in itertools.chain(
+                    history.added or (), history.deleted or ()))
+        post_ids.update(_post_id(obj) for obj in session.deleted
+                        if isinstance(obj, Post))
+        post_ids.discard(None)
+        if post_ids:
+            self._before[session] = (post_ids, self.summary.counts(
+                session.connection(), post_ids))
+
+    def after_flush(self, session, flush_context):
+        post_ids, before = self._before.pop(session, (set(), ({}, {})))
+        post_ids.update(obj.id for obj in session.new
+                        if isinstance(obj, Post))
+        connection = session.connection()
+        if post_ids:
+            self.summary.apply(connection, before, self.summary.counts(
+                connection, post_ids))
+        names = [obj.name for obj in session.deleted if isinstance(obj, Tag)]
+        if names:
+            connection.execute(tag_summary.delete()
+                               .where(tag_summary.c.tag_name.in_(names)))
+
+
+# The application wide summaries
+content_summary = ContentSummary()
@@ -0,0 +1,30 @@
+"""Keeps ``updated_on`` current on posts and pages
+
+``Timestamper`` stamps an entity with the current UTC time when it's
+inserted and whenever a flush changes it, including its collections
+(a post's tags).  A post is also stamped when its comments change, by
+``CommentCounter``.  The HTTP validators of content views are computed
+from these stamps; see ``BaseController.conditional()``.
+"""
+import datetime
+
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.interfaces import EXT_CONTINUE, MapperExtension
+
+__all__ = ['Timestamper']
+
+
+class Timestamper(MapperExtension):
+
+    """Mapper extension that sets ``updated_on`` as rows are saved"""
+
+    def before_insert(self, mapper, connection, instance):
+        if instance.updated_on is None:
+            instance.updated_on = datetime.datetime.utcnow()
+        return EXT_CONTINUE
+
+    def before_update(self, mapper, connection, instance):
+        # (called for everything in session.dirty, changed or not)
+        if object_session(instance).is_modified(instance):
+            instance.updated_on = datetime.datetime.utcnow()
+        return EXT_CONTINUE
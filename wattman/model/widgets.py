@@ -7,9 +7,32 @@ import wattman.lib.helpers as h
 from tw.forms.validators import Schema, NoDefault, FancyValidator, ForEach
 import re
 from wattman.model import *
-from pylons import request
+from wattman.model.pathindex import path_index
+from pylons import app_globals, request
+
+def _editing_id():
+    """Return the id of the row being edited, or None for a new one"""
+    if request.urlvars['action'] == 'save':
+        return request.urlvars['id']
+    return None
+
+def _is_taken(entity, attr, value):
+    """Check ``entity.attr`` for ``value``, asking the path index first
+    and only querying the database when it can't rule out a conflict"""
+    editing = _editing_id()
+    if not path_index.may_conflict(entity, attr, value, editing):
+        return False
+    q = Session.query(entity).filter_by(**{attr: value})
+    if editing is not None:
+        # we're editing an existing row, it may keep its own value
+        pk = orm.class_mapper(entity).primary_key[0]
+        if isinstance(pk.type, types.Integer):
+            editing = int(editing)
+        q = q.filter(pk != editing)
+    return q.first() is not None
 
 class UniquePath(FancyValidator):
+    entity = Page
     messages = {
         'invalid': 'Path must be unique'
     }
@@ -22,14 +45,7 @@ class UniquePath(FancyValidator):
             raise Invalid("Path can only contain letters, numbers, and dashes", value, state)
         
         # Ensure path is unique
-        page_q = Session.query(model.Page).filter_by(path=value)
-        if request.urlvars['action'] == 'save':
-            # we're editing an existing post.
-            page_q = page_q.filter(model.Page.id != int(request.urlvars['id']))
-            
-        # Check if the path exists
-        path = page_q.first()
-        if path is not None:
+        if _is_taken(self.entity, 'path', value):
             raise Invalid(
                 self.message('invalid', state),
                 value, state)
@@ -59,76 +75,37 @@ class UniqueName(FancyValidator):
             raise Invalid("Tag name can only contain letters, numbers, and spaces", value, state)
         
         # Ensure tag name is unique
-        tag_q = Session.query(model.Tag).filter_by(name=value)
-        if request.urlvars['action'] == 'save':
-            # we're editing an existing tag
-            tag_q = tag_q.filter(model.Tag.id != int(request.urlvars['id']))
-            
-        # Check if the tag name exists
-        name = tag_q.first()
-        if name is not None:
+        if _is_taken(Tag, 'name', value):
             raise Invalid(
                 self.message('invalid', state),
                 value, state)
         
         return value
     
-class UniquePath(FancyValidator):
-    messages = {
-        'invalid': 'Tag path must be unique'
-    }
+####Comments
+
+class DeferredURL(URL):
+    """Accepts any well formed URL and queues it for the background
+    link checker instead of fetching it during the request"""
+    check_exists = False
     def _to_python(self, value, state):
-        # Ensure we have a valid string
-        value = UnicodeString(max=30).to_python(value, state)
-        # validate that path only contains letters, numbers, and dashes
-        result = re.compile("[^\w-]").search(value)
-        if result:
-            raise Invalid("Path can only contain letters, numbers, and dashes", value, state)
-        
-        # Ensure tag path is unique
-        tag_q = Session.query(Tag).filter_by(path=value)
-        if request.urlvars['action'] == 'save':
-            # we're editing an existing post.
-            tag_q = tag_q.filter(Tag.id != int(request.urlvars['id']))
-            
-        # Check if the path exists
-        path = tag_q.first()
-        if path is not None:
-            raise Invalid(
-                self.message('invalid', state),
-                value, state)
-        
+        value = URL._to_python(self, value, state)
+        if value:
+            app_globals.link_checker.check(value)
         return value
 
-
-####Comments
-
 class AkismetSpamCheck(FancyValidator):
-    messages = {
-        'invalid-akismet': 'Your comment has been identified as spam.  Are you a spammer?'
-    }
     def _to_python(self, values, state):
         # we're in the administrator
         if request.urlvars['action'] == 'save':
             return values
         
         if h.wattman_use_akismet():
-            from wattman.lib.akismet import Akismet
-            # Thanks for the help from http://soyrex.com/blog/akismet-django-stop-comment-spam/
-            a = Akismet(h.wattman_get_akismet_key(), wattman_url=request.server_name)
-            akismet_data = {}
-            akismet_data['user_ip'] = request.remote_addr
-            akismet_data['user_agent'] = request.user_agent
-            akismet_data['comment_author'] = values['name']
-            akismet_data['comment_author_email'] = values['email']
-            akismet_data['comment_author_url'] = values['url']
-            akismet_data['comment_type'] = 'comment'
-            spam = a.comment_check(values['content'], akismet_data)
-            if spam:
-                raise Invalid(
-                    self.message('invalid-akismet', state),
-                    values, state
-                )
+            # Hold the comment for the moderation queue, which checks it
+            # with Akismet in the background (see wattman.lib.moderation)
+            values['approved'] = False
+            values['user_ip'] = request.remote_addr
+            values['user_agent'] = request.user_agent
         return values
     
 class PrimitiveSpamCheck(FancyValidator):
@@ -180,7 +157,7 @@ class NewPostForm(Schema):
         max=100, 
         messages={'empty':'Enter a post title'},
         strip=True)
-    path = UniquePath(not_empty=True, max=100, strip=True)
+    path = UniquePath(entity=Post, not_empty=True, max=100, strip=True)
     content = UnicodeString(
         not_empty=True,
         messages={'empty':'Enter some post content.'},
@@ -208,7 +185,8 @@ class NewTagForm(Schema):
     allow_extra_fields = True
     filter_extra_fields = True
     name = UniqueName(not_empty=True, max=30, strip=True)
-    path = UniquePath(not_empty=True, max=30, strip=True)
+    path = UniquePath(entity=Tag, not_empty=True, max=30, strip=True,
+                      messages={'invalid': 'Tag path must be unique'})
     
     
 tag_form = twf.TableForm('page_form', action='save', validator = NewTagForm, children=[
@@ -223,7 +201,7 @@ class NewCommentForm(Schema):
     filter_extra_fields = True
     name = UnicodeString(not_empty=True, max=100, strip=True)
     email = Email(not_empty=True, max=50, strip=True)
-    url = URL(not_empty=False, check_exists=True, max=125, strip=True)
+    url = DeferredURL(not_empty=False, max=125, strip=True)
     content = UnicodeString(
         not_empty=True,
         strip=True,
@@ -0,0 +1,10 @@
+<html>
+<head>
+  <title>${c.page.title}</title>
+  <link rel="icon" href="${h.asset_url('/favicon.ico')}" />
+</head>
+<body>
+  <h1>${c.page.title}</h1>
+  <div class="content">${h.content_html(c.page)}</div>
+</body>
+</html>
@@ -0,0 +1,28 @@
+<html>
+<head>
+  <title>${c.post.title}</title>
+  <link rel="icon" href="${h.asset_url('/favicon.ico')}" />
+  <link rel="alternate" type="application/atom+xml" title="Comments" href="${h.content_url('post', c.post.path)}/comments.atom" />
+</head>
+<body>
+  <h1>${c.post.title}</h1>
+% if c.post.posted_on:
+  <p class="posted">${c.post.posted_on.strftime('%B %d, %Y')}</p>
+% endif
+  <div class="content">${h.content_html(c.post)}</div>
+% if c.post.tags:
+  <p class="tags">Tagged
+  % for tag in c.post.tags:
+    <a href="${h.content_url('tag', tag.path)}">${tag.name}</a>
+  % endfor
+  </p>
+% endif
+  <h2>${h.plural(len(c.comments), 'comment', 'comments')}</h2>
+% for comment in c.comments:
+  <div class="comment" id="comment-${comment.id}">
+    <p class="author">${h.comment_author(comment)}</p>
+    <p>${comment.content}</p>
+  </div>
+% endfor
+</body>
+</html>
@@ -0,0 +1,29 @@
+<html>
+<head>
+  <title>Search${c.q and ': ' + c.q or ''}</title>
+  <link rel="icon" href="${h.asset_url('/favicon.ico')}" />
+</head>
+<body>
+  <form action="${h.url_for(controller='search', action='index')}" method="get">
+    <input type="text" name="q" value="${c.q}" />
+    <input type="submit" value="Search" />
+  </form>
+% if c.q:
+  <p>${h.plural(c.results.total, 'result', 'results')} for &ldquo;${c.q}&rdquo;</p>
+  <ol start="${(c.results.page - 1) * c.results.per_page + 1}">
+  % for hit in c.results:
+    <li class="${hit['kind']}">
+      <a href="${h.content_url(hit['kind'], hit['path'])}">${hit['title']}</a>
+      <p>${hit['snippet']}</p>
+    </li>
+  % endfor
+  </ol>
+  % if c.results.page > 1:
+  <a href="${h.url_for(controller='search', action='index', q=c.q, page=c.results.page - 1)}">&laquo; Newer</a>
+  % endif
+  % if c.results.page < c.results.pages:
+  <a href="${h.url_for(controller='search', action='index', q=c.q, page=c.results.page + 1)}">Older &raquo;</a>
+  % endif
+% endif
+</body>
+</html>
@@ -0,0 +1,24 @@
+<html>
+<head>
+  <title>Posts tagged ${c.tag.name}</title>
+  <link rel="icon" href="${h.asset_url('/favicon.ico')}" />
+  <link rel="alternate" type="application/atom+xml" title="Posts tagged ${c.tag.name}" href="${h.content_url('tag', c.tag.path)}/feed.atom" />
+</head>
+<body>
+  <h1>Posts tagged ${c.tag.name}</h1>
+  <ul>
+% for post in c.posts:
+    <li>
+      <a href="${h.content_url('post', post.path)}">${post.title}</a>
+      (${h.plural(post.approved_count or 0, 'comment', 'comments')})
+    </li>
+% endfor
+  </ul>
+% if c.posts.previous:
+  <a rel="prev" href="${h.content_url('tag', c.tag.path)}?page=${c.posts.previous}">Newer posts</a>
+% endif
+% if c.posts.next:
+  <a rel="next" href="${h.content_url('tag', c.tag.path)}?page=${c.posts.next}">Older posts</a>
+% endif
+</body>
+</html>
@@ -0,0 +1,15 @@
+from wattman.tests import *
+
+class TestAdminController(TestController):
+
+    def test_instrumentation_is_for_admins(self):
+        # AuthKit asks anybody else to sign in
+        response = self.app.get(
+            url(controller='admin', action='instrumentation'))
+        assert response.content_type == 'text/html'
+        assert '"routes"' not in response
+        response = self.app.get(
+            url(controller='admin', action='instrumentation'),
+            extra_environ={'REMOTE_USER': 'admin'})
+        assert response.content_type == 'application/json'
+        assert '"routes"' in response
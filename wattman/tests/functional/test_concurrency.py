@@ -0,0 +1,76 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from webob import Request
+
+from wattman.model import Session, Comment, Post, Tag, meta, metadata
+from wattman.model.engine import engine_from_config
+from wattman.model.search import search_index
+from wattman.tests import *
+
+class TestConnectionPool(TestController):
+
+    """50 clients against a small pool on an SQLite file"""
+
+    clients = 50
+    requests = 10
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.engine = engine_from_config({
+            'sqlalchemy.url': 'sqlite:///%s' % os.path.join(self.dir, 'x.db'),
+            'sqlalchemy.pool_size': '5', 'sqlalchemy.max_overflow': '5',
+            'sqlalchemy.pool_timeout': '5', 'sqlalchemy.pool_pre_ping': 'true'})
+        self.bind = metadata.bind
+        Session.remove()
+        Session.configure(bind=self.engine)
+        metadata.bind = self.engine
+        metadata.create_all()
+        search_index.create(self.engine)
+        tag = Tag(name=u'python', path=u'python')
+        post = Post(title=u'Hello', path=u'hello', tags=[tag])
+        Comment(name=u'Ann', content=u'Hi', post=post, approved=True)
+        Session.commit()
+        Session.remove()
+
+    def tearDown(self):
+        Session.remove()
+        Session.configure(bind=self.bind)
+        metadata.bind = self.bind
+        self.engine.dispose()
+        shutil.rmtree(self.dir)
+
+    def test_sqlite_files_use_wal(self):
+        assert self.engine.execute('PRAGMA journal_mode').scalar() == 'wal'
+
+    def test_parallel_clients_do_not_exhaust_the_pool(self):
+        app = self.app.app
+        statuses, errors = [], []
+        def client(n):
+            try:
+                for i in range(self.requests):
+                    url = ('/post/hello', '/tag/python', '/post/missing')[
+                        (n + i) % 3]
+                    statuses.append(Request.blank(url).get_response(app)
+                                    .status_int)
+                    if i == n % self.requests:
+                        # and some writes
+                        Comment(name=u'c%d' % n, post_id=1, approved=True)
+                        Session.commit()
+                        Session.remove()
+            except Exception:
+                errors.append(sys.exc_info()[1])
+        threads = [threading.Thread(target=client, args=(n,))
+                   for n in range(self.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == [], errors[:3]
+        assert len(statuses) == self.clients * self.requests
+        assert set(statuses) == set([200, 404])
+        assert self.engine.pool.checkedout() == 0
+        assert Post.get(1).approved_count == self.clients + 1
@@ -0,0 +1,210 @@
+import datetime
+import os
+import shutil
+
+from pylons import config
+
+from wattman.lib.export import SiteExporter, export_dir, render_pages
+from wattman.model import Session, Comment, Page, Post, Tag
+from wattman.tests import *
+
+class TestContentControllers(TestController):
+
+    def setUp(self):
+        tag = Tag(name=u'python', path=u'python')
+        post = Post(title=u'Hello', path=u'hello', content=u'*Hi*',
+                    tags=[tag])
+        Comment(name=u'Ann', content=u'Nice', post=post, approved=True)
+        Comment(name=u'Spammer', content=u'Buy', post=post)
+        Post(title=u'Unpublished', path=u'draft', draft=True, tags=[tag])
+        Page(title=u'About', path=u'about', content=u'About *us*')
+        Session.commit()
+
+    def tearDown(self):
+        for entity in Comment, Post, Page, Tag:
+            for obj in entity.query.all():
+                obj.delete()
+        Session.commit()
+        Session.remove()
+
+    def test_post(self):
+        response = self.app.get('/post/hello')
+        assert '<em>Hi</em>' in response
+        assert '1 comment' in response and 'Nice' in response
+        assert 'Buy' not in response
+        assert '/tag/python' in response
+
+    def test_drafts_and_missing_content_are_not_found(self):
+        self.app.get('/post/draft', status=404)
+        self.app.get('/page/missing', status=404)
+
+    def test_page(self):
+        response = self.app.get('/page/about')
+        assert 'About <em>us</em>' in response
+        # static files by their fingerprinted URLs
+        assert 'href="/assets/favicon.' in response
+
+    def test_tag_lists_published_posts(self):
+        response = self.app.get('/tag/python')
+        assert 'Hello' in response
+        assert 'Unpublished' not in response
+        assert 'rel="next"' not in response
+
+    def test_tag_listing_cursors(self):
+        self.app.get('/tag/python?page=nonsense', status=404)
+        # base64 of ["a","2009-01-01T00:00:00",{}]
+        self.app.get('/tag/python?page=WyJhIiwiMjAwOS0wMS0wMVQwMDowMDowMCIs'
+                     'e31d', status=404)
+
+
+class TestSiteExport(TestContentControllers):
+
+    def setUp(self):
+        TestContentControllers.setUp(self)
+        # (where the application serves them from and removes them)
+        self.output = export_dir(config)
+        if not os.path.isdir(self.output):
+            os.makedirs(self.output)
+        self.exporter = SiteExporter(Session, self.output)
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+        TestContentControllers.tearDown(self)
+
+    def _export(self, force=False):
+        urls, removed, manifest = self.exporter.plan(force)
+        self.exporter.remove(removed)
+        statuses = render_pages(self.app.app, self.output, urls)
+        self.exporter.finish(manifest, statuses)
+        return urls, removed
+
+    def test_exports_published_content(self):
+        urls, removed = self._export()
+        assert urls == ['/page/about', '/post/hello', '/tag/python']
+        exported = open(os.path.join(self.output, 'post', 'hello')).read()
+        assert '<em>Hi</em>' in exported
+
+    def test_export_is_incremental(self):
+        self._export()
+        assert self._export() == ([], [])
+        Comment.query.filter_by(name=u'Spammer').one().approved = True
+        Session.commit()
+        # the post and the listing show its comment count
+        assert self._export() == (['/post/hello', '/tag/python'], [])
+        assert len(self._export(force=True)[0]) == 3
+        # pages link to the assets by their fingerprinted URLs
+        self.exporter.assets = 'rebuilt'
+        assert len(self._export()[0]) == 3
+
+    def test_unpublished_content_is_removed(self):
+        self._export()
+        Post.query.filter_by(path=u'hello').one().draft = True
+        Session.commit()
+        assert self._export() == (['/tag/python'], ['/post/hello'])
+        assert not os.path.exists(os.path.join(self.output, 'post', 'hello'))
+
+    def test_changes_remove_exported_pages_at_once(self):
+        self._export()
+        exported = lambda *parts: os.path.exists(
+            os.path.join(self.output, *parts))
+        # the exported file is what's served
+        f = open(os.path.join(self.output, 'post', 'hello'), 'a')
+        f.write('<!-- exported -->')
+        f.close()
+        assert 'exported' in self.app.get('/post/hello')
+        Post.query.filter_by(path=u'hello').one().draft = True
+        Session.commit()
+        # before any re-export
+        assert not exported('post', 'hello')
+        assert not exported('tag', 'python')
+        assert exported('page', 'about')
+        self.app.get('/post/hello', status=404)
+
+        Page.query.filter_by(path=u'about').one().delete()
+        Session.commit()
+        assert not exported('page', 'about')
+        self.app.get('/page/about', status=404)
+
+    def test_comments_remove_the_exported_post(self):
+        self._export()
+        post = Post.query.filter_by(path=u'hello').one()
+        Comment(name=u'Bob', content=u'Late', post=post, approved=True)
+        Session.commit()
+        assert not os.path.exists(os.path.join(self.output, 'post', 'hello'))
+        assert 'Late' in self.app.get('/post/hello')
+        # and the next export writes it again
+        assert self._export()[0] == ['/post/hello', '/tag/python']
+
+
+class TestConditionalGet(TestContentControllers):
+
+    def test_unchanged_views_are_not_modified(self):
+        for url in '/post/hello', '/page/about', '/tag/python':
+            response = self.app.get(url)
+            assert response.headers['Cache-Control'].startswith('public')
+            etag = response.headers['ETag']
+            response = self.app.get(url, headers={'If-None-Match': etag},
+                                    status=304)
+            assert response.body == ''
+            assert response.headers['ETag'] == etag
+            assert response.headers['Cache-Control'].startswith('public')
+
+    def test_if_modified_since(self):
+        modified = self.app.get('/page/about').headers['Last-Modified']
+        self.app.get('/page/about', status=304,
+                     headers={'If-Modified-Since': modified})
+        self.app.get('/page/about', status=200, headers={
+            'If-Modified-Since': 'Sat, 01 Jan 2000 00:00:00 GMT'})
+
+    def test_new_comments_change_the_etag(self):
+        etag = self.app.get('/post/hello').headers['ETag']
+        post = Post.query.filter_by(path=u'hello').one()
+        Comment(name=u'Bob', content=u'Me too', post=post, approved=True)
+        Session.commit()
+        response = self.app.get('/post/hello', status=200,
+                                headers={'If-None-Match': etag})
+        assert 'Me too' in response
+        assert response.headers['ETag'] != etag
+
+    def test_retagging_changes_the_etag(self):
+        etag = self.app.get('/post/hello').headers['ETag']
+        post = Post.query.filter_by(path=u'hello').one()
+        post.tags.append(Tag(name=u'web', path=u'web'))
+        Session.commit()
+        self.app.get('/post/hello', status=200,
+                     headers={'If-None-Match': etag})
+
+    def test_deleting_a_post_changes_the_listing_etag(self):
+        tag = Tag.query.filter_by(path=u'python').one()
+        # not the latest post to change, so MAX(updated_on) stays put
+        Post(title=u'Older', path=u'older', content=u'Old', tags=[tag],
+             updated_on=datetime.datetime(2000, 1, 1))
+        Session.commit()
+        response = self.app.get('/tag/python')
+        assert 'Older' in response
+        assert 'Last-Modified' not in response.headers
+        etag = response.headers['ETag']
+        Post.query.filter_by(path=u'older').one().delete()
+        Session.commit()
+        response = self.app.get('/tag/python', status=200,
+                                headers={'If-None-Match': etag})
+        assert 'Older' not in response
+        assert response.headers['ETag'] != etag
+
+    def test_new_asset_builds_change_the_etag(self):
+        response = self.app.get('/page/about')
+        etag = response.headers['ETag']
+        # (the application's own, not the one websetup loaded)
+        assets = response.app_globals.assets
+        stamp = assets.stamp
+        assets.stamp = 'rebuilt'
+        try:
+            response = self.app.get('/page/about', status=200,
+                                    headers={'If-None-Match': etag})
+        finally:
+            assets.stamp = stamp
+        assert response.headers['ETag'] != etag
+
+    def test_missing_content_is_not_cached(self):
+        response = self.app.get('/post/missing', status=404)
+        assert 'public' not in response.headers.get('Cache-Control', '')
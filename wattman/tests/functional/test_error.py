@@ -0,0 +1,25 @@
+from wattman.tests import *
+
+
+class TestErrorController(TestController):
+
+    def test_document(self):
+        response = self.app.get('/no/such/page', status=404)
+        assert 'Server Error 404' in response
+        assert 'The resource could not be found' in response
+        etag = response.headers['ETag']
+        again = self.app.get('/another/missing/page', status=404)
+        assert again.body == response.body
+        assert again.headers['ETag'] == etag
+        assert again.headers['Cache-Control'] == 'no-cache'
+
+    def test_assets(self):
+        response = self.app.get('/error/style/black.css')
+        assert response.content_type == 'text/css'
+        assert 'public' in response.headers['Cache-Control']
+        self.app.get('/error/style/black.css', status=304,
+                     headers={'If-None-Match': response.headers['ETag']})
+        image = self.app.get('/error/img/favicon.ico')
+        assert image.body.startswith('\x00\x00\x01\x00')
+        self.app.get('/error/img/missing.png', status=404)
+
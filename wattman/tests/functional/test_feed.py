@@ -0,0 +1,94 @@
+import datetime
+from xml.etree import ElementTree as etree
+
+from wattman.controllers import feed as feed_controller
+from wattman.model import Session, Comment, Post, Tag
+from wattman.tests import *
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+class TestFeedController(TestController):
+
+    def setUp(self):
+        tag = Tag(name=u'python', path=u'python')
+        post = Post(title=u'Hello & welcome', path=u'hello',
+                    content=u'*Hi*', tags=[tag])
+        Comment(name=u'Ann', content=u'Nice <b>', post=post, approved=True)
+        Comment(name=u'Spammer', content=u'Buy', post=post)
+        Post(title=u'Unpublished', path=u'draft', draft=True, tags=[tag])
+        Session.commit()
+        self.written = []
+        def write_feed(format, feed):
+            self.written.append(feed.url)
+            return self.write_feed(format, feed)
+        self.write_feed = feed_controller.write_feed
+        feed_controller.write_feed = write_feed
+
+    def tearDown(self):
+        feed_controller.write_feed = self.write_feed
+        for entity in Comment, Post, Tag:
+            for obj in entity.query.all():
+                obj.delete()
+        Session.commit()
+        Session.remove()
+
+    def test_site_atom(self):
+        response = self.app.get('/feed.atom')
+        assert response.content_type == 'application/atom+xml'
+        feed = etree.fromstring(response.body)
+        entries = feed.findall(ATOM + 'entry')
+        assert [e.findtext(ATOM + 'title') for e in entries] == \
+            [u'Hello & welcome']
+        assert entries[0].find(ATOM + 'link').get('href') == \
+            'http://localhost/post/hello'
+        assert '<em>Hi</em>' in entries[0].findtext(ATOM + 'content')
+        assert entries[0].find(ATOM + 'category').get('term') == u'python'
+
+    def test_tag_rss(self):
+        response = self.app.get('/tag/python/feed.rss')
+        assert response.content_type == 'application/rss+xml'
+        items = etree.fromstring(response.body).findall('channel/item')
+        assert [i.findtext('title') for i in items] == [u'Hello & welcome']
+        self.app.get('/tag/missing/feed.rss', status=404)
+
+    def test_comments(self):
+        feed = etree.fromstring(self.app.get('/post/hello/comments.atom').body)
+        entries = feed.findall(ATOM + 'entry')
+        assert [e.findtext(ATOM + 'content') for e in entries] == \
+            [u'Nice &lt;b&gt;']
+        self.app.get('/post/draft/comments.atom', status=404)
+
+    def test_feeds_are_written_once_per_change(self):
+        first = self.app.get('/feed.atom')
+        assert self.app.get('/feed.atom').body == first.body
+        assert self.written == ['http://localhost/feed.atom']
+        self.app.get('/feed.atom', status=304,
+                     headers={'If-None-Match': first.headers['ETag']})
+        Post(title=u'Second', path=u'second', content=u'More')
+        Session.commit()
+        response = self.app.get('/feed.atom',
+                                headers={'If-None-Match':
+                                         first.headers['ETag']})
+        assert 'Second' in response
+        assert len(self.written) == 2
+
+    def test_deleted_posts_leave_the_feeds(self):
+        tag = Tag.query.filter_by(path=u'python').one()
+        # not the latest post to change, so MAX(updated_on) stays put
+        Post(title=u'Older', path=u'older', content=u'Old', tags=[tag],
+             updated_on=datetime.datetime(2000, 1, 1))
+        Session.commit()
+        etags = {}
+        for url in '/feed.atom', '/tag/python/feed.rss':
+            response = self.app.get(url)
+            assert 'Older' in response
+            assert 'Last-Modified' not in response.headers
+            etags[url] = response.headers['ETag']
+        Post.query.filter_by(path=u'older').one().delete()
+        Session.commit()
+        for url in '/feed.atom', '/tag/python/feed.rss':
+            response = self.app.get(url, headers={'If-None-Match':
+                                                  etags[url]})
+            assert response.status_int == 200
+            assert 'Older' not in response
+        assert len(self.written) == 4
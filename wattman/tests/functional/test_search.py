@@ -0,0 +1,20 @@
+from wattman.model import Session, Post
+from wattman.tests import *
+
+class TestSearchController(TestController):
+
+    def test_index(self):
+        Post(title=u'Searchable', path=u'searchable', draft=False,
+             content=u'Full text search works on <b>searchable</b> posts.')
+        Session.commit()
+        response = self.app.get(url(controller='search', action='index',
+                                    q='searchable'))
+        assert '1 result' in response
+        assert '/post/searchable' in response
+        # the matched term is highlighted and the post's own HTML escaped
+        assert '<p>Full text search works on &lt;b&gt;<strong>searchable'\
+            '</strong>&lt;/b&gt; posts.</p>' in response
+
+    def test_empty_query(self):
+        response = self.app.get(url(controller='search', action='index'))
+        assert 'result' not in response
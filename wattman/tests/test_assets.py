@@ -0,0 +1,159 @@
+import gzip
+import os
+import shutil
+import tempfile
+from cStringIO import StringIO
+from unittest import TestCase
+
+from webob import Request
+
+from wattman.lib.assets import AssetManifest, AssetMiddleware, build_assets
+
+CSS = 'body { color: black; }\n' * 100
+
+
+class TestAssets(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.public = os.path.join(self.dir, 'public')
+        self.output = os.path.join(self.dir, 'assets')
+        self._write('css/site.css', CSS)
+        self._write('logo.png', '\x89PNG not really')
+        self._write('index.html', '<html></html>')
+        # an exported page and the export's manifest
+        self._write('post/hello', '<p>Exported</p>')
+        self._write('.export-manifest', '{}')
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, data):
+        filename = os.path.join(self.public, *name.split('/'))
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        f = open(filename, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+
+    def _app(self, environ, start_response):
+        self.calls.append(environ['PATH_INFO'])
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return ['from the app']
+
+    def _middleware(self):
+        files, built = build_assets(self.public, self.output)
+        return AssetMiddleware(self._app, AssetManifest(self.output, files),
+                               self.public)
+
+    def test_build(self):
+        files, built = build_assets(self.public, self.output)
+        assert built == ['/css/site.css', '/index.html', '/logo.png']
+        entry = files['/css/site.css']
+        assert entry['file'].startswith('css/site.')
+        assert entry['file'].endswith('.css')
+        assert sorted(entry['encodings']) == ['gzip']
+        assert files['/logo.png']['encodings'] == {}
+        assert AssetManifest.read(self.output) == files
+
+        # only changed files are built again, and the old build removed
+        assert build_assets(self.public, self.output)[1] == []
+        old = os.path.join(self.output, entry['file'])
+        self._write('css/site.css', CSS + 'p { }\n')
+        files, built = build_assets(self.public, self.output, keep=0)
+        assert built == ['/css/site.css']
+        assert files['/css/site.css']['file'] != entry['file']
+        assert not os.path.exists(old)
+        assert not os.path.exists(old + '.gz')
+
+    def test_superseded_files_are_kept_a_while(self):
+        files, built = build_assets(self.public, self.output)
+        old = os.path.join(self.output, files['/css/site.css']['file'])
+        # (built long ago)
+        os.utime(old, (0, 0))
+        stamp = AssetManifest(self.output, files).stamp
+        self._write('css/site.css', CSS + 'p { }\n')
+        files, built = build_assets(self.public, self.output)
+        assert AssetManifest(self.output, files).stamp != stamp
+        # pages rendered before the build still find it
+        assert os.path.exists(old) and os.path.exists(old + '.gz')
+        assert build_assets(self.public, self.output)[1] == []
+        assert os.path.exists(old)
+        build_assets(self.public, self.output, keep=0)
+        assert not os.path.exists(old)
+        assert not os.path.exists(old + '.gz')
+        assert os.path.exists(os.path.join(self.output,
+                                           files['/css/site.css']['file']))
+
+    def test_fingerprinted_urls_are_cached_forever(self):
+        app = self._middleware()
+        url = app.manifest.url('/css/site.css')
+        assert url.startswith('/assets/css/site.')
+        response = Request.blank(url).get_response(app)
+        assert response.body == CSS
+        assert response.content_type == 'text/css'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert 'Content-Encoding' not in response.headers
+
+        request = Request.blank(url, environ={
+            'HTTP_ACCEPT_ENCODING': 'br;q=0, gzip;q=0.8'})
+        response = request.get_response(app)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.GzipFile(fileobj=StringIO(response.body)).read() == CSS
+
+        request = Request.blank(url, environ={
+            'HTTP_IF_NONE_MATCH': response.headers['ETag']})
+        assert request.get_response(app).status_int == 304
+        assert Request.blank('/assets/css/site.css').get_response(app) \
+            .status_int == 404
+        assert self.calls == []
+
+    def test_original_urls_and_file_wrapper(self):
+        app = self._middleware()
+        wrapped = []
+        def file_wrapper(f, block_size):
+            wrapped.append(f.name)
+            return iter([f.read()])
+        request = Request.blank('/logo.png', environ={
+            'wsgi.file_wrapper': file_wrapper})
+        response = request.get_response(app)
+        assert response.body == '\x89PNG not really'
+        assert response.headers['Cache-Control'] == 'public, max-age=3600'
+        assert wrapped == [os.path.join(self.output,
+                                        app.manifest.files['/logo.png']
+                                        ['file'])]
+        assert Request.blank('/').get_response(app).body == '<html></html>'
+
+    def test_other_paths_bypass_the_lookup(self):
+        app = self._middleware()
+        assert Request.blank('/post/hello').get_response(app).body == \
+            '<p>Exported</p>'
+        for path in ['/post/missing', '/search', '/.export-manifest']:
+            assert Request.blank(path).get_response(app).body == \
+                'from the app'
+        assert self.calls == ['/post/missing', '/search',
+                              '/.export-manifest']
+
+    def test_references_are_rewritten(self):
+        self._write('css/site.css', 'body { background: url("../logo.png") }')
+        self._write('index.html', '<link href="/css/site.css">'
+                    '<img src="logo.png"><a href="http://example.com/">')
+        files, built = build_assets(self.public, self.output)
+        manifest = AssetManifest(self.output, files)
+        read = lambda path: open(manifest.urls[path].filename).read()
+        logo = manifest.url('/logo.png')
+        assert read('/css/site.css') == 'body { background: url("%s") }' % \
+            logo
+        assert read('/index.html') == \
+            '<link href="%s"><img src="%s"><a href="http://example.com/">' % (
+                manifest.url('/css/site.css'), logo)
+
+        # the files referring to a changed asset are built again
+        self._write('logo.png', '\x89PNG another')
+        files, built = build_assets(self.public, self.output)
+        assert built == ['/css/site.css', '/index.html', '/logo.png']
+        assert build_assets(self.public, self.output)[1] == []
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from pylons import config
+from routes import Mapper
+
+from wattman.config.routing import connect_routes
+from wattman.lib.dispatch import DispatchMapper
+
+URLS = ['/post/hello', '/post/caf%C3%A9', '/page/about', '/tag/python',
+        '/tag/python/feed.atom', '/tag/python/feed.xml', '/feed.rss',
+        '/post/hello/comments.atom', '/search', '/error/document',
+        '/error/img/x.png', '/admin/index', '/post/edit/3', '/', '/nothing',
+        '/post/', '/post/a/b/c/d', '//post/hello']
+
+ARGS = [dict(controller='post', action='view', path=u'hello'),
+        dict(controller='post', action='view', path=u'caf\xe9 & co'),
+        dict(controller='tag', action='view', path=u'a/b'),
+        dict(controller='feed', action='tag', path=u'python', format='rss'),
+        dict(controller='feed', action='tag', path=u'python', format='xml'),
+        dict(controller='search', action='index'),
+        dict(controller='admin', action='index'),
+        dict(controller='post', action='edit', id=3),
+        dict(controller='error', action='document'),
+        dict(controller='post', action='view', path=u'x',
+             _environ=dict(SCRIPT_NAME='/blog'))]
+
+
+class TestDispatchMapper(TestCase):
+
+    def setUp(self):
+        directory = config['pylons.paths']['controllers']
+        self.mapper = connect_routes(Mapper(directory=directory))
+        self.dispatch = connect_routes(DispatchMapper(directory=directory,
+                                                      cache_size=5))
+
+    def _routematch(self, mapper, url, method='GET'):
+        result = mapper.routematch(environ=dict(PATH_INFO=url,
+                                                REQUEST_METHOD=method))
+        return result and (result[0], result[1].routepath)
+
+    def test_matches_like_mapper(self):
+        for i in range(2):
+            # the second time round, from the cache
+            for url in URLS:
+                assert self._routematch(self.dispatch, url) == \
+                    self._routematch(self.mapper, url), url
+        assert len(self.dispatch._match_cache) <= 5
+
+    def test_match_dicts_are_copies(self):
+        self._routematch(self.dispatch, '/post/hello')[0]['path'] = u'bye'
+        assert self._routematch(self.dispatch, '/post/hello')[0]['path'] \
+            == u'hello'
+
+    def test_generates_like_mapper(self):
+        for args in ARGS * 2:
+            assert self.dispatch.generate(**args) == \
+                self.mapper.generate(**args), args
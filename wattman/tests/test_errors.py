@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from webob import Request
+from webob.exc import HTTPNotFound
+
+from wattman.lib.errors import (ErrorDocumentRedirect, ErrorPages,
+                                document_args, stock_messages)
+
+
+class TestErrorPages(TestCase):
+
+    def setUp(self):
+        self.pages = ErrorPages(codes=(404,))
+        self.calls = []
+
+    def test_stock_documents_are_rendered_up_front(self):
+        assert len(self.pages._documents) == 2
+        message = stock_messages(404)[0]
+        assert self.pages.lookup('404', message) is \
+            self.pages.document('404', message)
+        assert len(self.pages._documents) == 2
+        # messages that aren't literals are escaped
+        assert self.pages.lookup('404', u'<b>') is None
+        body, etag = self.pages.document('404', u'<b>')
+        assert '&lt;b&gt;' in body
+        assert self.pages.lookup('404', u'<b>') == (body, etag)
+        assert ErrorPages(codes=(), max_size=1).document('404', u'x') == \
+            self.pages.document('404', u'x')
+
+    def test_assets(self):
+        asset = self.pages.assets['style/black.css']
+        assert asset.content_type == 'text/css'
+        assert 'body' in asset.body
+        assert 'img/favicon.ico' in self.pages.assets
+
+    def _app(self, environ, start_response):
+        """Not found, except for the error document"""
+        self.calls.append(environ['PATH_INFO'])
+        if environ['PATH_INFO'] == '/error/document':
+            request = Request(environ)
+            body, etag = self.pages.document(*document_args(
+                request, environ['pylons.original_response']))
+            start_response('200 OK', ErrorDocumentRedirect.headers +
+                           [('ETag', etag)])
+            return [body]
+        if environ['PATH_INFO'] == '/teapot':
+            start_response('404 Not Found', [('Content-Type',
+                                              'text/plain')])
+            return ['No teapot here']
+        return HTTPNotFound()(environ, start_response)
+
+    def test_rendered_documents_are_served_from_memory(self):
+        app = ErrorDocumentRedirect(self._app, self.pages)
+        response = Request.blank('/missing').get_response(app)
+        assert response.status_int == 404
+        assert 'Server Error 404' in response.body
+        assert self.calls == ['/missing']
+
+        first = Request.blank('/teapot').get_response(app)
+        again = Request.blank('/teapot').get_response(app)
+        assert self.calls == ['/missing', '/teapot', '/error/document',
+                              '/teapot']
+        assert 'No teapot here' in again.body
+        assert again.body == first.body
+        assert again.status == first.status
+        assert sorted(again.headers.items()) == \
+            sorted(first.headers.items())
+
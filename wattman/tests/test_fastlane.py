@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from pylons import config
+
+from wattman.config.routing import connect_routes
+from wattman.lib.dispatch import DispatchMapper
+from wattman.lib.fastlane import ROUTES, FastLaneMiddleware
+
+
+def stack(name):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [name]
+    return app
+
+
+class TestFastLane(TestCase):
+
+    def setUp(self):
+        mapper = connect_routes(DispatchMapper(
+            directory=config['pylons.paths']['controllers']))
+        self.app = FastLaneMiddleware(stack('full'), stack('fast'), mapper,
+                                      ROUTES.split(),
+                                      ['authkit', 'wattman'])
+
+    def _lane(self, path, method='GET', cookie=None):
+        environ = dict(REQUEST_METHOD=method, PATH_INFO=path)
+        if cookie is not None:
+            environ['HTTP_COOKIE'] = cookie
+        return self.app(environ, lambda status, headers: None)[0]
+
+    def test_anonymous_reads_take_the_fast_lane(self):
+        for path in ['/post/hello', '/page/about', '/tag/python',
+                     '/tag/python/feed.atom', '/feed.rss', '/search']:
+            assert self._lane(path) == 'fast', path
+        assert self._lane('/post/hello', 'HEAD') == 'fast'
+        assert self._lane('/post/hello', cookie='theme=dark') == 'fast'
+
+    def test_everything_else_takes_the_full_stack(self):
+        assert self._lane('/post/hello', 'POST') == 'full'
+        assert self._lane('/post/hello', cookie='authkit="abc"') == 'full'
+        assert self._lane('/post/hello',
+                          cookie='theme=dark; wattman=123') == 'full'
+        for path in ['/admin/index', '/post/edit/3', '/error/document',
+                     '/nothing/at/all/here']:
+            assert self._lane(path) == 'full', path
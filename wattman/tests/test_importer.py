@@ -0,0 +1,136 @@
+from StringIO import StringIO
+
+from wattman.lib.importer import Importer, read_jsonl, read_wxr
+from wattman.model import Session, Comment, Page, Post, Tag, metadata
+from wattman.tests.test_models import ModelTestCase
+
+JSONL = '''\
+{"type": "tag", "name": "python"}
+{"type": "post", "title": "Hello", "path": "hello", "content": "*hi*", \
+"posted_on": "2009-05-01", "tags": ["python", "Pylons", "python"], \
+"comments": [{"name": "Ann", "content": "first", "approved": true}]}
+{"type": "post", "title": "Draft", "content": "later", "draft": true}
+{"type": "page", "title": "About", "path": "about", "content": "me"}
+{"type": "comment", "post": "hello", "name": "Bob", "content": "second"}
+{"type": "comment", "post": "missing", "name": "Eve", "content": "lost"}
+not json
+'''
+
+WXR = '''\
+<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"
+     xmlns:content="http://purl.org/rss/1.0/modules/content/"
+     xmlns:wp="http://wordpress.org/export/1.2/">
+<channel>
+  <wp:tag><wp:tag_slug>pylons</wp:tag_slug>
+    <wp:tag_name>Pylons</wp:tag_name></wp:tag>
+  <item>
+    <title>Hello</title>
+    <content:encoded><![CDATA[Hello <b>world</b>]]></content:encoded>
+    <wp:post_date>2009-05-01 10:00:00</wp:post_date>
+    <wp:post_name>hello</wp:post_name>
+    <wp:status>publish</wp:status>
+    <wp:post_type>post</wp:post_type>
+    <category domain="post_tag" nicename="pylons">Pylons</category>
+    <category domain="category" nicename="misc">Misc</category>
+    <wp:comment>
+      <wp:comment_author>Ann</wp:comment_author>
+      <wp:comment_date>2009-05-02 10:00:00</wp:comment_date>
+      <wp:comment_content>Nice</wp:comment_content>
+      <wp:comment_approved>1</wp:comment_approved>
+    </wp:comment>
+    <wp:comment>
+      <wp:comment_author>Spammer</wp:comment_author>
+      <wp:comment_content>Buy</wp:comment_content>
+      <wp:comment_approved>spam</wp:comment_approved>
+    </wp:comment>
+  </item>
+  <item>
+    <title>About</title>
+    <content:encoded>Me</content:encoded>
+    <wp:post_name>about</wp:post_name>
+    <wp:post_type>page</wp:post_type>
+  </item>
+  <item>
+    <title>logo.png</title>
+    <wp:post_type>attachment</wp:post_type>
+  </item>
+</channel>
+</rss>
+'''
+
+
+class TestImporter(ModelTestCase):
+
+    def run_import(self, records, batch_size=2):
+        batches = []
+        importer = Importer(metadata.bind, batch_size,
+                            lambda counts: batches.append(dict(counts)))
+        return importer.run(records), batches
+
+    def test_jsonl(self):
+        counts, batches = self.run_import(read_jsonl(StringIO(JSONL)))
+        assert counts == dict(tag=2, post=2, page=1, comment=2, skipped=1)
+        assert len(batches) > 1
+        post = Post.get_by(path=u'hello')
+        assert post.content_html == u'<p><em>hi</em>\n</p>'
+        assert sorted(tag.name for tag in post.tags) == [u'Pylons',
+                                                         u'python']
+        assert sorted(c.name for c in post.comments) == [u'Ann', u'Bob']
+        assert Post.get_by(path=u'draft').draft
+        assert Page.get_by(path=u'about').content == u'me'
+
+    def test_reimport_skips_existing_content(self):
+        self.run_import(read_jsonl(StringIO(JSONL)))
+        Session.remove()
+        counts, batches = self.run_import(read_jsonl(StringIO(JSONL)))
+        assert counts['post'] == counts['page'] == counts['tag'] == 0
+        assert counts['comment'] == 0
+        assert Post.query.count() == 2
+        assert Tag.query.count() == 2
+        assert Comment.query.count() == 2
+
+    def test_reimport_adds_comments_that_didnt_make_it(self):
+        # as if interrupted after the post's batch, before its comments'
+        self.run_import(read_jsonl(StringIO(JSONL.splitlines()[1]
+                                            .replace('"comments"', '"x"'))))
+        Session.remove()
+        counts, batches = self.run_import(read_jsonl(StringIO(JSONL)))
+        assert counts['post'] == 1 and counts['comment'] == 2
+        post = Post.get_by(path=u'hello')
+        assert sorted(c.name for c in post.comments) == [u'Ann', u'Bob']
+
+    def test_comments_are_checked_one_post_at_a_time(self):
+        records = [('post', dict(title=u'A', path=u'a')),
+                   ('post', dict(title=u'B', path=u'b'))] + [
+            ('comment', dict(post=path, name=u'Ann', content=text))
+            for path, text in [(u'a', u'one'), (u'b', u'one'),
+                               (u'a', u'two'), (u'a', u'one')]]
+        importer = Importer(metadata.bind, 2)
+        counts = importer.run(iter(records))
+        # posts new to the database have no comments to look up
+        assert counts['comment'] == 4
+        assert importer._keys_post_id is None
+        Session.remove()
+
+        records.append(('comment', dict(post=u'b', name=u'Ann',
+                                        content=u'three')))
+        importer = Importer(metadata.bind, 2)
+        counts = importer.run(iter(records))
+        assert counts['comment'] == 1 and counts['skipped'] == 6
+        # only the last post's digests are kept
+        assert importer._keys_post_id == Post.get_by(path=u'b').id
+        assert len(importer._comment_keys) == 2
+        assert Comment.query.count() == 5
+
+    def test_wxr(self):
+        counts, batches = self.run_import(read_wxr(StringIO(WXR)))
+        assert counts == dict(tag=1, post=1, page=1, comment=1, skipped=0)
+        post = Post.get_by(path=u'hello')
+        assert not post.draft
+        assert post.content == u'Hello <b>world</b>'
+        assert [tag.name for tag in post.tags] == [u'Pylons']
+        assert [c.name for c in post.comments] == [u'Ann']
+        assert post.comments[0].approved
+        assert Page.get_by(path=u'about').title == u'About'
+        assert Comment.query.count() == 1
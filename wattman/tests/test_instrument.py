@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import sqlalchemy as sa
+from webtest import TestApp
+
+from wattman.lib.instrument import (Instrumentation, InstrumentMiddleware,
+                                    SQLTimer)
+
+
+class TestInstrumentation(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.instrumentation = Instrumentation(
+            enabled=True, repeat_threshold=3, slow=0, profile=True,
+            profile_dir=os.path.join(self.dir, 'profiles'))
+        self.engine = sa.create_engine(
+            'sqlite://', proxy=SQLTimer(self.instrumentation))
+        self.app = TestApp(InstrumentMiddleware(self.blog, self.instrumentation))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def blog(self, environ, start_response):
+        """Runs one query per post, like a listing without eager loads"""
+        environ['pylons.routes_dict'] = dict(controller='post',
+                                             action='index')
+        self.engine.execute('SELECT 1')
+        for i in range(int(environ['QUERY_STRING'] or 0)):
+            self.engine.execute('SELECT ?', i)
+        self.instrumentation.record_render(0.25)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return ['ok']
+
+    def test_requests_are_recorded_per_route(self):
+        self.app.get('/', '1')
+        self.app.get('/', '3')
+        summary = self.instrumentation.summary()
+        assert summary['requests'] == 2
+        route = summary['routes']['post.index']
+        assert route['requests'] == 2
+        assert route['queries'] == 3 and route['max_queries'] == 4
+        assert route['render_time'] == 0.25
+        assert route['wall_time'] >= route['sql_time']
+
+    def test_repeated_statements_are_flagged(self):
+        self.app.get('/', '2')
+        assert self.instrumentation.history[-1].repeated(3) == []
+        self.app.get('/', '3')
+        assert self.instrumentation.history[-1].repeated(3) == \
+            [(3, 'SELECT ?')]
+        assert self.instrumentation.summary()['routes']['post.index'][
+            'repeated'] == 1
+
+    def test_slow_requests_leave_profiles(self):
+        self.app.get('/')
+        profiles = os.listdir(os.path.join(self.dir, 'profiles'))
+        assert len(profiles) == 1
+        assert profiles[0].endswith('-post.index.prof')
+
+    def test_history_is_bounded(self):
+        self.instrumentation.history = \
+            self.instrumentation.history.__class__(maxlen=2)
+        self.instrumentation.profile = False
+        for i in range(5):
+            self.app.get('/')
+        assert self.instrumentation.summary()['requests'] == 2
+
+    def test_queries_outside_requests_are_ignored(self):
+        self.engine.execute('SELECT 1')
+        assert self.instrumentation.current() is None
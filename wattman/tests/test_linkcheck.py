@@ -0,0 +1,62 @@
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from unittest import TestCase
+
+from wattman.lib.linkcheck import LinkChecker
+
+
+class StubSiteHandler(BaseHTTPRequestHandler):
+
+    def do_HEAD(self):
+        self.server.hits += 1
+        self.send_response(self.path == '/missing' and 404 or 200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLinkChecker(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), StubSiteHandler)
+        self.server.hits = 0
+        t = threading.Thread(target=self.server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+        self.checker = LinkChecker(workers=2, timeout=2)
+
+    def tearDown(self):
+        self.checker.pool.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _settle(self, url):
+        for i in range(100):
+            if self.checker.key(url) in self.checker.verdicts:
+                break
+            time.sleep(0.02)
+        return self.checker.verdict(url)
+
+    def test_verdict_is_deferred_then_cached_per_link(self):
+        assert self.checker.verdict(self.url + '/a') is None
+        assert self._settle(self.url + '/a') is True
+        assert self.checker.verdict(self.url + '/a#comments') is True
+        assert self.server.hits == 1
+        # another page on the same host is checked on its own
+        assert self.checker.verdict(self.url + '/b') is None
+        assert self._settle(self.url + '/b') is True
+        assert self.server.hits == 2
+
+    def test_missing_page_is_bad(self):
+        self.checker.check(self.url + '/missing')
+        assert self._settle(self.url + '/missing') is False
+        # without condemning the rest of the host
+        assert self.checker.verdict(self.url + '/a') is None
+        assert self._settle(self.url + '/a') is True
+
+    def test_unreachable_host_is_bad(self):
+        self.checker.check('http://127.0.0.1:1/')
+        assert self._settle('http://127.0.0.1:1/') is False
@@ -0,0 +1,451 @@
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import sqlalchemy as sa
+from sqlalchemy.engine.reflection import Inspector
+from sqlalchemy.interfaces import ConnectionProxy
+
+from wattman.model import Session, Comment, Page, Post, Tag, meta, metadata
+from wattman.model.engine import engine_from_config
+from wattman.model.migrate import upgrade
+from wattman.lib import markup
+from wattman.model.pathindex import path_index
+from wattman.model.rendering import rerender
+from wattman.model.search import search_index
+
+
+class ModelTestCase(TestCase):
+
+    def setUp(self):
+        metadata.create_all()
+
+    def tearDown(self):
+        Session.remove()
+        metadata.drop_all()
+
+
+class TestPathIndex(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        Page(title=u'About', path=u'about')
+        Tag(name=u'python', path=u'py')
+        Session.commit()
+        path_index.load()
+
+    def test_warmed_from_database(self):
+        assert path_index.warm
+        assert path_index.may_conflict(Page, 'path', u'about')
+        assert path_index.may_conflict(Tag, 'name', u'python')
+        assert not path_index.may_conflict(Page, 'path', u'contact')
+
+    def test_warmed_with_tags_present(self):
+        # Tag's name is its primary key as well as an indexed value
+        assert path_index.warm
+        assert path_index._values[(Tag, 'name')] == {u'python': u'python'}
+        assert path_index._values[(Tag, 'path')] == {u'py': u'python'}
+        assert not path_index.may_conflict(Tag, 'name', u'python', u'python')
+        assert path_index.may_conflict(Tag, 'path', u'py', u'other')
+
+    def test_row_may_keep_its_own_path(self):
+        page = Page.query.filter_by(path=u'about').one()
+        assert not path_index.may_conflict(Page, 'path', u'about', page.id)
+
+    def test_entities_are_indexed_separately(self):
+        assert not path_index.may_conflict(Post, 'path', u'about')
+
+    def test_flush_adds_new_values(self):
+        Tag(name=u'pylons', path=u'pylons')
+        Session.flush()
+        assert path_index.may_conflict(Tag, 'name', u'pylons')
+        assert path_index.may_conflict(Tag, 'path', u'pylons')
+
+    def test_renames_drop_old_value_on_commit(self):
+        page = Page.query.filter_by(path=u'about').one()
+        page.path = u'about-us'
+        Session.flush()
+        assert path_index.may_conflict(Page, 'path', u'about-us')
+        assert path_index.may_conflict(Page, 'path', u'about')
+        Session.commit()
+        assert not path_index.may_conflict(Page, 'path', u'about')
+
+    def test_rollback_keeps_deleted_value(self):
+        Page.query.filter_by(path=u'about').one().delete()
+        Session.flush()
+        Session.rollback()
+        assert path_index.may_conflict(Page, 'path', u'about')
+
+    def test_delete_drops_value_on_commit(self):
+        Page.query.filter_by(path=u'about').one().delete()
+        Session.commit()
+        assert not path_index.may_conflict(Page, 'path', u'about')
+
+    def test_cold_index_defers_to_database(self):
+        path_index.clear()
+        assert path_index.may_conflict(Page, 'path', u'contact')
+
+
+class QueryCounter(ConnectionProxy):
+
+    """Counts the statements sent through an engine"""
+
+    def __init__(self):
+        self.count = 0
+
+    def cursor_execute(self, execute, cursor, statement, parameters,
+                       context, executemany):
+        self.count += 1
+        return execute(cursor, statement, parameters, context)
+
+
+class EngineTestCase(TestCase):
+
+    """Runs against a fresh in-memory database of its own"""
+
+    def setUp(self):
+        self.counter = QueryCounter()
+        self.bind = metadata.bind
+        self.engine = sa.create_engine('sqlite://', proxy=self.counter)
+        Session.remove()
+        Session.configure(bind=self.engine)
+        metadata.bind = self.engine
+        self.create_tables()
+
+    def create_tables(self):
+        metadata.create_all()
+        search_index.create(self.engine)
+
+    def tearDown(self):
+        Session.remove()
+        Session.configure(bind=self.bind)
+        metadata.bind = self.bind
+
+
+class TestPostListings(EngineTestCase):
+
+    def _seed(self, n):
+        tags = [Tag(name=u'tag%d' % i, path=u'tag%d' % i) for i in range(3)]
+        for i in range(n):
+            post = Post(title=u'Post %d' % i, path=u'post-%d' % i,
+                        draft=False, posted_on=datetime.date(2009, 1, 1) +
+                        datetime.timedelta(days=i))
+            post.tags = tags[:i % 3 + 1]
+            for j in range(i % 4):
+                Comment(name=u'c', content=u'hi', post=post)
+        Session.commit()
+        Session.expunge_all()
+
+    def _render(self, posts):
+        for post in posts:
+            [tag.name for tag in post.tags]
+            post.comment_count
+
+    def _queries(self, func, *args):
+        Session.expunge_all()
+        before = self.counter.count
+        self._render(func(*args))
+        return self.counter.count - before
+
+    def test_recent_query_count_is_constant(self):
+        self._seed(30)
+        assert self._queries(Post.recent, 3) == self._queries(Post.recent, 30)
+
+    def test_by_tag_query_count_is_constant(self):
+        self._seed(30)
+        assert self._queries(Post.by_tag, u'tag0', 3) == \
+            self._queries(Post.by_tag, u'tag0', 30)
+
+    def test_recent_is_newest_first_without_drafts(self):
+        self._seed(5)
+        Post.get_by(path=u'post-4').draft = True
+        Session.commit()
+        posts = Post.recent(3)
+        assert [p.path for p in posts] == [u'post-3', u'post-2', u'post-1']
+        assert [p.comment_count for p in posts] == [3, 2, 1]
+
+    def test_by_path_loads_comments(self):
+        self._seed(4)
+        Session.expunge_all()
+        before = self.counter.count
+        post = Post.by_path(u'post-3')
+        assert len(post.comments) == 3 and len(post.tags) == 1
+        assert self.counter.count - before == 2
+
+
+class TestCommentCounters(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        self.post = Post(title=u'Post', path=u'post')
+        self.other = Post(title=u'Other', path=u'other')
+        Session.commit()
+
+    def _counts(self, post):
+        return post.comment_count, post.approved_count
+
+    def test_counts_follow_inserts_approvals_and_deletes(self):
+        comment = Comment(name=u'a', post=self.post)
+        Comment(name=u'b', post=self.post, approved=True)
+        Session.commit()
+        assert self._counts(self.post) == (2, 1)
+        comment.approved = True
+        Session.commit()
+        assert self._counts(self.post) == (2, 2)
+        comment.delete()
+        Session.commit()
+        assert self._counts(self.post) == (1, 1)
+
+    def test_counts_follow_moved_comments(self):
+        comment = Comment(name=u'a', post=self.post, approved=True)
+        Session.commit()
+        comment.post = self.other
+        Session.commit()
+        assert self._counts(self.post) == (0, 0)
+        assert self._counts(self.other) == (1, 1)
+
+    def test_counts_roll_back_with_the_comment(self):
+        Comment(name=u'a', post=self.post)
+        Session.flush()
+        Session.rollback()
+        assert self._counts(self.post) == (0, 0)
+
+    def test_counts_on_new_post(self):
+        post = Post(title=u'New', path=u'new')
+        Comment(name=u'a', post=post, approved=True)
+        Session.commit()
+        assert self._counts(post) == (1, 1)
+
+    def test_rebuild(self):
+        Comment(name=u'a', post=self.post, approved=True)
+        Comment(name=u'b', post=self.post)
+        Comment(name=u'c', post=self.other)
+        Session.commit()
+        Session.execute(Post.table.update().values(comment_count=7))
+        assert Post.rebuild_comment_counts() == 2
+        assert self._counts(self.post) == (2, 1)
+        assert self._counts(self.other) == (1, 0)
+
+
+class TestUpgrade(EngineTestCase):
+
+    def create_tables(self):
+        # post and comment as the first release created them
+        self.engine.execute('''CREATE TABLE post (id INTEGER PRIMARY KEY,
+            title VARCHAR(100), path VARCHAR(100), content TEXT,
+            created_on DATE, comments_allowed BOOLEAN, draft BOOLEAN,
+            posted_on DATE)''')
+        self.engine.execute('''CREATE TABLE comment (id INTEGER PRIMARY KEY,
+            name VARCHAR(100), email VARCHAR(100), content TEXT,
+            created_on DATE, approved BOOLEAN, url VARCHAR(100),
+            post_id INTEGER REFERENCES post (id))''')
+        self.engine.execute("INSERT INTO post (id, path, content) "
+                            "VALUES (1, 'a', 'Some *text*')")
+        self.engine.execute("INSERT INTO comment (post_id, approved) "
+                            "VALUES (1, 1)")
+        metadata.create_all()
+
+    def test_adds_missing_columns_and_indexes(self):
+        added = upgrade(self.engine)
+        assert 'post.comment_count' in added
+        assert 'comment.spam' in added
+        assert 'ix_post_published' in added
+        inspector = Inspector.from_engine(self.engine)
+        assert 'ix_comment_post_approved' in \
+            [ix['name'] for ix in inspector.get_indexes('comment')]
+        post = Post.get(1)
+        assert post.draft is False
+        assert (post.comment_count, post.approved_count) == (1, 1)
+        assert post.content_html == u'<p>Some <em>text</em>\n</p>'
+        assert 'search_index' in added
+        assert upgrade(self.engine) == []
+
+
+class TestSearch(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        Session.execute('DELETE FROM search_index')
+        Post(title=u'Watts and volts', path=u'watts', draft=False,
+             content=u'Measuring power at home with a cheap meter.')
+        Post(title=u'Draft on meters', path=u'draft', draft=True,
+             content=u'Not ready yet.')
+        Page(title=u'About', path=u'about',
+             content=u'A blog about <power> meters & home energy.')
+        Session.commit()
+
+    def _paths(self, terms):
+        return [hit['path'] for hit in search_index.search(Session, terms)]
+
+    def test_ranked_hits_skip_drafts(self):
+        assert sorted(self._paths(u'meter')) == [u'about', u'watts']
+        assert sorted(self._paths(u'power home')) == [u'about', u'watts']
+        assert self._paths(u'ready') == []
+
+    def test_title_matches_rank_first(self):
+        assert self._paths(u'watts')[0] == u'watts'
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        hit = search_index.search(Session, u'energy').hits[0]
+        assert hit['kind'] == 'page'
+        assert u'&lt;power&gt;' in hit['snippet']
+        assert u'<strong>energy</strong>' in hit['snippet']
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.get_by(path=u'watts')
+        post.content = u'Rewritten entirely.'
+        Session.commit()
+        assert self._paths(u'cheap') == []
+        assert self._paths(u'rewritten') == [u'watts']
+        post.delete()
+        Session.commit()
+        assert self._paths(u'rewritten') == []
+
+    def test_rollback_undoes_indexing(self):
+        Post(title=u'Oops', path=u'oops', draft=False, content=u'oops')
+        Session.flush()
+        Session.rollback()
+        assert self._paths(u'oops') == []
+
+    def test_pagination(self):
+        for i in range(12):
+            Post(title=u'Meter %d' % i, path=u'm%d' % i, draft=False)
+        Session.commit()
+        results = search_index.search(Session, u'meter', page=2)
+        assert results.total == 14 and results.pages == 2
+        assert len(results) == 4
+
+    def test_query_syntax_is_not_passed_through(self):
+        assert sorted(self._paths(u'"meter* -(')) == [u'about', u'watts']
+        assert self._paths(u'***') == []
+
+    def test_rebuild(self):
+        Session.execute('DELETE FROM search_index')
+        assert self._paths(u'meter') == []
+        assert search_index.rebuild(Session) == 2
+        assert sorted(self._paths(u'meter')) == [u'about', u'watts']
+
+    def test_common_words_rank_recent_matches(self):
+        for i in range(5):
+            Post(title=u'Meter %d' % i, path=u'm%d' % i, draft=False)
+        Session.commit()
+        search_index.max_ranked = 3
+        try:
+            results = search_index.search(Session, u'meter', per_page=2)
+        finally:
+            search_index.max_ranked = 2000
+        assert results.total == 7 and results.pages == 2
+        paths = set(hit['path'] for hit in results)
+        assert len(paths) == 2 and paths < set([u'm2', u'm3', u'm4'])
+
+
+class TestRendering(ModelTestCase):
+
+    def test_content_is_rendered_on_save(self):
+        page = Page(title=u'About', path=u'about',
+                    content=u'*Hi* <b>there</b> http://example.com/')
+        Session.commit()
+        assert page.content_html == (
+            u'<p><em>Hi</em> &lt;b&gt;there&lt;/b&gt; <a href='
+            u'"http://example.com/">http://example.com/</a>\n</p>')
+        assert page.content_hash == markup.content_hash(page.content)
+        page.content = u'Edited'
+        Session.commit()
+        assert page.content_html == u'<p>Edited\n</p>'
+
+    def test_unsafe_links_are_neutered(self):
+        html = markup.render(u'[a](javascript:alert(1)) [b](/about) '
+                             u'[c](javascript&#58;x)')
+        assert 'javascript' not in html
+        assert 'href="/about"' in html
+
+    def test_links_are_not_linked_again(self):
+        link = u'<a href="http://example.com/">http://example.com/</a>'
+        for text in (u'<http://example.com/>',
+                     u'[http://example.com/](http://example.com/)'):
+            assert markup.render(text) == u'<p>%s\n</p>' % link, text
+        html = markup.render(u'<http://example.com/> and http://example.org/')
+        assert html.count(u'<a ') == 2
+        assert u'<a href="http://example.org/">' in html
+
+    def test_rerender_only_touches_stale_rows(self):
+        Post(title=u'A', path=u'a', content=u'one')
+        Post(title=u'B', path=u'b', content=u'two')
+        Session.commit()
+        assert rerender(Session, Post) == 0
+        Session.execute(Post.table.update().where(Post.table.c.path == u'a')
+                        .values(content_hash=None))
+        assert rerender(Session, Post, batch_size=1) == 1
+        assert rerender(Session, Post, force=True) == 2
+        Session.commit()
+        assert Post.by_path(u'a').content_html == u'<p>one\n</p>'
+
+
+class TestReadReplicas(TestCase):
+
+    """Routing between a primary and a replica in two SQLite files"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.primary, self.replica = [
+            engine_from_config({'sqlalchemy.url': 'sqlite:///%s' %
+                                os.path.join(self.dir, name)})
+            for name in ('primary.db', 'replica.db')]
+        self.bind = metadata.bind
+        Session.remove()
+        Session.configure(bind=self.primary)
+        for engine in self.primary, self.replica:
+            metadata.create_all(bind=engine)
+            search_index.create(engine)
+        # the replica has a post the primary doesn't, so it's clear
+        # where a query went
+        self.replica.execute(Post.table.insert().values(
+            title=u'Replica', path=u'replica', draft=False))
+        meta.router.configure([self.replica], window=60)
+        meta.router.begin_request('alice')
+
+    def tearDown(self):
+        Session.remove()
+        meta.router.end_request()
+        meta.router.configure([])
+        Session.configure(bind=self.bind)
+        for engine in self.primary, self.replica:
+            engine.dispose()
+        shutil.rmtree(self.dir)
+
+    def _paths(self):
+        paths = [post.path for post in Post.query.all()]
+        Session.remove()
+        return paths
+
+    def test_queries_go_to_the_replica(self):
+        assert self._paths() == [u'replica']
+        assert Session.execute('SELECT count(*) FROM post').scalar() == 1
+        assert Session.get_bind(None, None) is self.primary
+
+    def test_writes_go_to_the_primary(self):
+        Post(title=u'New', path=u'new')
+        Session.commit()
+        Session.execute(Post.table.update().values(title=u'Updated'))
+        Session.commit()
+        assert self.primary.execute('SELECT title FROM post').fetchall() \
+            == [(u'Updated',)]
+
+    def test_clients_read_their_own_writes(self):
+        Post(title=u'New', path=u'new')
+        Session.commit()
+        # the rest of the session, then the client's next requests
+        assert [post.path for post in Post.query.all()] == [u'new']
+        Session.remove()
+        assert self._paths() == [u'new']
+        meta.router.begin_request('bob')
+        assert self._paths() == [u'replica']
+
+    def test_window_expires(self):
+        meta.router.window = 0
+        Post(title=u'New', path=u'new')
+        Session.commit()
+        Session.remove()
+        assert self._paths() == [u'replica']
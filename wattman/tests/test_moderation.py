@@ -0,0 +1,103 @@
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from wattman.lib.akismet import Akismet
+from wattman.lib.moderation import ModerationQueue
+from wattman.model import Session, Comment
+from wattman.tests.test_models import ModelTestCase
+
+
+class StubAkismetHandler(BaseHTTPRequestHandler):
+
+    """Calls anything mentioning viagra spam"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        fields = urlparse.parse_qs(body)
+        self.server.calls.append(fields)
+        content = fields.get('comment_content', [''])[0]
+        self.send_response(200)
+        self.end_headers()
+        if 'broken' in content:
+            self.wfile.write('invalid')
+        else:
+            self.wfile.write('viagra' in content and 'true' or 'false')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestModerationQueue(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        self.server = HTTPServer(('127.0.0.1', 0), StubAkismetHandler)
+        self.server.calls = []
+        t = threading.Thread(target=self.server.serve_forever)
+        t.setDaemon(True)
+        t.start()
+        akismet = Akismet('key', 'http://localhost/', api_url=
+                          'http://127.0.0.1:%d/1.1/' % self.server.server_port)
+        self.queue = ModerationQueue(akismet, workers=2, batch_size=10)
+
+    def tearDown(self):
+        self.queue.pool.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        ModelTestCase.tearDown(self)
+
+    def _comment(self, content, email=u'a@example.com', ip=u'10.0.0.1'):
+        return Comment(name=u'A', email=email, content=content,
+                       approved=False, user_ip=ip, user_agent=u'test')
+
+    def test_batch_is_approved_or_marked_spam(self):
+        self._comment(u'Nice post', email=u'a@example.com')
+        self._comment(u'Buy viagra', email=u'b@example.com')
+        Session.commit()
+        assert self.queue.run_once() == 2
+        ham, spam = Comment.query.order_by(Comment.id).all()
+        assert ham.approved and ham.spam is False
+        assert not spam.approved and spam.spam is True
+        assert self.queue.run_once() == 0
+
+    def test_verdicts_cached_per_author_and_ip(self):
+        self._comment(u'First')
+        Session.commit()
+        self.queue.run_once()
+        self._comment(u'Second')
+        self._comment(u'Third', ip=u'10.0.0.2')
+        Session.commit()
+        assert self.queue.run_once() == 2
+        assert len(self.server.calls) == 2
+
+    def test_failed_checks_stay_pending(self):
+        self.queue.checker.api_url = 'http://127.0.0.1:1/'
+        self.queue.checker.timeout = 1
+        self._comment(u'Nice post')
+        Session.commit()
+        assert self.queue.run_once() == 0
+        comment = Comment.query.one()
+        assert not comment.approved and comment.spam is None
+
+    def test_failed_checks_dont_hold_up_newer_comments(self):
+        for i in range(10):
+            self._comment(u'broken %d' % i, email=u'%d@example.com' % i)
+        self._comment(u'Nice post', email=u'b@example.com')
+        Session.commit()
+        assert self.queue.run_once() == 0
+        assert len(self.server.calls) == 10
+        # the failed batch waits for its retry; the newer comment is
+        # checked meanwhile
+        assert self.queue.run_once() == 1
+        assert len(self.server.calls) == 11
+        assert Comment.query.filter_by(approved=True).count() == 1
+
+        assert self.queue.run_once() == 0
+        assert len(self.server.calls) == 11
+        for id, (failures, retry_at) in self.queue._retry.items():
+            self.queue._retry[id] = (failures, 0)
+        assert self.queue.run_once() == 0
+        assert len(self.server.calls) == 21
+        assert set(failures for failures, retry_at in
+                   self.queue._retry.values()) == set([2])
@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pylons import config
+from webtest import TestApp
+
+from wattman.lib.cache import FileCache, TTLCache
+from wattman.lib.pagecache import PageCache, PageCacheMiddleware, depends_on
+from wattman.model import Session, Comment, Post, Tag
+from wattman.tests.test_models import ModelTestCase
+
+
+class ContentApp(object):
+
+    """Renders '/post/<tag>' pages that depend on the tag in their path"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        headers = [('Content-Type', 'text/plain'), ('ETag', '"v1"')]
+        tag = environ['PATH_INFO'].split('/')[-1]
+        if tag != 'untagged':
+            depends_on(environ, tag)
+        if tag == 'cookie':
+            headers.append(('Set-Cookie', 'beaker=1'))
+        start_response('200 OK', headers)
+        return ['page %d' % self.calls]
+
+
+class TestPageCacheMiddleware(TestCase):
+
+    def make_cache(self):
+        return PageCache(TTLCache(60))
+
+    def setUp(self):
+        self.cache = self.make_cache()
+        self.content = ContentApp()
+        self.app = TestApp(PageCacheMiddleware(self.content, self.cache,
+                                               ['/post/']))
+
+    def test_repeat_views_are_served_from_the_cache(self):
+        res = self.app.get('/post/post:1')
+        assert res.headers['X-Cache'] == 'MISS'
+        res = self.app.get('/post/post:1')
+        assert res.headers['X-Cache'] == 'HIT'
+        assert res.body == 'page 1'
+        assert self.content.calls == 1
+
+    def test_invalidation_is_by_tag(self):
+        self.app.get('/post/post:1')
+        self.app.get('/post/post:2')
+        self.cache.invalidate(['post:1'])
+        assert self.app.get('/post/post:1').body == 'page 3'
+        assert self.app.get('/post/post:2').body == 'page 2'
+        assert self.app.get('/post/post:1').headers['X-Cache'] == 'HIT'
+
+    def test_hits_answer_conditional_requests(self):
+        self.app.get('/post/post:1')
+        res = self.app.get('/post/post:1', headers={'If-None-Match': '"v1"'},
+                           status=304)
+        assert res.headers['X-Cache'] == 'HIT' and res.body == ''
+        assert res.headers['ETag'] == '"v1"'
+        res = self.app.get('/post/post:1', headers={'If-None-Match': '"v0"'})
+        assert res.body == 'page 1'
+
+    def test_untagged_pages_and_cookies_are_not_cached(self):
+        self.app.get('/post/untagged')
+        self.app.get('/post/untagged')
+        self.app.get('/post/cookie')
+        self.app.get('/post/cookie')
+        assert self.content.calls == 4
+
+    def test_logged_in_users_and_other_paths_bypass_the_cache(self):
+        self.app.get('/post/post:1')
+        res = self.app.get('/post/post:1',
+                           headers={'Cookie': 'authkit=abc'})
+        assert 'X-Cache' not in res.headers
+        self.app.get('/admin/post:1')
+        self.app.get('/admin/post:1')
+        assert self.content.calls == 4
+
+
+class TestFilePageCacheMiddleware(TestPageCacheMiddleware):
+
+    def make_cache(self):
+        self.data_dir = tempfile.mkdtemp()
+        return PageCache(FileCache(self.data_dir, 60))
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_processes_share_pages_and_invalidations(self):
+        other = PageCache(FileCache(self.data_dir, 60))
+        self.app.get('/post/post:1')
+        assert other.lookup('localhost:80/post/post:1?') is not None
+        other.invalidate(['post:1'])
+        assert self.app.get('/post/post:1').body == 'page 2'
+
+    def test_pages_of_other_builds_are_not_served(self):
+        self.app.get('/post/post:1')
+        # a process started after the templates or the assets changed
+        rebuilt = PageCache(FileCache(self.data_dir, 60), stamp='rebuilt')
+        assert rebuilt.lookup('localhost:80/post/post:1?') is None
+
+
+class TestPageCacheInvalidator(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        self.cache = config['pylons.app_globals'].page_cache
+        self.cache.store.clear()
+        self.post = Post(title=u'Post', path=u'post')
+        Session.commit()
+
+    def _current(self, *tags):
+        self.cache.save('page', '200 OK', [], 'body', tags)
+        return self.cache.lookup('page') is not None
+
+    def test_commits_invalidate_the_changed_entities(self):
+        assert self._current(u'post:%d' % self.post.id)
+        self.post.title = u'Edited'
+        Session.commit()
+        assert not self.cache.lookup('page')
+        assert self._current(u'post:%d' % self.post.id)
+        Post(title=u'Other', path=u'other')
+        Session.commit()
+        assert self.cache.lookup('page') is not None
+
+    def test_comments_and_tags_invalidate_their_post(self):
+        assert self._current(u'post:%d' % self.post.id)
+        Comment(name=u'a', post=self.post)
+        Session.commit()
+        assert not self.cache.lookup('page')
+        assert self._current(u'tag:python')
+        self.post.tags.append(Tag(name=u'python', path=u'python'))
+        Session.commit()
+        assert not self.cache.lookup('page')
+
+    def test_listings_follow_any_change_of_their_kind(self):
+        assert self._current(u'post:*')
+        Post(title=u'Other', path=u'other')
+        Session.commit()
+        assert not self.cache.lookup('page')
+
+    def test_rollback_invalidates_nothing(self):
+        assert self._current(u'post:%d' % self.post.id)
+        self.post.title = u'Edited'
+        Session.flush()
+        Session.rollback()
+        assert self.cache.lookup('page') is not None
@@ -0,0 +1,82 @@
+import base64
+import datetime
+
+from wattman.lib.pagination import (InvalidCursor, comment_page,
+                                    post_page, tag_page)
+from wattman.model import Session, Comment, Post, Tag
+from wattman.tests.test_models import ModelTestCase
+
+
+class TestKeysetPagination(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        self.tag = Tag(name=u'even', path=u'even')
+        day = datetime.date(2009, 1, 1)
+        for i in range(12):
+            # three posts a day, and two without a date at all
+            posted_on = i < 10 and day + datetime.timedelta(i // 3) or None
+            post = Post(title=u'Post %d' % i, path=u'post-%d' % i,
+                        draft=i == 5, posted_on=posted_on)
+            if i % 2 == 0:
+                post.tags.append(self.tag)
+        self.post = Post.get_by(path=u'post-0')
+        for i in range(7):
+            Comment(name=u'c%d' % i, content=u'hi', post=self.post,
+                    approved=i != 3, created_on=day)
+        Session.commit()
+        # newest first, undated last, drafts left out
+        self.expected = ['post-9', 'post-8', 'post-7', 'post-6', 'post-4',
+                         'post-3', 'post-2', 'post-1', 'post-0',
+                         'post-11', 'post-10']
+
+    def _walk(self, page, func, *args):
+        paths = [post.path for post in page]
+        while page.next:
+            page = func(*args + (page.next, 4))
+            paths.extend(post.path for post in page)
+        return paths, page
+
+    def test_pages_cover_every_post_once_in_order(self):
+        paths, last = self._walk(post_page(None, 4), post_page)
+        assert paths == self.expected
+        assert len(last) == 3 and last.next is None
+
+    def test_previous_pages(self):
+        first = post_page(None, 4)
+        assert first.previous is None
+        second = post_page(first.next, 4)
+        third = post_page(second.next, 4)
+        assert [p.path for p in third] == self.expected[8:]
+        back = post_page(third.previous, 4)
+        assert [p.path for p in back] == self.expected[4:8]
+        assert back.next == second.next
+        back = post_page(back.previous, 4)
+        assert [p.path for p in back] == self.expected[:4]
+        assert back.previous is None
+
+    def test_tag_pages(self):
+        paths, last = self._walk(tag_page(self.tag, None, 4), tag_page,
+                                 self.tag)
+        assert paths == [p for p in self.expected if int(p[5:]) % 2 == 0]
+
+    def test_comment_pages_are_oldest_first(self):
+        page = comment_page(self.post, None, 4)
+        assert [c.name for c in page] == [u'c0', u'c1', u'c2', u'c4']
+        page = comment_page(self.post, page.next, 4)
+        assert [c.name for c in page] == [u'c5', u'c6']
+        assert page.next is None
+
+    def test_bad_cursors(self):
+        crafted = [base64.urlsafe_b64encode(data).rstrip('=') for data in (
+                   '["a","2009-01-01T00:00:00",{}]',
+                   '["a","2009-01-01T00:00:00",[1]]',
+                   '["a","2009-01-01T00:00:00","1"]',
+                   '["a",{},1]', '["b",null,[1]]')]
+        for cursor in ['nonsense', 'WzEsMiwzXQ', u'\xe9'] + crafted:
+            try:
+                post_page(cursor)
+            except InvalidCursor:
+                pass
+            else:
+                raise AssertionError('%r accepted' % cursor)
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from beaker.middleware import SessionMiddleware
+from webob import Request
+
+from wattman.lib.sessions import MemoryStore, SessionStore, SQLiteStore
+
+
+class CountingStore(MemoryStore):
+
+    def __init__(self):
+        MemoryStore.__init__(self)
+        self.calls = []
+
+    def load(self, id):
+        self.calls.append('load')
+        return MemoryStore.load(self, id)
+
+    def save(self, id, data, accessed):
+        self.calls.append('save')
+        MemoryStore.save(self, id, data, accessed)
+
+    def touch(self, id, accessed):
+        self.calls.append('touch')
+        MemoryStore.touch(self, id, accessed)
+
+
+def app(environ, start_response):
+    """Counts visits in the session on /count, reads it on /show and
+    leaves it alone on /other"""
+    session = environ['beaker.session']
+    path = environ['PATH_INFO']
+    body = ''
+    if path == '/count':
+        session['visits'] = session.get('visits', 0) + 1
+        session.save()
+    elif path == '/show':
+        body = str(session.get('visits'))
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [body]
+
+
+class TestSessions(TestCase):
+
+    def setUp(self):
+        self.store = CountingStore()
+        self.sessions = SessionStore(self.store, expire=3600, touch=60)
+        self.app = SessionMiddleware(app, {'beaker.session.key': 'sid'},
+                                     **self.sessions.middleware_options())
+
+    def _get(self, path, cookie=None):
+        request = Request.blank(path)
+        if cookie:
+            request.headers['Cookie'] = cookie
+        return request.get_response(self.app)
+
+    def test_writes_only_on_change(self):
+        response = self._get('/count')
+        cookie = response.headers['Set-Cookie'].split(';')[0]
+        # (a new session isn't looked up)
+        assert self.store.calls == ['save']
+
+        del self.store.calls[:]
+        assert self._get('/show', cookie).body == '1'
+        assert self._get('/show', cookie).body == '1'
+        assert self.store.calls == ['load', 'load']
+
+        del self.store.calls[:]
+        self._get('/count', cookie)
+        assert self.store.calls == ['load', 'save']
+        assert self._get('/show', cookie).body == '2'
+
+        # sessions are only loaded when they're used
+        del self.store.calls[:]
+        self._get('/other', cookie)
+        assert self.store.calls == []
+
+    def test_reads_touch_the_access_time_now_and_then(self):
+        cookie = self._get('/count').headers['Set-Cookie'].split(';')[0]
+        id = list(self.store._sessions)[0]
+        data, accessed = self.store._sessions[id]
+        self.store._sessions[id] = (data, accessed - 120)
+        del self.store.calls[:]
+        assert self._get('/show', cookie).body == '1'
+        assert self.store.calls == ['load', 'touch']
+        assert self.store._sessions[id][0] == data
+        assert self.store._sessions[id][1] >= accessed
+
+    def test_new_sessions_that_are_only_read_are_not_stored(self):
+        assert self._get('/show').body == 'None'
+        assert len(self.store) == 0
+
+    def test_sweep(self):
+        now = time.time()
+        self.store.save('old', 'data', now - 7200)
+        self.store.save('new', 'data', now)
+        assert self.sessions.sweep() == 1
+        assert self.store.load('old') is None
+        assert self.store.load('new') is not None
+
+    def test_file_type_leaves_beaker_alone(self):
+        sessions = SessionStore.from_config({'pylons.cache_dir': '/tmp'})
+        assert sessions.store is None
+        assert sessions.middleware_options() == {}
+        assert sessions.sweep() == 0
+
+
+class TestSQLiteStore(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_store(self):
+        sessions = SessionStore.from_config({
+            'pylons.cache_dir': self.dir, 'sessions.type': 'sqlite',
+            'sessions.expire': '3600'})
+        store = sessions.store
+        assert isinstance(store, SQLiteStore)
+        assert store.path == os.path.join(self.dir, 'sessions.db')
+        assert store._connection().execute(
+            'PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+        now = time.time()
+        store.save('a', '\x00pickled', now)
+        assert store.load('a') == ('\x00pickled', now)
+        store.touch('a', now + 1)
+        assert store.load('a') == ('\x00pickled', now + 1)
+        store.save('b', 'old', now - 7200)
+        assert len(store) == 2
+        assert sessions.sweep() == 1
+        assert store.load('b') is None
+        store.delete('a')
+        assert len(store) == 0
+        store.close()
+
+    def test_through_beaker(self):
+        sessions = SessionStore(SQLiteStore(os.path.join(self.dir, 's.db')))
+        wrapped = SessionMiddleware(app, {'beaker.session.key': 'sid'},
+                                    **sessions.middleware_options())
+        response = Request.blank('/count').get_response(wrapped)
+        cookie = response.headers['Set-Cookie'].split(';')[0]
+        request = Request.blank('/count', headers={'Cookie': cookie})
+        request.get_response(wrapped)
+        request = Request.blank('/show', headers={'Cookie': cookie})
+        assert request.get_response(wrapped).body == '2'
+        assert len(sessions.store) == 1
@@ -0,0 +1,75 @@
+import datetime
+
+from wattman.lib import helpers as h
+from wattman.model import Session, Post, Tag
+from wattman.model.summary import content_summary
+from wattman.tests.test_models import ModelTestCase
+
+
+class TestContentSummary(ModelTestCase):
+
+    def setUp(self):
+        ModelTestCase.setUp(self)
+        self.python = Tag(name=u'python', path=u'python')
+        self.web = Tag(name=u'web', path=u'web')
+        may, june = datetime.date(2009, 5, 3), datetime.date(2009, 6, 1)
+        Post(title=u'A', path=u'a', posted_on=may, draft=False,
+             tags=[self.python, self.web])
+        Post(title=u'B', path=u'b', posted_on=may, draft=False,
+             tags=[self.python])
+        Post(title=u'C', path=u'c', posted_on=june, draft=True,
+             tags=[self.web])
+        Session.commit()
+
+    def _check(self, tags, months):
+        assert [(name, count) for name, path, count
+                in content_summary.tags(Session)] == tags
+        assert [(day.strftime('%Y-%m'), count) for day, count
+                in content_summary.months(Session)] == months
+        # the same as counting from scratch
+        content_summary.rebuild(Session)
+        assert [(name, count) for name, path, count
+                in content_summary.tags(Session)] == tags
+        Session.rollback()
+
+    def test_new_posts_are_counted(self):
+        self._check([(u'python', 2), (u'web', 1)], [('2009-05', 2)])
+
+    def test_publishing_and_moving(self):
+        post = Post.get_by(path=u'c')
+        post.draft = False
+        Session.commit()
+        self._check([(u'python', 2), (u'web', 2)],
+                    [('2009-06', 1), ('2009-05', 2)])
+        Post.get_by(path=u'a').posted_on = datetime.date(2009, 6, 2)
+        Session.commit()
+        self._check([(u'python', 2), (u'web', 2)],
+                    [('2009-06', 2), ('2009-05', 1)])
+
+    def test_retagging_from_either_side(self):
+        post = Post.get_by(path=u'a')
+        post.tags.remove(self.web)
+        Session.commit()
+        self._check([(u'python', 2)], [('2009-05', 2)])
+        self.web.posts.append(Post.get_by(path=u'b'))
+        Session.commit()
+        self._check([(u'python', 2), (u'web', 1)], [('2009-05', 2)])
+
+    def test_deleting_posts_and_tags(self):
+        Post.get_by(path=u'b').delete()
+        Session.commit()
+        self._check([(u'python', 1), (u'web', 1)], [('2009-05', 1)])
+        self.web.delete()
+        Session.commit()
+        self._check([(u'python', 1)], [('2009-05', 1)])
+
+    def test_rolled_back_changes_are_not_counted(self):
+        Post.get_by(path=u'a').draft = True
+        Session.flush()
+        Session.rollback()
+        self._check([(u'python', 2), (u'web', 1)], [('2009-05', 2)])
+
+    def test_helpers(self):
+        assert h.tag_cloud() == [(u'python', u'python', 2, 5),
+                                 (u'web', u'web', 1, 1)]
+        assert h.month_archive() == [(datetime.date(2009, 5, 1), 2)]
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mako.lookup import TemplateLookup
+
+from wattman.lib.templates import find_templates, module_file, warm_up
+
+
+class TestWarmUp(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.templates = os.path.join(self.dir, 'templates')
+        os.makedirs(os.path.join(self.templates, 'parts'))
+        self._write('base.mako', '<html>${next.body()}</html>')
+        self._write('parts/post.mako',
+                    '<%inherit file="/base.mako"/>${title}')
+        self._write('.hidden.mako', '${')
+        self._write('notes.txt', '${')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write(self, name, text):
+        f = open(os.path.join(self.templates, name), 'w')
+        try:
+            f.write(text)
+        finally:
+            f.close()
+
+    def _lookup(self):
+        return TemplateLookup(directories=[self.templates],
+                              module_directory=os.path.join(self.dir,
+                                                            'modules'))
+
+    def test_find_templates(self):
+        assert find_templates([self.templates]) == \
+            ['/base.mako', '/parts/post.mako']
+
+    def test_templates_are_compiled_and_collected(self):
+        lookup = self._lookup()
+        results = warm_up(lookup)
+        assert [(r.uri, r.compiled, r.error) for r in results] == \
+            [('/base.mako', True, None), ('/parts/post.mako', True, None)]
+        assert os.path.exists(module_file(lookup, '/parts/post.mako'))
+        template = lookup.get_template('/parts/post.mako')
+        assert template is lookup.get_template('/parts/post.mako')
+        assert template.render(title=u'Hi') == u'<html>Hi</html>'
+
+        # another process loads the modules instead of compiling them
+        results = warm_up(self._lookup())
+        assert [r.compiled for r in results] == [False, False]
+        results = warm_up(self._lookup(), force=True)
+        assert [r.compiled for r in results] == [True, True]
+
+    def test_errors_are_reported(self):
+        self._write('broken.mako', '<%def name="x()">unclosed')
+        results = warm_up(self._lookup())
+        assert [r.uri for r in results if r.error] == ['/broken.mako']
+        assert 'SyntaxException' in results[1].error
+        assert [r.error for r in results if r.uri != '/broken.mako'] == \
+            [None, None]
@@ -2,9 +2,17 @@
 import logging
 
 from wattman.config.environment import load_environment
+from wattman.model import metadata
+from wattman.model.migrate import upgrade
 
 log = logging.getLogger(__name__)
 
 def setup_app(command, conf, vars):
     """Place any commands to setup wattman here"""
     load_environment(conf.global_conf, conf.local_conf)
+
+    # Create the tables, and bring existing ones up to date
+    log.info("Creating tables")
+    metadata.create_all()
+    upgrade(metadata.bind)
+    log.info("Successfully set up")